@@ -0,0 +1,277 @@
+"""
+Agent Jobs for AI Agent Widget
+
+Runs agent requests as background jobs so the LLM loop does not hold a
+gunicorn worker. The endpoint enqueues the run and returns a job id at once;
+steps are delivered as realtime events and can also be polled.
+
+Each job keeps a small status record and a list of produced steps in the
+site cache. Jobs can be cancelled by their owner (checked before every step),
+time out after a configurable limit, and the number of queued or running
+jobs per site is capped.
+"""
+
+import frappe
+from frappe import _
+import json
+import time
+from typing import Dict, Any, Optional
+
+
+KEY_PREFIX = "ai_agent_job"
+ACTIVE_KEY = f"{KEY_PREFIX}|active"
+
+# Realtime event sent when a job reaches a final state
+JOB_DONE_EVENT = "ai_agent_job_done"
+
+# Defaults, overridable in site_config.json
+DEFAULT_QUEUE = "long"
+DEFAULT_TIMEOUT = 300  # seconds, same as the SDK's AgentConfig.timeout
+DEFAULT_MAX_QUEUED = 20
+
+# How long finished jobs stay available for polling
+RESULT_TTL = 60 * 60  # seconds
+
+FINAL_STATES = ("finished", "failed", "cancelled")
+
+
+class AgentJobCancelled(Exception):
+    """Raised inside a running job once its owner cancelled it"""
+
+
+def is_async_requested(data: Dict[str, Any]) -> bool:
+    """
+    Whether a request should run as a background job
+
+    Args:
+        data: Parsed request payload
+
+    Returns:
+        True when the payload asks for it or ai_agent_async_execution is set
+    """
+    return bool(data.get("async", frappe.conf.get("ai_agent_async_execution")))
+
+
+def get_timeout() -> int:
+    """Job timeout in seconds (ai_agent_job_timeout)"""
+    return int(frappe.conf.get("ai_agent_job_timeout") or DEFAULT_TIMEOUT)
+
+
+def enqueue_agent_run(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Queue an agent request for background execution
+
+    Args:
+        data: Parsed request payload
+
+    Returns:
+        dict with job_id, or queue_full when the site's queue is at capacity
+    """
+    cache = frappe.cache()
+    timeout = get_timeout()
+    max_queued = int(frappe.conf.get("ai_agent_max_queued_jobs") or DEFAULT_MAX_QUEUED)
+    active_key = cache.make_key(ACTIVE_KEY)
+    now = time.time()
+    job_id = frappe.generate_hash(length=16)
+
+    # Reserve a slot first, then check capacity, so concurrent calls cannot overshoot
+    pipe = cache.pipeline()
+    # Jobs older than queue wait plus run time are gone (killed worker, lost job)
+    pipe.zremrangebyscore(active_key, 0, now - 2 * timeout)
+    pipe.zadd(active_key, {job_id: now})
+    pipe.zcard(active_key)
+    active = pipe.execute()[-1]
+
+    if active > max_queued:
+        cache.zrem(active_key, job_id)
+        return {
+            "success": False,
+            "queue_full": True,
+            "error": _("Too many AI agent runs are in progress. Please try again shortly.")
+        }
+
+    _save_job(job_id, {
+        "status": "queued",
+        "user": frappe.session.user,
+        "queued_at": now
+    })
+
+    frappe.enqueue(
+        "ai_agent_widget.agent_jobs.run_agent_job",
+        queue=frappe.conf.get("ai_agent_queue") or DEFAULT_QUEUE,
+        timeout=timeout,
+        agent_job_id=job_id,
+        data=data
+    )
+
+    return {
+        "success": True,
+        "job_id": job_id,
+        "status": "queued"
+    }
+
+
+def run_agent_job(agent_job_id: str, data: Dict[str, Any]):
+    """
+    Background job entry point
+
+    Args:
+        agent_job_id: Job id returned by enqueue_agent_run
+        data: Parsed request payload
+    """
+    from . import api
+    from . import telemetry
+
+    job = _get_job(agent_job_id)
+    if not job or job["status"] in FINAL_STATES:
+        _release_slot(agent_job_id)
+        return
+
+    if _is_cancelled(agent_job_id):
+        _finish(agent_job_id, job, "cancelled")
+        return
+
+    job.update(status="running", started_at=time.time())
+    _save_job(agent_job_id, job)
+
+    cache = frappe.cache()
+    steps_key = f"{KEY_PREFIX}|{agent_job_id}|steps"
+    stream_id = data.get("stream_id")
+    publish = api._step_publisher(stream_id) if stream_id else None
+
+    def on_step(index, step):
+        if _is_cancelled(agent_job_id):
+            raise AgentJobCancelled()
+
+        cache.rpush(steps_key, json.dumps(step, default=str))
+        cache.expire(cache.make_key(steps_key), RESULT_TTL)
+        if publish:
+            publish(index, step)
+
+    trace = telemetry.start_trace(kind="job")
+    trace.add("queue_wait", time.perf_counter() - (job["started_at"] - job["queued_at"]))
+
+    try:
+        result = api.run_agent_request(data, on_step=on_step)
+    except Exception as e:
+        frappe.log_error(f"AI Agent Job Error: {str(e)}", "AI Agent Widget")
+        result = {"success": False, "error": str(e)}
+
+    telemetry.finish_request()
+
+    if _is_cancelled(agent_job_id):
+        _finish(agent_job_id, job, "cancelled")
+    else:
+        _finish(agent_job_id, job, "finished" if result.get("success") else "failed", result)
+
+
+def get_job_state(job_id: str, since: int = 0) -> Dict[str, Any]:
+    """
+    Poll a job owned by the current user
+
+    Args:
+        job_id: Job id
+        since: Number of steps the client already has
+
+    Returns:
+        dict with status, new steps and, once finished, the result
+    """
+    job = _get_owned_job(job_id)
+    if not job:
+        return {"success": False, "error": _("Agent job not found")}
+
+    # A worker killed by the RQ timeout never reports back
+    timeout = get_timeout()
+    now = time.time()
+    if job["status"] == "running" and now - job["started_at"] > timeout:
+        job = _finish(job_id, job, "failed", {"success": False, "error": _("Agent run timed out")})
+    elif job["status"] == "queued" and now - job["queued_at"] > 2 * timeout:
+        job = _finish(job_id, job, "failed", {"success": False, "error": _("Agent run was never started")})
+
+    since = int(since or 0)
+    steps = frappe.cache().lrange(f"{KEY_PREFIX}|{job_id}|steps", since, -1)
+
+    return {
+        "success": True,
+        "job_id": job_id,
+        "status": job["status"],
+        "steps": [json.loads(step) for step in steps],
+        "next_index": since + len(steps),
+        "result": job.get("result")
+    }
+
+
+def cancel_job(job_id: str) -> Dict[str, Any]:
+    """
+    Cancel a job owned by the current user
+
+    A queued job is cancelled at once; a running job stops before its next step.
+
+    Args:
+        job_id: Job id
+
+    Returns:
+        dict with the job status after cancelling
+    """
+    job = _get_owned_job(job_id)
+    if not job:
+        return {"success": False, "error": _("Agent job not found")}
+
+    if job["status"] in FINAL_STATES:
+        return {"success": True, "status": job["status"]}
+
+    frappe.cache().set_value(
+        f"{KEY_PREFIX}|{job_id}|cancel", 1,
+        expires_in_sec=2 * get_timeout()
+    )
+
+    if job["status"] == "queued":
+        job = _finish(job_id, job, "cancelled")
+
+    return {"success": True, "status": job["status"]}
+
+
+def get_active_job_count() -> int:
+    """Number of queued or running jobs for this site"""
+    cache = frappe.cache()
+    return cache.zcard(cache.make_key(ACTIVE_KEY))
+
+
+def _finish(job_id: str, job: Dict[str, Any], status: str, result: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Store the final state, free the queue slot and notify the owner"""
+    job.update(status=status, finished_at=time.time(), result=result)
+    _save_job(job_id, job)
+    _release_slot(job_id)
+
+    frappe.publish_realtime(
+        JOB_DONE_EVENT,
+        {"job_id": job_id, "status": status},
+        user=job["user"]
+    )
+
+    return job
+
+
+def _release_slot(job_id: str):
+    cache = frappe.cache()
+    cache.zrem(cache.make_key(ACTIVE_KEY), job_id)
+
+
+def _save_job(job_id: str, job: Dict[str, Any]):
+    frappe.cache().set_value(f"{KEY_PREFIX}|{job_id}", job, expires_in_sec=RESULT_TTL)
+
+
+def _get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    return frappe.cache().get_value(f"{KEY_PREFIX}|{job_id}")
+
+
+def _get_owned_job(job_id: str) -> Optional[Dict[str, Any]]:
+    job = _get_job(job_id)
+    if job and job["user"] == frappe.session.user:
+        return job
+    return None
+
+
+def _is_cancelled(job_id: str) -> bool:
+    # expires=True skips the request-local cache, which would pin the first answer
+    return bool(frappe.cache().get_value(f"{KEY_PREFIX}|{job_id}|cancel", expires=True))
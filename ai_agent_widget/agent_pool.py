@@ -0,0 +1,157 @@
+"""
+Agent Pool for AI Agent Widget
+
+Keeps AgentManager instances alive between requests inside a worker process.
+A pooled manager keeps its LLM clients (and their keep-alive HTTP sessions)
+and its tool setup, so only the first request of a worker pays for them.
+
+Managers are leased exclusively for the length of one request, pooled per
+site and per (api_key, model_name, temperature, max_tokens), and dropped
+when the site configuration changes on disk.
+"""
+
+import frappe
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any
+
+try:
+    from nutaan_erp import AgentManager
+except ImportError:
+    AgentManager = None
+
+
+# Idle managers kept per pool key; extra ones are discarded on release
+MAX_IDLE_PER_KEY = 4
+
+_lock = threading.Lock()
+_pools = {}          # site -> {pool_key: [idle managers]}
+_config_stamps = {}  # site -> site config modification stamp
+_stats = {
+    "hits": 0,
+    "misses": 0,
+    "discarded": 0,
+    "invalidations": 0
+}
+
+
+def get_pool_key(config) -> tuple:
+    """
+    Build the pool key for an AgentConfig
+
+    Args:
+        config: SDK AgentConfig instance
+
+    Returns:
+        Tuple identifying interchangeable managers
+    """
+    return (config.api_key, config.model_name, config.temperature, config.max_tokens)
+
+
+@contextmanager
+def lease_manager(config):
+    """
+    Lease a pooled AgentManager for the duration of a request
+
+    Args:
+        config: SDK AgentConfig instance
+
+    Yields:
+        AgentManager ready for execution
+    """
+    site = frappe.local.site
+    key = get_pool_key(config)
+
+    with _lock:
+        _check_site_config(site)
+        idle = _pools.setdefault(site, {}).setdefault(key, [])
+        manager = idle.pop() if idle else None
+        _stats["hits" if manager else "misses"] += 1
+
+    if manager is None:
+        manager = AgentManager(config)
+
+    try:
+        yield manager
+    except Exception:
+        # A manager that failed mid-request may hold half-initialized state
+        with _lock:
+            _stats["discarded"] += 1
+        raise
+    else:
+        _release(site, key, manager)
+
+
+def _release(site: str, key: tuple, manager):
+    """Return a manager to its pool unless the pool is full or was invalidated"""
+    with _lock:
+        pool = _pools.get(site)
+        if pool is None:
+            _stats["discarded"] += 1
+            return
+
+        idle = pool.setdefault(key, [])
+        if len(idle) < MAX_IDLE_PER_KEY:
+            idle.append(manager)
+        else:
+            _stats["discarded"] += 1
+
+
+def _check_site_config(site: str):
+    """Drop the site's pool when site_config.json or common_site_config.json changed"""
+    stamp = _get_config_stamp()
+    previous = _config_stamps.get(site)
+
+    if previous is not None and previous != stamp:
+        if _pools.pop(site, None):
+            _stats["invalidations"] += 1
+
+    _config_stamps[site] = stamp
+
+
+def _get_config_stamp() -> tuple:
+    """Modification times of the config files a manager depends on"""
+    stamp = []
+    for path in (
+        frappe.get_site_path("site_config.json"),
+        frappe.get_site_path("..", "common_site_config.json")
+    ):
+        try:
+            stamp.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            stamp.append(None)
+
+    return tuple(stamp)
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """
+    Get pool statistics for this worker process
+
+    Returns:
+        dict with hit/miss counters and idle managers per site
+    """
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        pools = {}
+        for site, pool in _pools.items():
+            pools[site] = [
+                {
+                    # Never expose the API key itself
+                    "api_key_hash": hashlib.sha256(key[0].encode()).hexdigest()[:12],
+                    "model_name": key[1],
+                    "temperature": key[2],
+                    "max_tokens": key[3],
+                    "idle": len(idle)
+                }
+                for key, idle in pool.items()
+            ]
+
+        return {
+            "pid": os.getpid(),
+            "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else 0,
+            "pools": pools,
+            **_stats
+        }
@@ -0,0 +1,287 @@
+"""
+Agent Runner for AI Agent Widget
+
+Drives the SDK agent loop one event at a time so that every tool call,
+tool result and response can be handed to the caller as soon as it exists,
+instead of only after the whole loop has finished.
+
+History and tool results are fitted to a token budget (see prompt_budget),
+and the run reports the tokens saved as prompt_budget.
+
+Read-only tools run on the server inside the loop (see tool_executor);
+their tool_call steps carry the result as server_result so the widget does
+not execute them again.
+
+The returned result has the same shape as AgentManager.execute(), so
+one-shot clients keep working unchanged. Errors are raised rather than
+returned, so a pooled manager that failed mid-run is discarded instead of
+going back to the pool; the API turns them into the usual error dict.
+"""
+
+import time
+from typing import Dict, List, Any, Optional, Callable
+
+from . import tool_executor
+from . import prompt_budget
+from . import telemetry
+
+try:
+    from langchain.agents import create_agent
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from nutaan_erp.core.tools import get_all_tools
+    from nutaan_erp.utils.context import build_system_prompt
+    HAS_LANGCHAIN = True
+except ImportError:
+    HAS_LANGCHAIN = False
+
+
+def run_agent(
+    manager,
+    message: str,
+    context: Dict[str, Any],
+    history: Optional[List[Dict[str, str]]] = None,
+    on_step: Optional[Callable[[int, Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """
+    Execute the agent loop, reporting each step as it is produced
+
+    Args:
+        manager: SDK AgentManager instance
+        message: User message/command
+        context: Context dictionary built with build_frappe_context
+        history: Conversation history
+        on_step: Optional callback called with (index, step) for every step
+
+    Returns:
+        Dictionary with execution results (same shape as AgentManager.execute)
+
+    Raises:
+        Any error from the SDK or the model
+    """
+    agent_steps = []
+    trace = telemetry.current()
+
+    def emit(step):
+        agent_steps.append(step)
+        if on_step:
+            on_step(len(agent_steps) - 1, step)
+
+    tracker = manager.tracker
+    session_id = tracker.start_session(
+        user=context.get('user', 'Unknown'),
+        initial_message=message
+    )
+
+    # History gets what the system prompt and message leave of the budget
+    with trace.span("prompt_assembly"):
+        budget = prompt_budget.get_budget()
+        report = prompt_budget.new_report(budget)
+        system_prompt = _build_system_prompt(context)
+        messages, summary = prompt_budget.compact_history(
+            history or [],
+            budget - prompt_budget.count_tokens(system_prompt) - prompt_budget.count_tokens(message),
+            report
+        )
+        if summary:
+            system_prompt += "\n\n" + summary
+
+    state = tool_executor.ToolRunState(context.get('current_path'), context.get('is_dirty'))
+    with trace.span("agent_init"):
+        _initialize_agent(manager, context, state, system_prompt, report)
+
+    # Intent analysis happens before the agent loop, exactly as in the SDK
+    with trace.span("intent_analysis"):
+        intent_result = manager.intent_engine.analyze(message, context, history)
+
+    if not intent_result.get("is_clear", True):
+        fallback_msg = intent_result.get(
+            "fallback_response",
+            "Could you please clarify your request?"
+        )
+        tracker.record_action(
+            "intent_clarification",
+            {"reason": intent_result.get("reasoning")},
+            fallback_msg
+        )
+        session_data = tracker.end_session(final_outcome="Clarification Requested")
+
+        emit({"type": "response", "content": fallback_msg})
+
+        return {
+            "success": True,
+            "tool_calls": [],
+            "agent_steps": agent_steps,
+            "content": fallback_msg,
+            "agent_loop_complete": True,
+            "debug_events": [],
+            "session_data": session_data.to_dict(),
+            "session_id": session_id,
+            "prompt_budget": report
+        }
+
+    effective_message = intent_result.get("refined_request", message)
+    if effective_message:
+        messages.append({"role": "user", "content": effective_message})
+
+    tool_calls = []
+    final_content = ""
+    all_events = []
+    # tool_call steps held until their results are known, by tool_call_id
+    held = {}
+    records = {}
+
+    def flush():
+        for step in held.values():
+            emit(step)
+        held.clear()
+
+    # Each update arrives when its node finishes, so the time since the
+    # previous update is that node's run time
+    node_start = time.perf_counter()
+    for event in manager.agent.stream({"messages": messages}, stream_mode="updates"):
+        all_events.append(str(event)[:500])
+
+        for node_name, node_data in event.items():
+            if node_name == "model":
+                trace.add("llm_turn", node_start)
+                flush()
+                for msg in node_data.get("messages", []):
+                    if getattr(msg, 'tool_calls', None):
+                        for tc in msg.tool_calls:
+                            tool_calls.append({
+                                "name": tc.get("name"),
+                                "args": tc.get("args", {}),
+                                "id": tc.get("id", "")
+                            })
+                            state.observe(tc.get("name"), tc.get("args", {}))
+                            records[tc.get("id", "")] = tracker.record_action(
+                                tool_name=tc.get("name"),
+                                tool_arguments=tc.get("args", {})
+                            )
+                            held[tc.get("id", "")] = {
+                                "type": "tool_call",
+                                "tool": tc.get("name"),
+                                "args": tc.get("args", {})
+                            }
+
+                    elif getattr(msg, 'content', None):
+                        final_content = msg.content
+                        emit({"type": "response", "content": msg.content})
+
+            elif node_name == "tools":
+                trace.add("tool_step", node_start, tools=[step["tool"] for step in held.values()])
+                results = []
+                for msg in node_data.get("messages", []):
+                    if hasattr(msg, 'content'):
+                        tool_call_id = getattr(msg, 'tool_call_id', '')
+                        step = held.get(tool_call_id)
+                        if step and tool_executor.is_server_result(step["tool"], msg.content):
+                            step["server_result"] = msg.content
+                            if records.get(tool_call_id) is not None:
+                                records[tool_call_id].result = msg.content
+                        results.append({
+                            "type": "tool_result",
+                            "tool_call_id": tool_call_id,
+                            "result": msg.content
+                        })
+
+                # Calls first, in the order the model made them, then results
+                flush()
+                for step in results:
+                    emit(step)
+
+        node_start = time.perf_counter()
+
+    flush()
+
+    session_data = tracker.end_session(final_outcome=final_content or "Done")
+
+    return {
+        "success": True,
+        "tool_calls": tool_calls,
+        "agent_steps": agent_steps,
+        "content": final_content or "Done",
+        "agent_loop_complete": True,
+        "debug_events": all_events[:10],
+        "session_data": session_data.to_dict(),
+        "session_id": session_id,
+        "prompt_budget": report
+    }
+
+
+def record_cached_session(manager, message: str, context: Dict[str, Any], result: Dict[str, Any]):
+    """
+    Give a result served from the response cache a tracker session of its own
+
+    Args:
+        manager: SDK AgentManager instance
+        message: User message/command
+        context: Context dictionary built with build_frappe_context
+        result: Cached result, updated with session_id and session_data
+    """
+    tracker = manager.tracker
+    result["session_id"] = tracker.start_session(
+        user=context.get('user', 'Unknown'),
+        initial_message=message
+    )
+
+    for tc in result.get("tool_calls", []):
+        tracker.record_action(tool_name=tc.get("name"), tool_arguments=tc.get("args", {}))
+
+    result["session_data"] = tracker.end_session(final_outcome=result.get("content") or "Done").to_dict()
+
+
+def _build_system_prompt(context: Dict[str, Any]) -> str:
+    """SDK system prompt plus the schema digest from the context"""
+    if not HAS_LANGCHAIN:
+        return ""
+
+    system_prompt = build_system_prompt(context)
+    if context.get('schema_digest'):
+        system_prompt += "\n\n" + context['schema_digest']
+    return system_prompt
+
+
+def _initialize_agent(
+    manager,
+    context: Dict[str, Any],
+    state: tool_executor.ToolRunState,
+    system_prompt: str,
+    report: Dict[str, Any]
+):
+    """
+    Build the agent graph for this request on top of a reused chat model
+
+    The SDK creates a new ChatGoogleGenerativeAI client on every execution.
+    Here the client and tool list are created once and kept on the manager,
+    so pooled managers reuse the same HTTP session across requests. Only the
+    system prompt, the server-side tools and the prompt budget middleware,
+    which depend on the request, are rebuilt.
+
+    Args:
+        manager: SDK AgentManager instance
+        context: Context information (used by the SDK fallback)
+        state: Run state for the server-side tools
+        system_prompt: Prompt from _build_system_prompt, plus any history summary
+        report: Prompt budget report the middleware adds its savings to
+    """
+    if not HAS_LANGCHAIN:
+        manager._initialize_agent(context)
+        return
+
+    config = manager.config
+    if getattr(manager, '_chat_model', None) is None:
+        manager._chat_model = ChatGoogleGenerativeAI(
+            model=config.model_name,
+            google_api_key=config.api_key,
+            temperature=config.temperature,
+            max_tokens=config.max_tokens
+        )
+        manager._tools = get_all_tools()
+
+    manager.agent = create_agent(
+        model=manager._chat_model,
+        tools=tool_executor.build_tools(manager._tools, state),
+        system_prompt=system_prompt,
+        middleware=prompt_budget.get_middleware(report)
+    )
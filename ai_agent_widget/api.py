@@ -8,9 +8,11 @@ All core functionality is handled by the SDK package.
 import frappe
 from frappe import _
 import json
+import os
+import time
 
 try:
-    from nutaan_erp import AgentManager, AgentConfig
+    from nutaan_erp import AgentConfig
     from nutaan_erp.utils import build_frappe_context
     HAS_SDK = True
 except ImportError:
@@ -19,6 +21,25 @@ except ImportError:
 # Import export and sharing services
 from . import export_service
 from . import sharing_service
+from . import agent_runner
+from . import agent_pool
+from . import user_context
+from . import conversation_store
+from . import response_cache
+from . import agent_jobs
+from . import rate_limiter
+from . import entity_lookup
+from . import name_index
+from . import schema_digest
+from . import telemetry
+from . import pdf_cache
+from . import pdf_jobs
+from . import report_store
+from . import session_archive
+from . import bulk_export
+
+# Realtime event carrying incremental agent steps to the widget
+AGENT_STEP_EVENT = "ai_agent_step"
 
 @frappe.whitelist(allow_guest=False)
 def agent_stream():
@@ -30,6 +51,24 @@ def agent_stream():
     2. Builds context using SDK utilities
     3. Delegates execution to SDK's AgentManager
     4. Returns results to frontend
+    
+    When the request carries a ``stream_id``, every agent step is also
+    published as a realtime event as soon as it is produced. The final
+    JSON response is unchanged, so clients without streaming still work.
+    
+    When the request carries a ``conversation_id``, history is rebuilt from
+    the server-side conversation store and the client only sends the new
+    message and its last ``cursor``. Requests without it keep sending the
+    full ``history``.
+    
+    Results are memoized per message, route, roles, model and history.
+    Requests whose outcome depends on page state send ``no_cache``.
+    
+    With async execution (``async`` in the request or
+    ``ai_agent_async_execution`` in site_config.json) the run is queued as a
+    background job and only a ``job_id`` is returned; see agent_jobs.
+    
+    Each synchronous run is traced phase by phase; see telemetry.
     """
     
     # Check if SDK is installed
@@ -41,13 +80,44 @@ def agent_stream():
     
     # Get request data
     data = json.loads(frappe.request.data)
+    
+    # Hand the run to a background worker when async execution is requested
+    if agent_jobs.is_async_requested(data):
+        return agent_jobs.enqueue_agent_run(data)
+    
+    trace = telemetry.start_trace(kind="request")
+    result = run_agent_request(data)
+    # Saved by the after_request hook, once the response is serialized
+    trace.mark_returned()
+    
+    return result
+
+
+def run_agent_request(data, on_step=None):
+    """
+    Run one agent request for the current session user
+    
+    Shared by the web endpoint and background agent jobs.
+    
+    Args:
+        data: Parsed request payload
+        on_step: Optional callback for agent steps (defaults to publishing
+            realtime events when the payload carries a stream_id)
+        
+    Returns:
+        dict with agent results
+    """
     message = data.get("message", "")
     request_context = data.get("context", {})
     conversation_history = data.get("history", [])
+    stream_id = data.get("stream_id")
+    conversation_id = data.get("conversation_id")
+    trace = telemetry.current()
     
     # Get Frappe site configuration
     api_key = frappe.conf.get("gemini_api_key")
     model_name = frappe.conf.get("gemini_model", "gemini-2.0-flash-exp")
+    trace.set(model=model_name)
     
     if not api_key:
         return {
@@ -64,25 +134,108 @@ def agent_stream():
             max_tokens=4000
         )
         
-        # Get user information
-        user = frappe.get_doc("User", frappe.session.user)
-        roles = frappe.get_roles(frappe.session.user)
+        # Rebuild history from the server-side store (delta uploads)
+        if conversation_id:
+            with trace.span("history_load"):
+                stored = conversation_store.resolve_history(
+                    frappe.session.user,
+                    conversation_id,
+                    data.get("cursor"),
+                    conversation_history
+                )
+            if stored.get("resync_required"):
+                return {
+                    "success": False,
+                    "resync_required": True,
+                    "cursor": stored["cursor"]
+                }
+            conversation_history = stored["history"]
+        
+        # Get user information (cached, no DB queries on warm paths)
+        with trace.span("user_context"):
+            user_info = user_context.get_user_context(frappe.session.user)
         
         # Build context using SDK utility
-        context = build_frappe_context(
-            user=frappe.session.user,
-            current_path=request_context.get('currentPath', '/'),
-            roles=roles,
-            user_full_name=user.full_name
-        )
-        
-        # Create agent manager and execute
-        manager = AgentManager(config)
-        result = manager.execute(
-            message=message,
-            context=context,
-            history=conversation_history
-        )
+        with trace.span("context_build"):
+            context = build_frappe_context(
+                user=frappe.session.user,
+                current_path=request_context.get('currentPath', '/'),
+                roles=user_info["roles"],
+                user_full_name=user_info["full_name"]
+            )
+            # Unsaved edits on the open form: field reads must go to the browser
+            context["is_dirty"] = bool(request_context.get('isDirty'))
+        
+        # Serve repeat prompts from the response cache unless the client opts out
+        cache_key = None
+        result = None
+        if response_cache.is_enabled() and not data.get("no_cache"):
+            with trace.span("cache_lookup"):
+                cache_key = response_cache.make_key(
+                    frappe.session.user,
+                    message,
+                    context["current_path"],
+                    user_info["roles"],
+                    model_name,
+                    conversation_history
+                )
+                result = response_cache.lookup(cache_key)
+        trace.set(cached=result is not None)
+        
+        if result is not None:
+            # A cached answer gets its own tracker session, not the stored request's
+            with agent_pool.lease_manager(config) as manager:
+                agent_runner.record_cached_session(manager, message, context, result)
+        else:
+            # Field layout of the forms involved, so the agent can plan them in one go
+            with trace.span("schema_digest"):
+                context["schema_digest"] = schema_digest.build_for_request(message, context["current_path"])
+            
+            try:
+                # Wait briefly for a rate-limit token and a concurrency slot
+                wait_start = time.perf_counter()
+                with rate_limiter.acquire(frappe.session.user, agent_jobs.get_timeout()) as rate_limit:
+                    trace.add("rate_limit_wait", wait_start)
+                    
+                    # Lease a pooled agent manager and execute
+                    lease_start = time.perf_counter()
+                    with agent_pool.lease_manager(config) as manager:
+                        trace.add("pool_lease", lease_start)
+                        result = agent_runner.run_agent(
+                            manager,
+                            message=message,
+                            context=context,
+                            history=conversation_history,
+                            on_step=on_step or (_step_publisher(stream_id) if stream_id else None)
+                        )
+            except rate_limiter.RateLimitExceeded as e:
+                return {
+                    "success": False,
+                    "rate_limited": True,
+                    "error": str(e),
+                    "retry_after": e.retry_after
+                }
+            
+            if cache_key and result.get("success"):
+                response_cache.store(cache_key, result)
+            
+            result["rate_limit"] = rate_limit
+        
+        if conversation_id and result.get("success"):
+            result["conversation_id"] = conversation_id
+            with trace.span("history_store"):
+                result["cursor"] = conversation_store.append(
+                    frappe.session.user,
+                    conversation_id,
+                    [
+                        {"role": "user", "content": message},
+                        {"role": "assistant", "content": result.get("content", "")}
+                    ]
+                )
+        
+        if result.get("success") and session_archive.is_enabled():
+            with trace.span("session_archive"):
+                session_archive.record_exchange(frappe.session.user, conversation_id, message, result)
         
         return result
         
@@ -101,16 +254,214 @@ def agent_stream():
         }
 
 
+def _step_publisher(stream_id):
+    """
+    Build a callback that pushes agent steps to the requesting user
+    
+    Args:
+        stream_id: Client generated id used to match events to a request
+        
+    Returns:
+        Callable accepting (index, step)
+    """
+    user = frappe.session.user
+    
+    def publish(index, step):
+        frappe.publish_realtime(
+            AGENT_STEP_EVENT,
+            {"stream_id": stream_id, "index": index, "step": step},
+            user=user
+        )
+    
+    return publish
+
+
+@frappe.whitelist(allow_guest=False)
+def get_agent_job(job_id, since=0):
+    """
+    Poll a background agent run
+    
+    Args:
+        job_id: Job id returned by agent_stream in async mode
+        since: Number of steps already received
+        
+    Returns:
+        dict with status, new steps and the final result once finished
+    """
+    return agent_jobs.get_job_state(job_id, since)
+
+
+@frappe.whitelist(allow_guest=False)
+def cancel_agent_job(job_id):
+    """
+    Cancel a background agent run
+    
+    Args:
+        job_id: Job id returned by agent_stream in async mode
+        
+    Returns:
+        dict with the job status after cancelling
+    """
+    return agent_jobs.cancel_job(job_id)
+
+
+@frappe.whitelist(allow_guest=False)
+def resolve_entities(lookups):
+    """
+    Resolve many search/list/validate tool lookups in one request
+    
+    Args:
+        lookups: JSON list of {tool, doctype, name | search_text, limit}
+        
+    Returns:
+        dict with result strings in request order, formatted like the widget tools
+    """
+    if isinstance(lookups, str):
+        lookups = json.loads(lookups)
+    
+    return {
+        "success": True,
+        "results": entity_lookup.resolve_lookups(lookups)
+    }
+
+
+@frappe.whitelist(allow_guest=False)
+def clear_conversation(conversation_id):
+    """
+    Delete the server-side history of one of the current user's conversations
+    
+    Args:
+        conversation_id: Conversation id generated by the widget
+        
+    Returns:
+        dict with success status
+    """
+    conversation_store.clear(frappe.session.user, conversation_id)
+    
+    return {"success": True}
+
+
+@frappe.whitelist(allow_guest=False)
+def get_agent_occupancy():
+    """
+    Current agent load for this site
+    
+    Returns:
+        dict with rate limits, runs in flight per user and queued jobs
+    """
+    frappe.only_for("System Manager")
+    
+    occupancy = rate_limiter.get_occupancy()
+    occupancy["queued_jobs"] = agent_jobs.get_active_job_count()
+    
+    return occupancy
+
+
+@frappe.whitelist(allow_guest=False)
+def get_agent_pool_stats():
+    """
+    Agent manager pool statistics for the worker serving this request
+    
+    Returns:
+        dict with pool hits, misses and idle managers
+    """
+    frappe.only_for("System Manager")
+    
+    return agent_pool.get_pool_stats()
+
+
+@frappe.whitelist(allow_guest=False)
+def get_response_cache_stats():
+    """
+    Response cache hit-rate metrics for this site
+    
+    Returns:
+        dict with hits, misses, stores, evictions, hit_rate and entries
+    """
+    frappe.only_for("System Manager")
+    
+    return response_cache.get_stats()
+
+
+@frappe.whitelist(allow_guest=False)
+def get_pdf_cache_stats():
+    """
+    Report PDF cache hit-rate and size metrics for this site
+    
+    Returns:
+        dict with hits, misses, stores, evictions, hit_rate, entries and bytes,
+        plus the shared report store's entries, bytes and max_bytes
+    """
+    frappe.only_for("System Manager")
+    
+    stats = pdf_cache.get_stats()
+    stats["report_store"] = report_store.get_stats()
+    return stats
+
+
+@frappe.whitelist(allow_guest=False)
+def get_agent_latency_stats(minutes=None):
+    """
+    Agent latency percentiles from recent traces
+    
+    Args:
+        minutes: Only consider traces from the last N minutes
+        
+    Returns:
+        dict with p50/p95/p99 in ms per phase and per model for this site
+    """
+    frappe.only_for("System Manager")
+    
+    return telemetry.get_latency_stats(minutes)
+
+
 @frappe.whitelist(allow_guest=False)
-def export_session_pdf(session_data):
+def get_name_index_stats():
+    """
+    Records indexed per doctype in the fuzzy name index
+    
+    Returns:
+        dict of doctype -> {records}, records is None until the index is built
+    """
+    frappe.only_for("System Manager")
+    
+    return name_index.get_stats()
+
+
+@frappe.whitelist(allow_guest=False)
+def rebuild_name_index(doctype=None):
+    """
+    Rebuild the fuzzy name index in the background
+    
+    Args:
+        doctype: Doctype to rebuild, or all indexed doctypes when empty
+        
+    Returns:
+        dict with success status
+    """
+    frappe.only_for("System Manager")
+    
+    frappe.enqueue(
+        "ai_agent_widget.name_index.rebuild",
+        queue="long",
+        timeout=3600,
+        doctype=doctype or None
+    )
+    
+    return {"success": True, "message": _("Name index rebuild queued")}
+
+
+@frappe.whitelist(allow_guest=False)
+def export_session_pdf(session_data, background=None):
     """
     Export session data as PDF
     
     Args:
         session_data: JSON string of session data from frontend
+        background: Render in a background job (defaults to ai_agent_pdf_background)
         
     Returns:
-        dict with success status
+        dict with success status; pending is set while a background render runs
     """
     try:
         # Parse session data
@@ -119,16 +470,17 @@ def export_session_pdf(session_data):
         
         session_id = session_data.get('session_id', 'unknown')
         
-        # Generate PDF
-        pdf_bytes = export_service.generate_session_pdf(session_data)
-        
-        # Save PDF to temporary storage using Frappe cache
-        import hashlib
-        import time
-        temp_key = hashlib.md5(f"{session_id}_{time.time()}".encode()).hexdigest()
+        if pdf_jobs.is_background_requested(background):
+            result = pdf_jobs.enqueue_render(session_data)
+            result["session_id"] = session_id
+            return result
         
-        # Store in cache (will be manually deleted after download)
-        frappe.cache().set_value(f"pdf_{temp_key}", pdf_bytes)
+        # Render the PDF, or reuse it from the report cache (long sessions
+        # report progress per rendered chunk)
+        temp_key, _pdf_path = pdf_cache.get_session_pdf(
+            session_data,
+            progress=export_service.get_progress_publisher(session_id)
+        )
         
         return {
             "success": True,
@@ -145,35 +497,76 @@ def export_session_pdf(session_data):
 
 
 @frappe.whitelist(allow_guest=False)
-def download_session_pdf(session_id):
+def export_session(session_data, export_format="markdown"):
     """
-    Download PDF as blob (returns raw PDF bytes)
+    Export session data as Markdown, JSON or NDJSON
+    
+    Builds on the same request grouping and action status as the PDF
+    report, without starting a renderer. The file is streamed to the
+    client while it is produced.
+    
+    Args:
+        session_data: JSON string of session data from frontend
+        export_format: markdown, json (one document) or ndjson (one line per action)
+        
+    Returns:
+        Streamed file download
+    """
+    from werkzeug.wrappers import Response
+    
+    if export_format not in export_service.EXPORT_FORMATS:
+        frappe.throw(_("Unsupported export format: {0}").format(export_format))
+    
+    if isinstance(session_data, str):
+        session_data = json.loads(session_data)
+    
+    session_id = str(session_data.get('session_id') or 'unknown')
+    iter_export, content_type, extension = export_service.EXPORT_FORMATS[export_format]
+    
+    response = Response(
+        (chunk.encode() for chunk in iter_export(session_data)),
+        content_type=content_type,
+        direct_passthrough=True
+    )
+    response.headers["Content-Disposition"] = (
+        f'attachment; filename="Nutaan_AI_Session_{session_id[:8]}.{extension}"'
+    )
+    
+    return response
+
+
+@frappe.whitelist(allow_guest=False)
+def download_session_pdf(session_id, temp_key=None):
+    """
+    Download a rendered report
+    
+    The PDF is streamed from disk with Content-Length, an ETag (the report's
+    content hash) and Range support, so a repeat download is answered with
+    304 Not Modified. Behind Frappe's nginx config the file is handed to
+    nginx with X-Accel-Redirect instead.
     
     Args:
         session_id: Session ID to download PDF for
+        temp_key: Key returned by export_session_pdf
         
     Returns:
-        PDF bytes as response
+        PDF file response, or the render state while a background render runs
     """
     try:
-        # Get temp key from previous export call
-        # For now, generate PDF on demand
-        # In production, retrieve from cache if available
-        
-        # This is a simplified approach - in real use, session_data should be passed
-        # For now, we'll use the fact that frontend calls export first, then download
-        
-        # Check cache first
-        temp_key = frappe.request.json.get('temp_key') if hasattr(frappe.request, 'json') else None
+        if not temp_key:
+            temp_key = frappe.request.json.get('temp_key') if hasattr(frappe.request, 'json') else None
         
         if temp_key:
-            pdf_bytes = frappe.cache().get_value(f"pdf_{temp_key}")
-            if pdf_bytes:
+            pdf_path = pdf_cache.get_path(temp_key)
+            if pdf_path:
                 # Don't delete - allow multiple downloads
-                frappe.local.response.filename = f"Nutaan_AI_Report_{session_id[:8]}.pdf"
-                frappe.local.response.filecontent = pdf_bytes
-                frappe.local.response.type = "pdf"
-                return
+                return _send_report(pdf_path, temp_key, f"Nutaan_AI_Report_{session_id[:8]}.pdf")
+        
+        # A background render may still be running
+        if temp_key:
+            state = pdf_jobs.get_render_state(temp_key)
+            if state.get("pending"):
+                return state
         
         # Fallback: should not reach here in normal flow
         return {
@@ -190,15 +583,16 @@ def download_session_pdf(session_id):
 
 
 @frappe.whitelist(allow_guest=False)
-def share_session_whatsapp(session_data):
+def share_session_whatsapp(session_data, background=None):
     """
     Generate WhatsApp share link for session report
     
     Args:
         session_data: JSON string of session data from frontend
+        background: Render in a background job (defaults to ai_agent_pdf_background)
         
     Returns:
-        dict with WhatsApp URL
+        dict with WhatsApp URL, or pending while the PDF renders (call again once ready)
     """
     try:
         # Parse session data
@@ -207,9 +601,10 @@ def share_session_whatsapp(session_data):
         
         session_id = session_data.get('session_id', 'unknown')
         
-        # Generate and save PDF
-        pdf_bytes = export_service.generate_session_pdf(session_data)
-        pdf_path = export_service.save_session_pdf(session_id, pdf_bytes)
+        pdf_key = pdf_cache.make_key(session_data)
+        pdf_path = _get_shared_pdf(session_id, session_data, pdf_key, background)
+        if isinstance(pdf_path, dict):
+            return pdf_path
         
         # Create shareable link
         pdf_url = export_service.create_shareable_link(session_id, pdf_path)
@@ -232,16 +627,17 @@ def share_session_whatsapp(session_data):
 
 
 @frappe.whitelist(allow_guest=False)
-def share_session_email(session_data, to_email):
+def share_session_email(session_data, to_email, background=None):
     """
     Send session report via email
     
     Args:
         session_data: JSON string of session data from frontend
         to_email: Recipient email address
+        background: Render in a background job (defaults to ai_agent_pdf_background)
         
     Returns:
-        dict with success status
+        dict with success status, or pending while the PDF renders (call again once ready)
     """
     try:
         # Parse session data
@@ -250,26 +646,19 @@ def share_session_email(session_data, to_email):
         
         session_id = session_data.get('session_id', 'unknown')
         
-        # Generate and save PDF
-        pdf_bytes = export_service.generate_session_pdf(session_data)
-        pdf_path = export_service.save_session_pdf(session_id, pdf_bytes)
+        pdf_key = pdf_cache.make_key(session_data)
+        pdf_path = _get_shared_pdf(session_id, session_data, pdf_key, background)
+        if isinstance(pdf_path, dict):
+            return pdf_path
         
         # Get session summary for email
-        from datetime import datetime
-        start_time = session_data.get('start_time', '')
-        end_time = session_data.get('end_time', '')
-        
-        duration_seconds = 0
-        if start_time and end_time:
-            start = datetime.fromisoformat(start_time)
-            end = datetime.fromisoformat(end_time)
-            duration_seconds = int((end - start).total_seconds())
+        stats = export_service.get_session_stats(session_data, pdf_key)
         
         session_summary = {
             'session_id': session_id,
-            'total_actions': session_data.get('total_actions', 0),
-            'duration_seconds': duration_seconds,
-            'initial_message': session_data.get('initial_message', 'N/A')
+            'total_actions': stats.total_actions,
+            'duration_seconds': stats.duration_seconds,
+            'initial_message': stats.initial_message or session_data.get('initial_message', 'N/A')
         }
         
         # Send email
@@ -292,3 +681,149 @@ def share_session_email(session_data, to_email):
             "error": str(e)
         }
 
+
+@frappe.whitelist(allow_guest=False)
+def get_session_stats(session_data):
+    """
+    Summary figures of a session, as shown in its report
+    
+    Args:
+        session_data: JSON string of session data from frontend
+        
+    Returns:
+        dict with requests, total_actions, success_count, documents_created,
+        doctypes, initial_message, start_time, end_time and duration_seconds
+    """
+    if isinstance(session_data, str):
+        session_data = json.loads(session_data)
+    
+    stats = export_service.get_session_stats(session_data)
+    
+    return {"success": True, "stats": stats.to_dict()}
+
+
+@frappe.whitelist(allow_guest=False)
+def get_pdf_render_state(temp_key):
+    """
+    Poll a background PDF render
+    
+    Args:
+        temp_key: Key returned by export_session_pdf or a share endpoint
+        
+    Returns:
+        dict with status, pending and progress; download once pending is false
+    """
+    return pdf_jobs.get_render_state(temp_key)
+
+
+@frappe.whitelist(allow_guest=False)
+def start_bulk_export(from_date, to_date=None, users=None, export_format="pdf"):
+    """
+    Export all archived sessions in a date range as one ZIP (System Manager only)
+    
+    Args:
+        from_date: First day, YYYY-MM-DD
+        to_date: Last day, YYYY-MM-DD (defaults to from_date)
+        users: JSON list of users to limit the export to
+        export_format: pdf, markdown, json or ndjson
+        
+    Returns:
+        dict with job_id; poll get_bulk_export for progress and the file
+    """
+    frappe.only_for("System Manager")
+    
+    if isinstance(users, str):
+        users = json.loads(users) if users.strip().startswith("[") else [u.strip() for u in users.split(",") if u.strip()]
+    
+    return bulk_export.enqueue_bulk_export(from_date, to_date, users, export_format)
+
+
+@frappe.whitelist(allow_guest=False)
+def get_bulk_export(job_id):
+    """
+    Poll a bulk session export (System Manager only)
+    
+    Args:
+        job_id: Job id returned by start_bulk_export
+        
+    Returns:
+        dict with status, done and failed counts and, once finished, file_url
+    """
+    frappe.only_for("System Manager")
+    
+    return bulk_export.get_bulk_export(job_id)
+
+
+def _get_shared_pdf(session_id, session_data, pdf_key, background):
+    """
+    Stored report for a share request, rendered and stored when new
+    
+    Returns:
+        Site-relative path of the PDF, or the pending render state
+    """
+    # A report shared before is reused as is
+    pdf_path = export_service.find_shared_pdf(pdf_key)
+    if pdf_path:
+        return pdf_path
+    
+    pending = _render_in_background(session_data, background)
+    if pending:
+        return pending
+    
+    # Generate (or reuse the cached) PDF and save it
+    _, cached_path = pdf_cache.get_session_pdf(session_data, key=pdf_key)
+    return export_service.save_session_pdf(session_id, cached_path, pdf_key)
+
+
+def _render_in_background(session_data, background):
+    """
+    Queue the report render for a share request when it should not block
+    
+    Returns:
+        Pending render state, or None when the PDF is cached or rendering inline
+    """
+    if not pdf_jobs.is_background_requested(background):
+        return None
+    
+    state = pdf_jobs.enqueue_render(session_data)
+    return state if state["pending"] or not state["success"] else None
+
+
+def _send_report(pdf_path, etag, filename):
+    """
+    File response for a stored report
+    
+    Args:
+        pdf_path: Absolute path of the PDF
+        etag: Strong validator for the file (its content hash)
+        filename: Download file name
+        
+    Returns:
+        werkzeug Response
+    """
+    from urllib.parse import quote
+    from werkzeug.wrappers import Response
+    from werkzeug.utils import send_file
+    
+    request = frappe.local.request
+    
+    if request.headers.get("X-Use-X-Accel-Redirect"):
+        # Same handoff as Frappe's private files: nginx serves /protected/
+        # from the site folder, ranges included
+        response = Response(content_type="application/pdf")
+        response.headers["X-Accel-Redirect"] = quote(
+            "/protected/" + os.path.relpath(pdf_path, frappe.get_site_path())
+        )
+        response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+        response.set_etag(etag)
+        return response.make_conditional(request.environ)
+    
+    return send_file(
+        pdf_path,
+        request.environ,
+        mimetype="application/pdf",
+        as_attachment=True,
+        download_name=filename,
+        etag=etag,
+        conditional=True
+    )
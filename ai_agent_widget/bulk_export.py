@@ -0,0 +1,338 @@
+"""
+Bulk Export for AI Agent Widget
+
+Exports every archived session matching a filter (date range, optionally
+some users) as one ZIP file, in a single background job. Sessions come from
+session_archive and are rendered through export_service.
+
+The ZIP is written to the site's private files entry by entry: text
+formats are streamed straight into their entry, PDFs are rendered by a
+thread pool into temporary files, with a bounded number of sessions in
+flight, and copied into their entry, so memory does not grow with the
+size of the export. The last entry, manifest.json, lists
+every session with its file and status; a session that fails to render is
+recorded there and does not fail the export. The finished ZIP is attached
+as a private File and announced with a realtime event.
+
+Settings in site_config.json:
+
+- ``ai_agent_bulk_export_workers``: parallel PDF renders (4)
+- ``ai_agent_bulk_export_timeout``: seconds per export job (21600)
+"""
+
+import frappe
+from frappe import _
+import json
+import os
+import tempfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from frappe.utils import now_datetime
+from typing import Dict, List, Any, Optional
+
+from . import export_service
+from . import session_archive
+
+
+KEY_PREFIX = "ai_agent_bulk_export"
+
+# Realtime events sent to the user who started the export
+PROGRESS_EVENT = "ai_agent_bulk_export_progress"
+DONE_EVENT = "ai_agent_bulk_export_done"
+
+# Defaults, overridable in site_config.json
+DEFAULT_QUEUE = "long"
+DEFAULT_WORKERS = 4
+DEFAULT_TIMEOUT = 6 * 60 * 60  # seconds
+
+# Job state and progress events are updated every this many sessions
+PROGRESS_EVERY = 25
+
+# How long finished exports stay available for polling
+RESULT_TTL = 24 * 60 * 60  # seconds
+
+EXPORT_FOLDER = "ai_agent_exports"
+
+FINAL_STATES = ("finished", "failed")
+
+
+def enqueue_bulk_export(
+    from_date: str,
+    to_date: Optional[str] = None,
+    users: Optional[List[str]] = None,
+    export_format: str = "pdf"
+) -> Dict[str, Any]:
+    """
+    Queue an export of all archived sessions matching a filter
+
+    Args:
+        from_date: First day, YYYY-MM-DD
+        to_date: Last day, YYYY-MM-DD (defaults to from_date)
+        users: Only sessions of these users
+        export_format: pdf or one of export_service.EXPORT_FORMATS
+
+    Returns:
+        dict with job_id
+    """
+    if export_format != "pdf" and export_format not in export_service.EXPORT_FORMATS:
+        return {"success": False, "error": _("Unsupported export format: {0}").format(export_format)}
+
+    to_date = to_date or from_date
+    for value in (from_date, to_date):
+        if not _is_date(value):
+            return {"success": False, "error": _("Invalid date, expected YYYY-MM-DD: {0}").format(value)}
+
+    if from_date > to_date:
+        return {"success": False, "error": _("From date is after to date")}
+
+    job_id = frappe.generate_hash(length=16)
+
+    _save_job(job_id, {
+        "status": "queued",
+        "user": frappe.session.user,
+        "queued_at": time.time(),
+        "filters": {"from_date": from_date, "to_date": to_date, "users": users or []},
+        "export_format": export_format
+    })
+
+    frappe.enqueue(
+        "ai_agent_widget.bulk_export.run_bulk_export",
+        queue=DEFAULT_QUEUE,
+        timeout=int(frappe.conf.get("ai_agent_bulk_export_timeout") or DEFAULT_TIMEOUT),
+        bulk_export_id=job_id
+    )
+
+    return {"success": True, "job_id": job_id, "status": "queued"}
+
+
+def run_bulk_export(bulk_export_id: str):
+    """
+    Background job entry point
+
+    Args:
+        bulk_export_id: Job id returned by enqueue_bulk_export
+    """
+    job = _get_job(bulk_export_id)
+    if not job or job["status"] in FINAL_STATES:
+        return
+
+    job.update(status="running", started_at=time.time(), done=0, failed=0)
+    _save_job(bulk_export_id, job)
+
+    filters = job["filters"]
+    file_name = f"ai-agent-sessions-{filters['from_date']}-{filters['to_date']}-{bulk_export_id}.zip"
+    folder = frappe.get_site_path("private", "files", EXPORT_FOLDER)
+    path = os.path.join(folder, file_name)
+
+    try:
+        os.makedirs(folder, exist_ok=True)
+        sessions = session_archive.find_sessions(filters["from_date"], filters["to_date"], filters["users"])
+
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            if job["export_format"] == "pdf":
+                manifest = _write_pdfs(archive, sessions, bulk_export_id, job)
+            else:
+                manifest = _write_text(archive, sessions, bulk_export_id, job)
+
+            archive.writestr("manifest.json", json.dumps({
+                "created_at": now_datetime().isoformat(),
+                "created_by": job["user"],
+                "filters": filters,
+                "format": job["export_format"],
+                "total": len(manifest),
+                "failed": job["failed"],
+                "sessions": manifest
+            }, indent=2, default=str))
+
+        file_doc = frappe.get_doc({
+            "doctype": "File",
+            "file_name": file_name,
+            "file_url": f"/private/files/{EXPORT_FOLDER}/{file_name}",
+            "is_private": 1
+        })
+        file_doc.insert(ignore_permissions=True)
+        frappe.db.commit()
+
+        job.update(file_url=file_doc.file_url, total=len(manifest))
+        _finish(bulk_export_id, job, "finished")
+
+    except Exception as e:
+        frappe.log_error(f"AI Agent bulk export error: {str(e)}", "AI Agent Export")
+        if os.path.exists(path):
+            os.remove(path)
+        _finish(bulk_export_id, job, "failed", str(e))
+
+
+def get_bulk_export(job_id: str) -> Dict[str, Any]:
+    """
+    Poll a bulk export
+
+    Args:
+        job_id: Job id returned by enqueue_bulk_export
+
+    Returns:
+        dict with status, done and failed counts and, once finished, file_url
+    """
+    job = _get_job(job_id)
+    if not job:
+        return {"success": False, "error": _("Bulk export not found")}
+
+    return {
+        "success": job["status"] != "failed",
+        "job_id": job_id,
+        "status": job["status"],
+        "done": job.get("done", 0),
+        "failed": job.get("failed", 0),
+        "total": job.get("total"),
+        "file_url": job.get("file_url"),
+        "error": job.get("error")
+    }
+
+
+def _write_text(archive: zipfile.ZipFile, sessions, job_id: str, job: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Stream text exports into the ZIP one session at a time"""
+    iter_export, _content_type, extension = export_service.EXPORT_FORMATS[job["export_format"]]
+    manifest = []
+
+    for entry in sessions:
+        record = {"date": entry["date"], "status": "exported"}
+        try:
+            session = session_archive.load_session(entry["path"])
+            record.update(_describe(session, entry, extension))
+
+            with archive.open(record["file"], "w") as out:
+                for chunk in iter_export(session):
+                    out.write(chunk.encode())
+        except Exception as e:
+            record.update(status="failed", error=str(e))
+
+        _record(manifest, record, job_id, job)
+
+    return manifest
+
+
+def _write_pdfs(archive: zipfile.ZipFile, sessions, job_id: str, job: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Render PDFs in a thread pool to temporary files, added in order with a bounded window"""
+    workers = int(frappe.conf.get("ai_agent_bulk_export_workers") or DEFAULT_WORKERS)
+    site = frappe.local.site
+    sites_path = frappe.local.sites_path
+    manifest = []
+    pending = deque()
+
+    def write_next():
+        entry, future = pending.popleft()
+        record = {"date": entry["date"], "status": "exported"}
+        pdf_path = None
+        try:
+            session_info, pdf_path = future.result()
+            record.update(session_info)
+            archive.write(pdf_path, record["file"])
+        except Exception as e:
+            record.update(status="failed", error=str(e), source=os.path.basename(entry["path"]))
+        finally:
+            if pdf_path and os.path.exists(pdf_path):
+                os.remove(pdf_path)
+        _record(manifest, record, job_id, job)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for entry in sessions:
+            pending.append((entry, pool.submit(_render_pdf, site, sites_path, job["user"], entry)))
+            # Keep at most two rounds of rendered files waiting
+            if len(pending) >= 2 * workers:
+                write_next()
+
+        while pending:
+            write_next()
+
+    return manifest
+
+
+def _render_pdf(site: str, sites_path: str, user: str, entry: Dict[str, str]):
+    """
+    Render one archived session in a pool thread, with its own site connection
+
+    Returns:
+        (manifest fields, path of a temporary PDF the caller removes)
+    """
+    frappe.init(site=site, sites_path=sites_path)
+    frappe.connect()
+    frappe.set_user(user)
+    fd, pdf_path = tempfile.mkstemp(prefix="ai-agent-export-", suffix=".pdf")
+    os.close(fd)
+    try:
+        session = session_archive.load_session(entry["path"])
+        # Bypass the report cache, whole reports and chunks alike: a bulk
+        # export would flush it for interactive exports
+        export_service.generate_session_pdf(session, pdf_path, use_cache=False)
+        return _describe(session, entry, "pdf"), pdf_path
+    except Exception:
+        os.remove(pdf_path)
+        raise
+    finally:
+        frappe.destroy()
+
+
+def _is_date(value) -> bool:
+    """True for a YYYY-MM-DD string, the format of the archive's day folders"""
+    try:
+        datetime.strptime(value, session_archive.DAY_FORMAT)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def _describe(session: Dict[str, Any], entry: Dict[str, str], extension: str) -> Dict[str, Any]:
+    """
+    Manifest fields and ZIP entry name for a session
+
+    The entry is named after the archive file, whose name is sanitized; the
+    conversation id comes from the client and only goes into the manifest.
+    """
+    user = session.get("user") or "unknown"
+    stem = os.path.splitext(os.path.basename(entry["path"]))[0]
+    return {
+        "file": f"{entry['date']}/{stem}.{extension}",
+        "user": user,
+        "conversation_id": session["session_id"],
+        "messages": len(session["messages"])
+    }
+
+
+def _record(manifest: List[Dict[str, Any]], record: Dict[str, Any], job_id: str, job: Dict[str, Any]):
+    """Add a session to the manifest and report progress now and then"""
+    manifest.append(record)
+    job["done"] += 1
+    if record["status"] == "failed":
+        job["failed"] += 1
+
+    if job["done"] % PROGRESS_EVERY == 0:
+        _save_job(job_id, job)
+        frappe.publish_realtime(
+            PROGRESS_EVENT,
+            {"job_id": job_id, "done": job["done"], "failed": job["failed"]},
+            user=job["user"]
+        )
+
+
+def _finish(job_id: str, job: Dict[str, Any], status: str, error: Optional[str] = None):
+    """Store the final state and notify the user who started the export"""
+    job.update(status=status, finished_at=time.time(), error=error)
+    _save_job(job_id, job)
+
+    frappe.publish_realtime(
+        DONE_EVENT,
+        {"job_id": job_id, "status": status, "file_url": job.get("file_url"), "error": error},
+        user=job["user"]
+    )
+
+
+def _save_job(job_id: str, job: Dict[str, Any]):
+    frappe.cache().set_value(f"{KEY_PREFIX}|{job_id}", job, expires_in_sec=RESULT_TTL)
+
+
+def _get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    # expires=True skips the request-local cache, which would pin a stale state
+    return frappe.cache().get_value(f"{KEY_PREFIX}|{job_id}", expires=True)
@@ -0,0 +1,27 @@
+"""
+Bench Commands for AI Agent Widget
+"""
+
+import click
+import frappe
+from frappe.commands import get_site, pass_context
+
+
+@click.command("rebuild-ai-agent-name-index")
+@click.option("--doctype", help="Rebuild only this doctype")
+@pass_context
+def rebuild_name_index(context, doctype=None):
+    """Rebuild the AI agent's fuzzy name index"""
+    from ai_agent_widget import name_index
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        for dt, count in name_index.rebuild(doctype).items():
+            click.echo(f"{dt}: {count} records indexed")
+    finally:
+        frappe.destroy()
+
+
+commands = [rebuild_name_index]
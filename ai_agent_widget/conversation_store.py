@@ -0,0 +1,172 @@
+"""
+Conversation Store for AI Agent Widget
+
+Keeps conversation history on the server, keyed by user and conversation id,
+so the widget only uploads the new message and a cursor instead of the whole
+history on every request.
+
+Each conversation is a bounded Redis list plus a counter of messages ever
+appended (the cursor). Appends run in a single MULTI/EXEC transaction, so
+several tabs of the same user can share one conversation safely. Both keys
+expire after a period of inactivity.
+"""
+
+import frappe
+import json
+from typing import Dict, List, Any, Optional, Tuple
+
+
+KEY_PREFIX = "ai_agent_conversation"
+
+# Defaults, overridable in site_config.json
+DEFAULT_MAX_MESSAGES = 60
+DEFAULT_TTL = 24 * 60 * 60  # seconds
+
+
+def get_max_messages() -> int:
+    """Messages kept per conversation (ai_agent_conversation_max_messages)"""
+    return int(frappe.conf.get("ai_agent_conversation_max_messages") or DEFAULT_MAX_MESSAGES)
+
+
+def get_ttl() -> int:
+    """Seconds of inactivity before a conversation expires (ai_agent_conversation_ttl)"""
+    return int(frappe.conf.get("ai_agent_conversation_ttl") or DEFAULT_TTL)
+
+
+def _keys(user: str, conversation_id: str) -> Tuple[str, str]:
+    """Site-namespaced Redis keys for a conversation's messages and cursor"""
+    cache = frappe.cache()
+    base = f"{KEY_PREFIX}|{user}|{conversation_id}"
+    return cache.make_key(f"{base}|messages"), cache.make_key(f"{base}|cursor")
+
+
+def load(user: str, conversation_id: str) -> Tuple[List[Dict[str, str]], int]:
+    """
+    Load stored history for a conversation
+
+    Args:
+        user: Owner of the conversation
+        conversation_id: Client generated conversation id
+
+    Returns:
+        Tuple of (history messages, cursor). Cursor is 0 for unknown conversations.
+    """
+    cache = frappe.cache()
+    messages_key, cursor_key = _keys(user, conversation_id)
+
+    pipe = cache.pipeline()
+    pipe.lrange(messages_key, 0, -1)
+    pipe.get(cursor_key)
+    raw_messages, cursor = pipe.execute()
+
+    history = [json.loads(m) for m in raw_messages]
+    return history, int(cursor or 0)
+
+
+def append(user: str, conversation_id: str, messages: List[Dict[str, str]]) -> int:
+    """
+    Append messages to a conversation
+
+    Args:
+        user: Owner of the conversation
+        conversation_id: Client generated conversation id
+        messages: Messages with role and content
+
+    Returns:
+        New cursor (total number of messages ever appended)
+    """
+    if not messages:
+        return load(user, conversation_id)[1]
+
+    return _write(user, conversation_id, messages, replace=False)
+
+
+def replace(user: str, conversation_id: str, messages: List[Dict[str, str]]) -> int:
+    """
+    Replace a conversation's history, e.g. when a client re-seeds it
+
+    Args:
+        user: Owner of the conversation
+        conversation_id: Client generated conversation id
+        messages: Full history with role and content
+
+    Returns:
+        New cursor
+    """
+    return _write(user, conversation_id, messages, replace=True)
+
+
+def clear(user: str, conversation_id: str):
+    """
+    Delete a conversation
+
+    Args:
+        user: Owner of the conversation
+        conversation_id: Client generated conversation id
+    """
+    frappe.cache().delete(*_keys(user, conversation_id))
+
+
+def _write(user: str, conversation_id: str, messages: List[Dict[str, str]], replace: bool) -> int:
+    """Append (or replace) messages, trim to the size bound and refresh the TTL"""
+    cache = frappe.cache()
+    messages_key, cursor_key = _keys(user, conversation_id)
+    max_messages = get_max_messages()
+    ttl = get_ttl()
+
+    encoded = [
+        json.dumps({"role": m.get("role"), "content": m.get("content") or ""})
+        for m in messages[-max_messages:]
+    ]
+
+    pipe = cache.pipeline(transaction=True)
+    if replace:
+        pipe.delete(messages_key)
+        pipe.set(cursor_key, len(messages))
+    else:
+        pipe.incrby(cursor_key, len(messages))
+    if encoded:
+        pipe.rpush(messages_key, *encoded)
+    pipe.ltrim(messages_key, -max_messages, -1)
+    pipe.expire(messages_key, ttl)
+    pipe.expire(cursor_key, ttl)
+    results = pipe.execute()
+
+    return len(messages) if replace else int(results[0])
+
+
+def resolve_history(
+    user: str,
+    conversation_id: str,
+    cursor: Optional[int],
+    client_history: Optional[List[Dict[str, str]]] = None
+) -> Dict[str, Any]:
+    """
+    Rebuild request history from the store
+
+    A client that uploads its full history (first request or after a resync)
+    re-seeds the store with it. A client whose cursor is ahead of the store
+    has lost its server-side history (expiry or eviction) and must resync.
+    A cursor behind the store is fine: another tab appended in between.
+
+    Args:
+        user: Owner of the conversation
+        conversation_id: Client generated conversation id
+        cursor: Last cursor the client received
+        client_history: Full history sent by the client, if any
+
+    Returns:
+        dict with history and cursor, or resync_required
+    """
+    if client_history:
+        return {
+            "history": client_history,
+            "cursor": replace(user, conversation_id, client_history)
+        }
+
+    history, server_cursor = load(user, conversation_id)
+
+    if (cursor or 0) > server_cursor:
+        return {"resync_required": True, "cursor": server_cursor}
+
+    return {"history": history, "cursor": server_cursor}
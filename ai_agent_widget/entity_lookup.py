@@ -0,0 +1,209 @@
+"""
+Entity Lookup for AI Agent Widget
+
+Server-side versions of the widget's read-only lookup tools
+(search_doctype, get_doctype_list, validate_doctype_exists).
+
+Lookups are resolved in batches: all lookups for one doctype share a single
+permission-checked query (IN for existence checks, OR'ed LIKE for searches),
+and results come back in exactly the strings the widget tools produce.
+Searches on doctypes covered by name_index are ranked fuzzy matches instead
+of LIKE scans.
+"""
+
+import frappe
+from collections import defaultdict
+from typing import Dict, List, Any
+
+from . import name_index
+
+LOOKUP_TOOLS = ("search_doctype", "get_doctype_list", "validate_doctype_exists")
+
+# Defaults and display limits, same as the widget tools
+SEARCH_LIMIT = 20
+SEARCH_SHOWN = 10
+LIST_LIMIT = 50
+LIST_SHOWN = 15
+
+
+def resolve_lookups(lookups: List[Dict[str, Any]]) -> List[str]:
+    """
+    Resolve many lookups with one query per doctype and tool
+
+    Args:
+        lookups: Dicts with tool, doctype and name / search_text / limit
+
+    Returns:
+        Result strings in the same order as lookups
+    """
+    results = [None] * len(lookups)
+    groups = defaultdict(list)
+
+    for idx, lookup in enumerate(lookups):
+        tool = lookup.get("tool")
+        if tool not in LOOKUP_TOOLS:
+            results[idx] = f"❌ Unknown tool: {tool}"
+            continue
+        groups[(tool, lookup.get("doctype"))].append(idx)
+
+    for (tool, doctype), indexes in groups.items():
+        group = [lookups[i] for i in indexes]
+        try:
+            if tool == "validate_doctype_exists":
+                resolved = _validate_exists(doctype, group)
+            elif tool == "search_doctype":
+                resolved = _search(doctype, group)
+            else:
+                resolved = _list(doctype, group)
+        except Exception as e:
+            if tool == "validate_doctype_exists":
+                # The widget treats a failed lookup as a missing record
+                resolved = [format_exists(doctype, l.get("name"), False) for l in group]
+            else:
+                verb = "searching" if tool == "search_doctype" else "listing"
+                resolved = [f"❌ Error {verb} {doctype}: {str(e)}"] * len(group)
+
+        for idx, text in zip(indexes, resolved):
+            results[idx] = text
+
+    return results
+
+
+def _validate_exists(doctype: str, group: List[Dict[str, Any]]) -> List[str]:
+    """One IN query for every name checked in a doctype"""
+    names = {str(l.get("name")) for l in group if l.get("name")}
+    existing = set(frappe.get_list(
+        doctype,
+        filters={"name": ["in", list(names)]},
+        pluck="name",
+        limit_page_length=len(names)
+    )) if names else set()
+
+    return [
+        format_exists(doctype, l.get("name"), str(l.get("name")) in existing)
+        for l in group
+    ]
+
+
+def _search(doctype: str, group: List[Dict[str, Any]]) -> List[str]:
+    """Name index matches, else one OR'ed LIKE query for every search text in a doctype"""
+    wanted = {}
+    for l in group:
+        text = l.get("search_text") or ""
+        wanted[text] = max(wanted.get(text, 0), _limit(l, SEARCH_LIMIT))
+
+    if "" in wanted:
+        # An empty search matches everything; run it as a plain list
+        matches = {"": _get_names(doctype, None, wanted.pop(""))}
+    else:
+        matches = {}
+
+    if wanted:
+        matches.update(_search_index(doctype, wanted))
+        for text in matches:
+            wanted.pop(text, None)
+
+    if wanted:
+        total_limit = sum(wanted.values())
+        rows = _get_names(doctype, [["name", "like", f"%{t}%"] for t in wanted], total_limit)
+
+        for text, limit in wanted.items():
+            needle = text.lower()
+            matches[text] = [n for n in rows if needle in n.lower()][:limit]
+
+        # Only a truncated combined query can hide matches, and only for texts
+        # that came back short; re-query just those
+        if len(rows) >= total_limit:
+            for text, limit in wanted.items():
+                if len(matches[text]) < limit:
+                    matches[text] = _get_names(doctype, [["name", "like", f"%{text}%"]], limit)
+
+    return [
+        format_search(
+            doctype,
+            l.get("search_text"),
+            matches[l.get("search_text") or ""][:_limit(l, SEARCH_LIMIT)]
+        )
+        for l in group
+    ]
+
+
+def _search_index(doctype: str, wanted: Dict[str, int]) -> Dict[str, List[str]]:
+    """Fuzzy matches from the name index, permission-checked with one IN query"""
+    if not name_index.is_ready(doctype):
+        return {}
+
+    ranked = {}
+    for text, limit in wanted.items():
+        # Fetch extra so records hidden by permissions do not leave the list short
+        hits = name_index.search(doctype, text, limit * 2)
+        if hits is not None:
+            ranked[text] = [name for name, score in hits]
+
+    candidates = {name for names in ranked.values() for name in names}
+    permitted = set(frappe.get_list(
+        doctype,
+        filters={"name": ["in", list(candidates)]},
+        pluck="name",
+        limit_page_length=len(candidates)
+    )) if candidates else set()
+
+    return {
+        text: [n for n in names if n in permitted][:wanted[text]]
+        for text, names in ranked.items()
+    }
+
+
+def _list(doctype: str, group: List[Dict[str, Any]]) -> List[str]:
+    """One list query for every listing of a doctype, at the largest limit"""
+    names = _get_names(doctype, None, max(_limit(l, LIST_LIMIT) for l in group))
+
+    return [format_list(doctype, names[:_limit(l, LIST_LIMIT)]) for l in group]
+
+
+def _get_names(doctype: str, or_filters, limit: int) -> List[str]:
+    """Permission-checked name query, ordered like frappe.client.get_list"""
+    return frappe.get_list(
+        doctype,
+        or_filters=or_filters,
+        pluck="name",
+        limit_page_length=limit
+    )
+
+
+def _limit(lookup: Dict[str, Any], default: int) -> int:
+    return int(lookup.get("limit") or default)
+
+
+def format_search(doctype: str, search_text: str, names: List[str]) -> str:
+    """search_doctype result string"""
+    if not names:
+        return f'📋 No {doctype} records found matching "{search_text}"'
+
+    total = len(names)
+    display_list = ", ".join(names[:SEARCH_SHOWN])
+    more = f" (showing first {SEARCH_SHOWN})" if total > SEARCH_SHOWN else ""
+    return f'📋 Found {total} {doctype} record(s) matching "{search_text}":\n{display_list}{more}'
+
+
+def format_list(doctype: str, names: List[str]) -> str:
+    """get_doctype_list result string"""
+    if not names:
+        return f"📋 No {doctype} records found in the system"
+
+    total = len(names)
+    shown = names[:LIST_SHOWN]
+    quoted_names = ", ".join(f'"{n}"' for n in shown)
+    more = f" (showing first {LIST_SHOWN})" if total > LIST_SHOWN else ""
+    return (
+        f"📋 Found {total} {doctype} record(s). Use EXACT names in quotes:\n\n"
+        f'First available: "{shown[0]}"\n\n'
+        f"All records: {quoted_names}{more}"
+    )
+
+
+def format_exists(doctype: str, name: str, exists: bool) -> str:
+    """validate_doctype_exists result string"""
+    if exists:
+        return f'✅ {doctype} "{name}" exists'
+    return f'❌ {doctype} "{name}" does NOT exist'
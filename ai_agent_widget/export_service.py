@@ -3,395 +3,309 @@ Export Service for AI Agent Widget
 
 Professional PDF report generation for AI conversations.
 Clean, minimal format with clear user request / agent action separation.
-Includes summary section at the end.
+Includes summary section at the end. Markdown, JSON and NDJSON versions
+of the same content are produced as streams for scripts and BI tools.
+The summary, the email share and the stats endpoint all use SessionStats,
+collected in the same pass that groups the conversation into blocks.
+
+Long sessions are rendered in chunks of conversation blocks, each chunk a
+separate wkhtmltopdf run written to a temporary file, so the HTML and
+renderer memory per run stay bounded however long the session is. The
+chunk files are merged into the output file on disk; reports are passed
+around as files (the report cache and the share store move or copy them
+into place), so no code path holds a finished PDF as bytes. Each chunk's
+PDF is cached by a hash of its HTML, so re-exporting a session that grew
+by a turn only renders the chunks that changed. Settings in
+site_config.json:
+
+- ``ai_agent_pdf_stream_threshold``: messages above which a session is
+  rendered in chunks (200)
+- ``ai_agent_pdf_chunk_blocks``: user requests per chunk (25)
 """
 
 import frappe
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from contextlib import ExitStack
 from frappe.utils.pdf import get_pdf
 from frappe.utils import now_datetime
-from datetime import datetime
-from typing import Dict, List, Any
+from datetime import datetime, timezone
+from itertools import chain, islice
+from typing import Dict, List, Any, Callable, Iterator, Optional
 
+try:
+    from pypdf import PdfReader, PdfWriter
+    HAS_PDF_WRITER = True
+except ImportError:
+    try:
+        from PyPDF2 import PdfReader, PdfWriter
+        HAS_PDF_WRITER = True
+    except ImportError:
+        HAS_PDF_WRITER = False
 
-def generate_conversation_report_html(conversation_data: Dict[str, Any]) -> str:
-    """
-    Generate professional HTML report for AI conversation
-    
-    Args:
-        conversation_data: Full conversation data with messages array
-        
-    Returns:
-        Clean, professional HTML ready for PDF conversion
-    """
-    messages = conversation_data.get('messages', [])
-    
-    # Group messages by user request and track summary data
-    conversation_blocks = []
-    current_block = None
-    total_actions = 0
-    documents_created = []
-    all_doctypes = set()
-    
-    for msg in messages:
-        role = msg.get('role', 'user')
-        content = msg.get('content', '')
-        tool_calls = msg.get('toolCalls', [])
-        timestamp = msg.get('timestamp', '')
-        
-        if role == 'user':
-            # Start new conversation block
-            if current_block:
-                conversation_blocks.append(current_block)
-            
-            current_block = {
-                'user_request': content,
-                'timestamp': timestamp,
-                'actions': [],
-                'ai_response': ''
-            }
-        
-        elif role == 'assistant' and current_block:
-            # Add AI response and actions to current block
-            if content and content.strip():
-                current_block['ai_response'] = content
-            
-            if tool_calls:
-                for tc in tool_calls:
-                    action = {
-                        'name': tc.get('name', 'Unknown'),
-                        'args': tc.get('args', {}),
-                        'result': tc.get('result', '')
-                    }
-                    current_block['actions'].append(action)
-                    total_actions += 1
-                    
-                    # Track documents and doctypes
-                    args = action['args']
-                    result_str = str(action['result'])
-                    
-                    if 'doctype' in args:
-                        all_doctypes.add(args['doctype'])
-                    
-                    # Detect document creation
-                    if action['name'] == 'create_doc' and '✅' in result_str:
-                        doc_detail = f"New {args.get('doctype', 'Document')}"
-                        if doc_detail not in [d['detail'] for d in documents_created]:
-                            documents_created.append({
-                                'doctype': args.get('doctype', 'Unknown'),
-                                'detail': doc_detail
-                            })
-    
-    # Add last block
-    if current_block:
-        conversation_blocks.append(current_block)
-    
-    # Build conversation HTML
-    conversation_html = ""
-    
-    for idx, block in enumerate(conversation_blocks, 1):
-        timestamp = block.get('timestamp', '')
-        try:
-            dt = datetime.fromisoformat(timestamp) if timestamp else None
-            time_display = dt.strftime('%I:%M %p') if dt else ''
-        except:
-            time_display = ''
-        
-        # User Request Section
-        conversation_html += f"""
-        <div class="conversation-block">
-            <div class="request-section">
-                <div class="request-header">
-                    <span class="request-number">Request #{idx}</span>
-                    <span class="timestamp">{time_display}</span>
-                </div>
-                <div class="request-content">{_escape_html(block['user_request'])}</div>
-            </div>
-        """
-        
-        # Agent Actions Section
-        if block['actions']:
-            conversation_html += '<div class="actions-section">'
-            conversation_html += '<div class="actions-header">Agent Actions:</div>'
-            
-            for action in block['actions']:
-                tool_name = action['name']
-                args = action['args']
-                result = str(action['result'])
-                
-                # Determine status
-                if '✅' in result:
-                    status = 'success'
-                    icon = '✅'
-                elif '❌' in result:
-                    status = 'error'
-                    icon = '❌'
-                else:
-                    status = 'info'
-                    icon = '⚡'
-                
-                # Format action details
-                details = _format_action_details(tool_name, args)
-                
-                conversation_html += f"""
-                <div class="action {status}">
-                    <div class="action-name">{icon} {_format_tool_name(tool_name)}</div>
-                    {f'<div class="action-details">{details}</div>' if details else ''}
-                    <div class="action-result">{_escape_html(result)}</div>
-                </div>
-                """
-            
-            conversation_html += '</div>'
-        
-        # AI Response (if any meaningful text)
-        if block.get('ai_response') and block['ai_response'].strip():
-            conversation_html += f"""
-            <div class="ai-response">
-                <div class="response-label">Summary:</div>
-                <div class="response-text">{_escape_html(block['ai_response'])}</div>
-            </div>
-            """
-        
-        conversation_html += '</div>'
-    
-    # Build summary section
-    summary_html = _generate_summary_section(
-        total_actions,
-        documents_created,
-        list(all_doctypes),
-        conversation_blocks
-    )
-    
-    # Generate current date
-    current_date = now_datetime().strftime('%B %d, %Y')
-    current_time = now_datetime().strftime('%I:%M %p UTC')
-    
-    # Build complete HTML
-    html = f"""
+
+DEFAULT_STREAM_THRESHOLD = 200  # messages
+
+DEFAULT_CHUNK_BLOCKS = 25  # user requests per rendered chunk
+
+PROGRESS_EVENT = "ai_agent_export_progress"
+
+# Bump when the report markup changes, so cached reports are rendered again
+REPORT_VERSION = 1
+
+STATS_KEY_PREFIX = "ai_agent_session_stats"
+STATS_TTL = 60 * 60  # seconds
+
+
+# Static parts of the report page. The head with all styles is a plain
+# constant, so only the title line, conversation and summary are built
+# per report.
+
+_REPORT_STYLE = """
     <!DOCTYPE html>
     <html>
     <head>
         <meta charset="utf-8">
         <style>
-            @page {{
+            @page {
                 size: A4;
                 margin: 20mm 15mm;
-            }}
+            }
             
-            body {{
+            body {
                 font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Arial, sans-serif;
                 color: #1a1a1a;
                 line-height: 1.6;
                 font-size: 10pt;
-            }}
+            }
             
-            .header {{
+            .header {
                 border-bottom: 2px solid #333;
                 padding-bottom: 15px;
                 margin-bottom: 30px;
-            }}
+            }
             
-            .header h1 {{
+            .header h1 {
                 margin: 0;
                 font-size: 18pt;
                 font-weight: 600;
                 color: #1a1a1a;
-            }}
+            }
             
-            .header .subtitle {{
+            .header .subtitle {
                 color: #666;
                 font-size: 9pt;
                 margin-top: 5px;
-            }}
+            }
             
-            .conversation-block {{
+            .conversation-block {
                 margin-bottom: 30px;
                 page-break-inside: avoid;
-            }}
+            }
             
-            .request-section {{
+            .request-section {
                 background: #f8f9fa;
                 border-left: 4px solid #2563eb;
                 padding: 15px;
                 margin-bottom: 15px;
-            }}
+            }
             
-            .request-header {{
+            .request-header {
                 display: flex;
                 justify-content: space-between;
                 margin-bottom: 10px;
-            }}
+            }
             
-            .request-number {{
+            .request-number {
                 font-weight: 700;
                 color: #2563eb;
                 font-size: 10pt;
-            }}
+            }
             
-            .timestamp {{
+            .timestamp {
                 color: #999;
                 font-size: 8pt;
-            }}
+            }
             
-            .request-content {{
+            .request-content {
                 font-size: 10pt;
                 color: #1a1a1a;
                 line-height: 1.6;
-            }}
+            }
             
-            .actions-section {{
+            .actions-section {
                 margin-left: 20px;
                 margin-bottom: 15px;
-            }}
+            }
             
-            .actions-header {{
+            .actions-header {
                 font-weight: 600;
                 color: #4b5563;
                 font-size: 9pt;
                 margin-bottom: 10px;
                 text-transform: uppercase;
                 letter-spacing: 0.5px;
-            }}
+            }
             
-            .action {{
+            .action {
                 background: white;
                 border: 1px solid #e5e7eb;
                 border-left: 3px solid #9ca3af;
                 padding: 10px 12px;
                 margin-bottom: 8px;
                 font-size: 9pt;
-            }}
+            }
             
-            .action.success {{
+            .action.success {
                 border-left-color: #10b981;
                 background: #f0fdf4;
-            }}
+            }
             
-            .action.error {{
+            .action.error {
                 border-left-color: #ef4444;
                 background: #fef2f2;
-            }}
+            }
             
-            .action.info {{
+            .action.info {
                 border-left-color: #f59e0b;
                 background: #fffbeb;
-            }}
+            }
             
-            .action-name {{
+            .action-name {
                 font-weight: 600;
                 color: #1a1a1a;
                 margin-bottom: 4px;
-            }}
+            }
             
-            .action-details {{
+            .action-details {
                 color: #6b7280;
                 font-size: 8.5pt;
                 margin: 4px 0;
                 font-family: 'Courier New', monospace;
-            }}
+            }
             
-            .action-result {{
+            .action-result {
                 color: #374151;
                 font-size: 9pt;
                 margin-top: 4px;
-            }}
+            }
             
-            .ai-response {{
+            .ai-response {
                 margin-left: 20px;
                 background: #faf8ff;
                 border-left: 3px solid #8b5cf6;
                 padding: 12px;
                 font-size: 9pt;
-            }}
+            }
             
-            .response-label {{
+            .response-label {
                 font-weight: 600;
                 color: #8b5cf6;
                 font-size: 8.5pt;
                 text-transform: uppercase;
                 letter-spacing: 0.5px;
                 margin-bottom: 6px;
-            }}
+            }
             
-            .response-text {{
+            .response-text {
                 color: #4b5563;
                 line-height: 1.6;
-            }}
+            }
             
-            .summary-section {{
+            .summary-section {
                 background: #f0fdf4;
                 border: 2px solid #10b981;
                 border-radius: 8px;
                 padding: 20px;
                 margin: 30px 0;
                 page-break-inside: avoid;
-            }}
+            }
             
-            .summary-title {{
+            .summary-title {
                 color: #10b981;
                 font-size: 14pt;
                 font-weight: bold;
                 margin-bottom: 15px;
                 padding-bottom: 10px;
                 border-bottom: 2px solid #d1fae5;
-            }}
+            }
             
-            .summary-item {{
+            .summary-item {
                 margin-bottom: 12px;
-            }}
+            }
             
-            .summary-label {{
+            .summary-label {
                 font-weight: 600;
                 color: #059669;
                 font-size: 9.5pt;
                 margin-bottom: 4px;
-            }}
+            }
             
-            .summary-value {{
+            .summary-value {
                 color: #1f2937;
                 font-size: 9.5pt;
                 line-height: 1.6;
-            }}
+            }
             
-            .summary-list {{
+            .summary-list {
                 list-style: none;
                 padding-left: 0;
                 margin: 5px 0;
-            }}
+            }
             
-            .summary-list li {{
+            .summary-list li {
                 padding: 4px 0;
                 padding-left: 20px;
                 position: relative;
-            }}
+            }
             
-            .summary-list li:before {{
+            .summary-list li:before {
                 content: "✓";
                 position: absolute;
                 left: 0;
                 color: #10b981;
                 font-weight: bold;
-            }}
+            }
             
-            .footer {{
+            .footer {
                 margin-top: 40px;
                 padding-top: 15px;
                 border-top: 1px solid #e5e7eb;
                 text-align: center;
                 color: #9ca3af;
                 font-size: 8pt;
-            }}
+            }
         </style>
     </head>
-    <body>
+    <body>"""
+
+_REPORT_HEADER = """
         <div class="header">
             <h1>Nutaan AI - Conversation Report</h1>
-            <div class="subtitle">Generated on {current_date} at {current_time}</div>
+            <div class="subtitle">Generated on """
+
+_REPORT_HEAD = _REPORT_STYLE + _REPORT_HEADER
+
+_REPORT_TITLE = """{date} at {time}</div>
         </div>
         
         <div class="section-title" style="color: #8b5cf6; font-size: 14pt; font-weight: bold; margin-bottom: 15px; padding-bottom: 8px; border-bottom: 2px solid #e9d5ff;">💬 Full Conversation</div>
-        {conversation_html}
+        """
+
+_REPORT_MIDDLE = """
         
-        {summary_html}
+        """
+
+# Closes a chunk of a report rendered in parts (see write_session_pdf)
+_REPORT_CLOSE = """
+    </body>
+    </html>
+    """
+
+_REPORT_FOOT = """
         
         <div class="footer">
             <p>Nutaan AI by Tecosys • Powered by RudraX One</p>
@@ -399,23 +313,335 @@ def generate_conversation_report_html(conversation_data: Dict[str, Any]) -> str:
     </body>
     </html>
     """
+
+
+def generate_conversation_report_html(conversation_data: Dict[str, Any]) -> str:
+    """
+    Generate professional HTML report for AI conversation
     
-    return html
+    Args:
+        conversation_data: Full conversation data with messages array
+        
+    Returns:
+        Clean, professional HTML ready for PDF conversion
+    """
+    stats = SessionStats()
+    blocks = _iter_conversation_blocks(conversation_data.get('messages', []), stats)
+    
+    # Build conversation HTML as a list of fragments, joined once at the end
+    conversation_parts = [_render_block(idx, block) for idx, block in enumerate(blocks, 1)]
+    
+    # Build complete HTML
+    return "".join([
+        _REPORT_HEAD,
+        _render_title(),
+        *conversation_parts,
+        _render_end(stats)
+    ])
 
 
-def _generate_summary_section(total_actions, documents_created, doctypes, conversation_blocks):
+class SessionStats:
+    """
+    Session aggregates, collected in a single pass over the messages
+    
+    Filled in by _iter_conversation_blocks while the report, Markdown or
+    JSON export walks the conversation, or on its own by from_session.
+    """
+    
+    __slots__ = (
+        'requests', 'total_actions', 'success_count', 'documents_created',
+        'doctypes', 'initial_message', 'start_time', 'end_time', '_documents'
+    )
+    
+    def __init__(self):
+        self.requests = 0
+        self.total_actions = 0
+        self.success_count = 0
+        self.documents_created = []  # "New <DocType>" details, first seen first
+        self.doctypes = set()
+        self.initial_message = None
+        self.start_time = None
+        self.end_time = None
+        self._documents = set()
+    
+    @classmethod
+    def from_session(cls, session_data: Dict[str, Any]) -> "SessionStats":
+        """
+        Compute the aggregates of a session without rendering it
+        
+        Args:
+            session_data: Conversation data with messages array
+            
+        Returns:
+            SessionStats; start and end time come from the session when it has them
+        """
+        stats = cls()
+        for _block in _iter_conversation_blocks(session_data.get('messages', []), stats):
+            pass
+        
+        stats.start_time = session_data.get('start_time') or stats.start_time
+        stats.end_time = session_data.get('end_time') or stats.end_time
+        return stats
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SessionStats":
+        stats = cls()
+        for field in cls.__slots__[:-1]:
+            setattr(stats, field, data.get(field, getattr(stats, field)))
+        stats.doctypes = set(stats.doctypes)
+        stats._documents = set(stats.documents_created)
+        return stats
+    
+    def to_dict(self) -> Dict[str, Any]:
+        data = {field: getattr(self, field) for field in self.__slots__[:-1]}
+        data['doctypes'] = sorted(self.doctypes, key=str)
+        data['duration_seconds'] = self.duration_seconds
+        return data
+    
+    def add_message(self, role: str, content: str, timestamp: str):
+        if role == 'user':
+            self.requests += 1
+            if self.initial_message is None:
+                self.initial_message = content
+        
+        if timestamp:
+            if self.start_time is None:
+                self.start_time = timestamp
+            self.end_time = timestamp
+    
+    def add_action(self, action: Dict[str, Any]):
+        self.total_actions += 1
+        args = action['args']
+        
+        if 'doctype' in args:
+            self.doctypes.add(args['doctype'])
+        
+        if '✅' in str(action['result']):
+            self.success_count += 1
+            
+            # Detect document creation
+            if action['name'] == 'create_doc':
+                doc_detail = f"New {args.get('doctype', 'Document')}"
+                if doc_detail not in self._documents:
+                    self._documents.add(doc_detail)
+                    self.documents_created.append(doc_detail)
+    
+    @property
+    def duration_seconds(self) -> int:
+        start = _parse_timestamp(self.start_time)
+        end = _parse_timestamp(self.end_time)
+        if start is None or end is None:
+            return 0
+        return max(0, int((end - start).total_seconds()))
+
+
+def get_session_stats(session_data: Dict[str, Any], key: Optional[str] = None) -> SessionStats:
+    """
+    Session aggregates, cached when the session's content hash is known
+    
+    Hashing a session costs about as much as the single pass, so the cache
+    is only used with a key the caller already has (the report cache key).
+    
+    Args:
+        session_data: Conversation data with messages array
+        key: Content hash of the session, e.g. from pdf_cache.make_key
+        
+    Returns:
+        SessionStats
+    """
+    cache_key = f"{STATS_KEY_PREFIX}|{key}"
+    
+    if key:
+        cached = frappe.cache().get_value(cache_key)
+        if cached:
+            stats = SessionStats.from_dict(cached)
+            # Times may come from the session rather than its messages
+            stats.start_time = session_data.get('start_time') or stats.start_time
+            stats.end_time = session_data.get('end_time') or stats.end_time
+            return stats
+    
+    stats = SessionStats.from_session(session_data)
+    
+    if key:
+        frappe.cache().set_value(cache_key, stats.to_dict(), expires_in_sec=STATS_TTL)
+    
+    return stats
+
+
+def _parse_timestamp(value) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    # Compare aware and naive timestamps as UTC
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None) if parsed.tzinfo else parsed
+
+
+def _iter_conversation_blocks(messages: List[Dict[str, Any]], stats: SessionStats):
+    """
+    Group messages by user request
+    
+    Args:
+        messages: Conversation messages
+        stats: SessionStats to update (complete once the generator is exhausted)
+        
+    Yields:
+        dict per user request with its actions and AI response
+    """
+    current_block = None
+    
+    for msg in messages:
+        role = msg.get('role', 'user')
+        content = msg.get('content', '')
+        tool_calls = msg.get('toolCalls', [])
+        timestamp = msg.get('timestamp', '')
+        stats.add_message(role, content, timestamp)
+        
+        if role == 'user':
+            # Start new conversation block
+            if current_block:
+                yield current_block
+            
+            current_block = {
+                'user_request': content,
+                'timestamp': timestamp,
+                'actions': [],
+                'ai_response': ''
+            }
+        
+        elif role == 'assistant' and current_block:
+            # Add AI response and actions to current block
+            if content and content.strip():
+                current_block['ai_response'] = content
+            
+            if tool_calls:
+                for tc in tool_calls:
+                    action = {
+                        'name': tc.get('name', 'Unknown'),
+                        'args': tc.get('args', {}),
+                        'result': tc.get('result', '')
+                    }
+                    current_block['actions'].append(action)
+                    stats.add_action(action)
+    
+    # Add last block
+    if current_block:
+        yield current_block
+
+
+def _render_block(idx: int, block: Dict[str, Any]) -> str:
+    """HTML for one user request with its actions and AI response"""
+    parts = []
+    
+    time_display = _format_time(block.get('timestamp', ''))
+    
+    # User Request Section
+    parts.append(f"""
+        <div class="conversation-block">
+            <div class="request-section">
+                <div class="request-header">
+                    <span class="request-number">Request #{idx}</span>
+                    <span class="timestamp">{time_display}</span>
+                </div>
+                <div class="request-content">{_escape_html(block['user_request'])}</div>
+            </div>
+        """)
+    
+    # Agent Actions Section
+    if block['actions']:
+        parts.append('<div class="actions-section">')
+        parts.append('<div class="actions-header">Agent Actions:</div>')
+        
+        for action in block['actions']:
+            tool_name = action['name']
+            args = action['args']
+            result = str(action['result'])
+            
+            # Determine status
+            status, icon = _action_status(result)
+            
+            # Format action details
+            details = _format_action_details(tool_name, args)
+            
+            parts.append(f"""
+                <div class="action {status}">
+                    <div class="action-name">{icon} {_format_tool_name(tool_name)}</div>
+                    {f'<div class="action-details">{details}</div>' if details else ''}
+                    <div class="action-result">{_escape_html(result)}</div>
+                </div>
+                """)
+        
+        parts.append('</div>')
+    
+    # AI Response (if any meaningful text)
+    if block.get('ai_response') and block['ai_response'].strip():
+        parts.append(f"""
+            <div class="ai-response">
+                <div class="response-label">Summary:</div>
+                <div class="response-text">{_escape_html(block['ai_response'])}</div>
+            </div>
+            """)
+    
+    parts.append('</div>')
+    
+    return "".join(parts)
+
+
+def _format_time(timestamp: str) -> str:
+    """Time of day for a block header, empty when missing or unparsable"""
+    try:
+        dt = datetime.fromisoformat(timestamp) if timestamp else None
+        return dt.strftime('%I:%M %p') if dt else ''
+    except:
+        return ''
+
+
+def _action_status(result: str):
+    """(status, icon) of an action from the markers in its result"""
+    if '✅' in result:
+        return 'success', '✅'
+    elif '❌' in result:
+        return 'error', '❌'
+    return 'info', '⚡'
+
+
+def _overall_outcome(total_actions: int, success_count: int) -> str:
+    if success_count == total_actions:
+        return "✅ All actions completed successfully"
+    elif success_count > 0:
+        return f"⚠️ {success_count}/{total_actions} actions completed successfully"
+    return "❌ Some actions encountered errors"
+
+
+def _render_title() -> str:
+    now = now_datetime()
+    return _REPORT_TITLE.format(date=now.strftime('%B %d, %Y'), time=now.strftime('%I:%M %p UTC'))
+
+
+def _render_end(stats: SessionStats) -> str:
+    """Summary section and footer that close the report"""
+    summary_html = _generate_summary_section(
+        stats.total_actions,
+        stats.documents_created,
+        list(stats.doctypes),
+        stats.success_count
+    )
+    return _REPORT_MIDDLE + summary_html + _REPORT_FOOT
+
+
+def _generate_summary_section(total_actions, documents_created, doctypes, success_count):
     """Generate summary section HTML"""
     
     if total_actions == 0:
         return ""
     
     # Build documents summary
-    docs_html = ""
     if documents_created:
-        docs_html += '<ul class="summary-list">'
-        for doc in documents_created:
-            docs_html += f'<li>{doc["detail"]}</li>'
-        docs_html += '</ul>'
+        docs_html = '<ul class="summary-list">' + "".join(
+            f'<li>{detail}</li>' for detail in documents_created
+        ) + '</ul>'
     else:
         docs_html = '<div class="summary-value">No documents created</div>'
     
@@ -423,16 +649,7 @@ def _generate_summary_section(total_actions, documents_created, doctypes, conver
     doctypes_html = ", ".join(doctypes) if doctypes else "N/A"
     
     # Calculate overall outcome
-    success_count = sum(1 for block in conversation_blocks 
-                       for action in block.get('actions', []) 
-                       if '✅' in str(action.get('result', '')))
-    
-    if success_count == total_actions:
-        outcome = "✅ All actions completed successfully"
-    elif success_count > 0:
-        outcome = f"⚠️ {success_count}/{total_actions} actions completed successfully"
-    else:
-        outcome = "❌ Some actions encountered errors"
+    outcome = _overall_outcome(total_actions, success_count)
     
     html = f"""
     <div class="summary-section">
@@ -535,20 +752,402 @@ def _escape_html(text: str) -> str:
             .replace("\n", "<br>"))
 
 
-def generate_session_pdf(session_data: Dict[str, Any]) -> bytes:
+def generate_session_pdf(
+    session_data: Dict[str, Any],
+    output: str,
+    progress: Optional[Callable[[int, int], None]] = None,
+    use_cache: bool = True
+):
     """
     Generate PDF from conversation/session data
     
+    Sessions longer than ai_agent_pdf_stream_threshold messages are rendered
+    in chunks (see write_session_pdf), so the finished report is only ever
+    a file, never a bytes object.
+    
     Args:
         session_data: Conversation data with messages array
-        
-    Returns:
-        PDF bytes
+        output: Path of the PDF file to write
+        progress: Optional callable(done, total), called per rendered chunk
+        use_cache: Reuse and store chunk PDFs in the report cache
     """
+    if HAS_PDF_WRITER and len(session_data.get('messages', [])) > get_stream_threshold():
+        write_session_pdf(session_data, output, progress, use_cache)
+        return
+    
     # Generate HTML
     html = generate_conversation_report_html(session_data)
     
     # Convert to PDF using Frappe's utility
+    _write_pdf(output, get_pdf(html))
+    
+    if progress:
+        progress(1, 1)
+
+
+def write_session_pdf(
+    session_data: Dict[str, Any],
+    output,
+    progress: Optional[Callable[[int, int], None]] = None,
+    use_cache: bool = True
+) -> int:
+    """
+    Render a session to PDF chunk by chunk
+    
+    Conversation blocks are grouped lazily into chunks of
+    ai_agent_pdf_chunk_blocks user requests. Each chunk is rendered as its
+    own HTML document by get_pdf and written to a temporary file, so only
+    one chunk's HTML and PDF are in memory or in wkhtmltopdf at a time.
+    The chunk files are then merged by a PdfWriter reading from the open
+    files and writing straight to output. The writer holds the parsed
+    pages until it is written, but neither the chunks nor the finished PDF
+    are ever held as bytes. The first chunk carries the report header, the
+    last one the summary.
+    
+    Chunks whose HTML is unchanged since an earlier export are taken from
+    the report cache: after one more turn, typically only the last chunk
+    (new block and summary) is rendered again, plus the first when the
+    "Generated on" minute has moved on.
+    
+    Args:
+        session_data: Conversation data with messages array
+        output: File path or binary file object to write the PDF to
+        progress: Optional callable(done, total), called per rendered chunk
+        use_cache: Reuse and store chunk PDFs in the report cache
+        
+    Returns:
+        Number of chunks rendered
+    """
+    if not HAS_PDF_WRITER:
+        frappe.throw("Chunked PDF export needs pypdf")
+    
+    messages = session_data.get('messages', [])
+    chunk_blocks = get_chunk_blocks()
+    
+    # Every user message starts a block
+    requests = sum(1 for msg in messages if msg.get('role', 'user') == 'user')
+    total = max(1, -(-requests // chunk_blocks))
+    
+    stats = SessionStats()
+    blocks = _iter_conversation_blocks(messages, stats)
+    
+    chunk = list(islice(blocks, chunk_blocks))
+    start = 1
+    done = 0
+    
+    with tempfile.TemporaryDirectory(prefix="ai-agent-pdf-") as folder:
+        chunk_paths = []
+        
+        while True:
+            # Look ahead one chunk: the last chunk closes the report with the
+            # summary, which is only complete once all blocks have been read
+            next_chunk = list(islice(blocks, chunk_blocks))
+            
+            parts = [_REPORT_HEAD, _render_title()] if done == 0 else [_REPORT_STYLE]
+            parts.extend(_render_block(idx, block) for idx, block in enumerate(chunk, start))
+            parts.append(_render_end(stats) if not next_chunk else _REPORT_CLOSE)
+            
+            chunk_path = os.path.join(folder, f"{done}.pdf")
+            _render_chunk_pdf("".join(parts), chunk_path, use_cache)
+            chunk_paths.append(chunk_path)
+            
+            done += 1
+            if progress:
+                progress(done, total)
+            
+            if not next_chunk:
+                break
+            
+            start += len(chunk)
+            chunk = next_chunk
+        
+        # Readers get open files rather than paths: given a path, PdfReader
+        # loads the whole file into memory
+        with ExitStack() as files:
+            writer = PdfWriter()
+            for chunk_path in chunk_paths:
+                writer.append_pages_from_reader(PdfReader(files.enter_context(open(chunk_path, "rb"))))
+            writer.write(output)
+    
+    return done
+
+
+def _render_chunk_pdf(html: str, path: str, use_cache: bool = True):
+    """
+    Write the PDF for one chunk, reused from the report cache while its HTML
+    is unchanged
+    
+    The cache is per chunk rather than per block on purpose. Cached block
+    HTML would only save the f-string rendering, which costs about as much
+    as hashing the block to look it up (warm renders measured slower than
+    uncached ones), and every chunk would still go through wkhtmltopdf. The
+    renderer run is the expensive step, so whole chunk PDFs are cached. The
+    trade-off is that editing one message re-renders its whole chunk, not
+    just that block.
+    """
+    if not use_cache:
+        _write_pdf(path, get_pdf(html))
+        return
+    
+    from . import pdf_cache
+    
+    key = "chunk-" + hashlib.sha256(html.encode()).hexdigest()
+    
+    cached_path = pdf_cache.get_path(key)
+    if cached_path:
+        try:
+            shutil.copyfile(cached_path, path)
+            return
+        except FileNotFoundError:
+            # Evicted by another worker since the lookup
+            pass
+    
     pdf = get_pdf(html)
+    _write_pdf(path, pdf)
+    
+    temp_path = pdf_cache.get_temp_path(key)
+    _write_pdf(temp_path, pdf)
+    pdf_cache.store(key, temp_path)
+
+
+def _write_pdf(path: str, pdf: bytes):
+    with open(path, "wb") as f:
+        f.write(pdf)
+
+
+def get_stream_threshold() -> int:
+    """Messages above which a session PDF is rendered in chunks"""
+    return int(frappe.conf.get("ai_agent_pdf_stream_threshold") or DEFAULT_STREAM_THRESHOLD)
+
+
+def get_chunk_blocks() -> int:
+    """User requests per chunk of a chunked PDF export"""
+    return max(1, int(frappe.conf.get("ai_agent_pdf_chunk_blocks") or DEFAULT_CHUNK_BLOCKS))
+
+
+def get_progress_publisher(session_id: str) -> Callable[[int, int], None]:
+    """
+    Build a progress callback that notifies the requesting user
+    
+    Args:
+        session_id: Session the export is for
+        
+    Returns:
+        Callable accepting (done, total)
+    """
+    user = frappe.session.user
+    
+    def publish(done, total):
+        frappe.publish_realtime(
+            PROGRESS_EVENT,
+            {"session_id": session_id, "done": done, "total": total},
+            user=user
+        )
+    
+    return publish
+
+
+def find_shared_pdf(key: str) -> Optional[str]:
+    """
+    Path of an already shared report, so sharing it again skips rendering
+    
+    Args:
+        key: Report content key from pdf_cache.make_key
+        
+    Returns:
+        Site-relative path of the PDF, or None when it was not shared yet
+    """
+    from . import report_store
+    
+    return report_store.get(key)
+
+
+def save_session_pdf(session_id: str, pdf_path: str, key: Optional[str] = None) -> str:
+    """
+    Store a report for sharing
+    
+    Args:
+        session_id: Session the report is for
+        pdf_path: Absolute path of the rendered PDF, copied into the store
+        key: Report content key; defaults to a hash of the PDF
+        
+    Returns:
+        Site-relative path of the stored PDF
+    """
+    from . import report_store
+    
+    if not key:
+        digest = hashlib.sha256()
+        with open(pdf_path, "rb") as f:
+            for block in iter(lambda: f.read(64 * 1024), b""):
+                digest.update(block)
+        key = digest.hexdigest()
+    
+    return report_store.put(key, pdf_path)
+
+
+def create_shareable_link(session_id: str, pdf_path: str) -> str:
+    """
+    Public link to a stored report
+    
+    Args:
+        session_id: Session the report is for
+        pdf_path: Path returned by save_session_pdf
+        
+    Returns:
+        Absolute URL that opens without a login
+    """
+    from . import report_store
+    
+    return report_store.get_public_url(pdf_path)
+
+
+def iter_session_markdown(session_data: Dict[str, Any]) -> Iterator[str]:
+    """
+    Markdown version of the conversation report, one block at a time
     
-    return pdf
+    Only the header needs the request context (site time zone); the blocks
+    are produced lazily, so the iterator can be streamed after the request.
+    
+    Args:
+        session_data: Conversation data with messages array
+        
+    Returns:
+        Iterator of Markdown text
+    """
+    now = now_datetime()
+    header = (
+        "# Nutaan AI - Conversation Report\n\n"
+        f"Generated on {now.strftime('%B %d, %Y')} at {now.strftime('%I:%M %p UTC')}\n"
+    )
+    
+    return chain([header], _iter_markdown_blocks(session_data.get('messages', [])))
+
+
+def _iter_markdown_blocks(messages: List[Dict[str, Any]]) -> Iterator[str]:
+    stats = SessionStats()
+    for idx, block in enumerate(_iter_conversation_blocks(messages, stats), 1):
+        parts = [f"\n## Request #{idx}"]
+        time_display = _format_time(block.get('timestamp', ''))
+        if time_display:
+            parts.append(f" ({time_display})")
+        parts.append("\n\n" + _md_quote(block['user_request']) + "\n")
+        
+        if block['actions']:
+            parts.append("\n**Agent Actions:**\n\n")
+            for action in block['actions']:
+                result = str(action['result'])
+                status, icon = _action_status(result)
+                details = _format_action_details(action['name'], action['args'])
+                parts.append(f"- {icon} **{_format_tool_name(action['name'])}**")
+                if details:
+                    parts.append(f" ({details})")
+                parts.append(": " + " ".join(result.split()) + "\n")
+        
+        if block.get('ai_response') and block['ai_response'].strip():
+            parts.append("\n**Summary:** " + block['ai_response'].strip() + "\n")
+        
+        yield "".join(parts)
+    
+    if stats.total_actions:
+        documents = ", ".join(stats.documents_created) or "No documents created"
+        yield (
+            "\n## Session Summary\n\n"
+            f"- Total Actions Performed: {stats.total_actions} actions\n"
+            f"- Documents Created: {documents}\n"
+            f"- DocTypes Accessed: {', '.join(map(str, stats.doctypes)) or 'N/A'}\n"
+            f"- Overall Outcome: {_overall_outcome(stats.total_actions, stats.success_count)}\n"
+        )
+
+
+def iter_session_json(session_data: Dict[str, Any]) -> Iterator[str]:
+    """
+    Compact JSON document of the session, one request at a time
+    
+    Shape: {"session_id", "requests": [{"number", "timestamp", "request",
+    "actions": [{"name", "args", "result", "status"}], "response"}], "summary"}
+    
+    Args:
+        session_data: Conversation data with messages array
+        
+    Yields:
+        Pieces of a single JSON document
+    """
+    yield '{"session_id":' + _compact_json(session_data.get('session_id')) + ',"requests":['
+    
+    stats = SessionStats()
+    for idx, block in enumerate(_iter_conversation_blocks(session_data.get('messages', []), stats), 1):
+        yield ("," if idx > 1 else "") + _compact_json({
+            "number": idx,
+            "timestamp": block.get('timestamp') or None,
+            "request": block['user_request'],
+            "actions": [_action_record(action) for action in block['actions']],
+            "response": block.get('ai_response') or None
+        })
+    
+    yield '],"summary":' + _compact_json(_summary_record(stats)) + '}'
+
+
+def iter_session_ndjson(session_data: Dict[str, Any]) -> Iterator[str]:
+    """
+    Newline-delimited JSON with one record per agent action
+    
+    Each record carries its request (number, timestamp, text) so lines can
+    be loaded independently.
+    
+    Args:
+        session_data: Conversation data with messages array
+        
+    Yields:
+        One JSON line per action
+    """
+    session_id = session_data.get('session_id')
+    stats = SessionStats()
+    
+    for idx, block in enumerate(_iter_conversation_blocks(session_data.get('messages', []), stats), 1):
+        for position, action in enumerate(block['actions'], 1):
+            record = {
+                "session_id": session_id,
+                "request_number": idx,
+                "timestamp": block.get('timestamp') or None,
+                "request": block['user_request'],
+                "action_number": position
+            }
+            record.update(_action_record(action))
+            yield _compact_json(record) + "\n"
+
+
+# format -> (chunk iterator, content type, file extension)
+EXPORT_FORMATS = {
+    "markdown": (iter_session_markdown, "text/markdown; charset=utf-8", "md"),
+    "json": (iter_session_json, "application/json", "json"),
+    "ndjson": (iter_session_ndjson, "application/x-ndjson", "ndjson")
+}
+
+
+def _action_record(action: Dict[str, Any]) -> Dict[str, Any]:
+    result = str(action['result'])
+    return {
+        "name": action['name'],
+        "args": action['args'],
+        "result": result,
+        "status": _action_status(result)[0]
+    }
+
+
+def _summary_record(stats: SessionStats) -> Dict[str, Any]:
+    return {
+        "total_actions": stats.total_actions,
+        "successful_actions": stats.success_count,
+        "documents_created": stats.documents_created,
+        "doctypes": sorted(stats.doctypes, key=str)
+    }
+
+
+def _compact_json(value) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def _md_quote(text: str) -> str:
+    """Block-quote user text, one '>' per line"""
+    return "\n".join("> " + line for line in str(text).split("\n"))
@@ -31,15 +31,74 @@ override_whitelisted_methods = {
     "ai_agent_widget.api.agent_stream": "ai_agent_widget.api.agent_stream"
 }
 
+# Document Events
+doc_events = {
+    "User": {
+        "on_update": "ai_agent_widget.user_context.clear_user_context",
+        "on_trash": "ai_agent_widget.user_context.clear_user_context"
+    },
+    # Role rows are saved with their User; a profile change re-saves its users,
+    # but clear them here too in case the profile update skips the save
+    "Role Profile": {
+        "on_update": "ai_agent_widget.user_context.clear_role_profile_users"
+    },
+    # Schema digests
+    "DocType": {
+        "on_update": "ai_agent_widget.schema_digest.clear_cache",
+        "on_trash": "ai_agent_widget.schema_digest.clear_cache"
+    },
+    "Custom Field": {
+        "on_update": "ai_agent_widget.schema_digest.clear_cache",
+        "on_trash": "ai_agent_widget.schema_digest.clear_cache"
+    },
+    "Property Setter": {
+        "on_update": "ai_agent_widget.schema_digest.clear_cache",
+        "on_trash": "ai_agent_widget.schema_digest.clear_cache"
+    },
+    # Name index; the handlers ignore doctypes that are not indexed
+    "*": {
+        "after_insert": "ai_agent_widget.name_index.update_index",
+        "on_update": "ai_agent_widget.name_index.update_index",
+        "on_trash": "ai_agent_widget.name_index.remove_from_index",
+        "after_rename": "ai_agent_widget.name_index.rename_in_index"
+    }
+}
+
 # Website Settings
 website_route_rules = []
 
 # Scheduled Tasks
-scheduler_events = {}
+scheduler_events = {
+    "all": [
+        "ai_agent_widget.pdf_jobs.enqueue_due_retries"
+    ],
+    "hourly": [
+        "ai_agent_widget.report_store.cleanup"
+    ],
+    "daily": [
+        "ai_agent_widget.sharing_service.cleanup_expired_links",
+        "ai_agent_widget.session_archive.cleanup"
+    ]
+}
 
 # Testing
 before_tests = []
 
+# Migration
+after_migrate = [
+    "ai_agent_widget.schema_digest.clear_cache"
+]
+
+# Session Hooks
+on_session_creation = [
+    "ai_agent_widget.user_context.clear_on_login"
+]
+
+# Request Hooks
+after_request = [
+    "ai_agent_widget.telemetry.finish_request"
+]
+
 # Installation
 before_install = []
 after_install = []
@@ -0,0 +1,347 @@
+"""
+Name Index for AI Agent Widget
+
+Fuzzy trigram index over the names and title fields of the doctypes users
+mention most (Customer, Item, Supplier by default), used by search_doctype
+instead of a ``name like %text%`` scan.
+
+Each indexed doctype keeps, in the site cache:
+
+- one set of record names per trigram
+- a hash of record name -> indexed text, so updates only touch the
+  trigrams that changed
+- a hash of record name -> trigram count, used for ranking
+
+Queries are answered by a single Redis script that counts shared trigrams
+and ranks the best matches, so typos and word order do not matter. The
+index is kept current from doc_events; ``bench --site <site>
+rebuild-ai-agent-name-index`` rebuilds it from scratch.
+
+Doctypes and fields are read from ``ai_agent_name_index`` in
+site_config.json, e.g.::
+
+    "ai_agent_name_index": {
+        "Customer": ["customer_name"],
+        "Item": ["item_name"],
+        "Supplier": ["supplier_name"]
+    }
+"""
+
+import frappe
+from frappe import _
+import re
+from typing import Dict, List, Optional, Tuple
+
+
+KEY_PREFIX = "ai_agent_name_index"
+
+DEFAULT_DOCTYPES = {
+    "Customer": ["customer_name"],
+    "Item": ["item_name"],
+    "Supplier": ["supplier_name"]
+}
+
+# Trigram sets larger than this are only probed for candidates found in
+# smaller sets, never scanned
+MAX_SET_SCAN = 5000
+
+# Share of the query's trigrams a record must contain to match
+MIN_COVERAGE = 0.5
+
+REBUILD_PAGE_SIZE = 5000
+
+# KEYS: sizes hash, trigram sets; ARGV: scan cap, limit, min coverage
+# Returns {answered, name, score, name, score, ...}
+SEARCH_SCRIPT = """
+local cap = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local query_size = #KEYS - 1
+
+local counts, big = {}, {}
+local scanned = false
+for i = 2, #KEYS do
+    if redis.call('SCARD', KEYS[i]) <= cap then
+        scanned = true
+        for _, name in ipairs(redis.call('SMEMBERS', KEYS[i])) do
+            counts[name] = (counts[name] or 0) + 1
+        end
+    else
+        table.insert(big, KEYS[i])
+    end
+end
+
+if not scanned and #big > 0 then
+    return {0}
+end
+
+local needed = math.ceil(query_size * tonumber(ARGV[3]))
+local scored = {}
+for name, shared in pairs(counts) do
+    for _, key in ipairs(big) do
+        shared = shared + redis.call('SISMEMBER', key, name)
+    end
+    if shared >= needed then
+        local size = tonumber(redis.call('HGET', KEYS[1], name)) or shared
+        table.insert(scored, {name, shared, shared / (query_size + size - shared)})
+    end
+end
+
+table.sort(scored, function(a, b)
+    if a[2] ~= b[2] then return a[2] > b[2] end
+    if a[3] ~= b[3] then return a[3] > b[3] end
+    return a[1] < b[1]
+end)
+
+local out = {1}
+for i = 1, math.min(limit, #scored) do
+    table.insert(out, scored[i][1])
+    table.insert(out, tostring(scored[i][3]))
+end
+return out
+"""
+
+
+def get_indexed_doctypes() -> Dict[str, List[str]]:
+    """Indexed doctypes and their title fields (ai_agent_name_index)"""
+    return frappe.conf.get("ai_agent_name_index") or DEFAULT_DOCTYPES
+
+
+def is_ready(doctype: str) -> bool:
+    """Whether a doctype is indexed and its index has been built"""
+    if doctype not in get_indexed_doctypes():
+        return False
+
+    cache = frappe.cache()
+    return cache.get(cache.make_key(_key(doctype, "built"))) is not None
+
+
+def trigrams(text: str) -> set:
+    """
+    Trigrams of every word in text, padded like pg_trgm
+
+    Args:
+        text: Text to split
+
+    Returns:
+        set of trigrams
+    """
+    grams = set()
+    for word in re.findall(r"\w+", (text or "").lower()):
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+def search(doctype: str, text: str, limit: int) -> Optional[List[Tuple[str, float]]]:
+    """
+    Ranked fuzzy matches for text
+
+    Args:
+        doctype: Indexed doctype
+        text: Search text
+        limit: Maximum number of matches
+
+    Returns:
+        list of (name, similarity), best first, or None when the index
+        cannot answer (not built, or the text only has very common trigrams)
+    """
+    grams = trigrams(text)
+    if not grams or not is_ready(doctype):
+        return None
+
+    cache = frappe.cache()
+    keys = [cache.make_key(_key(doctype, "sizes"))]
+    keys += [cache.make_key(_key(doctype, "tg", g)) for g in sorted(grams)]
+
+    script = cache.register_script(SEARCH_SCRIPT)
+    out = script(keys=keys, args=[MAX_SET_SCAN, int(limit), MIN_COVERAGE])
+    if not out or not int(out[0]):
+        return None
+
+    return [
+        (_decode(out[i]), float(out[i + 1]))
+        for i in range(1, len(out), 2)
+    ]
+
+
+def update_index(doc, method=None):
+    """
+    doc_events hook: index a saved record of an indexed doctype
+
+    Args:
+        doc: Saved document
+        method: Event name
+    """
+    fields = get_indexed_doctypes().get(doc.doctype)
+    if fields is None or not is_ready(doc.doctype):
+        return
+
+    _index(doc.doctype, doc.name, _doc_text(doc.name, [doc.get(f) for f in fields]))
+
+
+def remove_from_index(doc, method=None):
+    """
+    doc_events hook: drop a deleted record from the index
+
+    Args:
+        doc: Deleted document
+        method: Event name
+    """
+    if doc.doctype in get_indexed_doctypes() and is_ready(doc.doctype):
+        _index(doc.doctype, doc.name, None)
+
+
+def rename_in_index(doc, method=None, old=None, new=None, merge=False):
+    """
+    doc_events hook: move a renamed record to its new name
+
+    Args:
+        doc: Renamed document
+        method: Event name
+        old: Previous name
+        new: New name
+        merge: Whether the record was merged into an existing one
+    """
+    fields = get_indexed_doctypes().get(doc.doctype)
+    if fields is None or not is_ready(doc.doctype):
+        return
+
+    _index(doc.doctype, old, None)
+    _index(doc.doctype, new, _doc_text(new, [doc.get(f) for f in fields]))
+
+
+def rebuild(doctype: Optional[str] = None) -> Dict[str, int]:
+    """
+    Rebuild the index of one or all indexed doctypes from the database
+
+    Args:
+        doctype: Doctype to rebuild, or None for all
+
+    Returns:
+        dict of doctype -> number of records indexed
+    """
+    indexed = get_indexed_doctypes()
+    doctypes = [doctype] if doctype else list(indexed)
+    counts = {}
+
+    for dt in doctypes:
+        if dt not in indexed:
+            frappe.throw(_("{0} is not configured in ai_agent_name_index").format(dt))
+        counts[dt] = _rebuild_doctype(dt, indexed[dt])
+
+    return counts
+
+
+def get_stats() -> Dict[str, Dict[str, int]]:
+    """Indexed record count per doctype (None when not built)"""
+    cache = frappe.cache()
+    stats = {}
+
+    for doctype in get_indexed_doctypes():
+        built = cache.get(cache.make_key(_key(doctype, "built")))
+        stats[doctype] = {
+            "records": int(built) if built is not None else None
+        }
+
+    return stats
+
+
+def _rebuild_doctype(doctype: str, fields: List[str]) -> int:
+    cache = frappe.cache()
+    _delete_index(doctype)
+
+    last_name = None
+    total = 0
+    while True:
+        filters = {"name": [">", last_name]} if last_name is not None else {}
+        rows = frappe.get_all(
+            doctype,
+            filters=filters,
+            fields=["name"] + list(fields),
+            order_by="name asc",
+            limit_page_length=REBUILD_PAGE_SIZE,
+            as_list=True
+        )
+        if not rows:
+            break
+
+        pipe = cache.pipeline(transaction=False)
+        docs_key = cache.make_key(_key(doctype, "docs"))
+        sizes_key = cache.make_key(_key(doctype, "sizes"))
+        for row in rows:
+            name = row[0]
+            text = _doc_text(name, row[1:])
+            grams = trigrams(text)
+            for g in grams:
+                pipe.sadd(cache.make_key(_key(doctype, "tg", g)), name)
+            pipe.hset(docs_key, name, text)
+            pipe.hset(sizes_key, name, len(grams))
+        pipe.execute()
+
+        total += len(rows)
+        last_name = rows[-1][0]
+
+    cache.set(cache.make_key(_key(doctype, "built")), total)
+    return total
+
+
+def _index(doctype: str, name: str, text: Optional[str]):
+    """Point a record's trigrams at text (None removes the record)"""
+    cache = frappe.cache()
+    docs_key = cache.make_key(_key(doctype, "docs"))
+    sizes_key = cache.make_key(_key(doctype, "sizes"))
+
+    # Raw HGET: RedisWrapper.hget would prefix the key again and unpickle
+    old_text = cache.execute_command("HGET", docs_key, name)
+    old_text = _decode(old_text) if old_text is not None else None
+    if old_text == text:
+        return
+
+    old_grams = trigrams(old_text) if old_text is not None else set()
+    new_grams = trigrams(text) if text is not None else set()
+
+    pipe = cache.pipeline()
+    for g in old_grams - new_grams:
+        pipe.srem(cache.make_key(_key(doctype, "tg", g)), name)
+    for g in new_grams - old_grams:
+        pipe.sadd(cache.make_key(_key(doctype, "tg", g)), name)
+
+    if text is None:
+        pipe.hdel(docs_key, name)
+        pipe.hdel(sizes_key, name)
+    else:
+        pipe.hset(docs_key, name, text)
+        pipe.hset(sizes_key, name, len(new_grams))
+    pipe.execute()
+
+
+def _delete_index(doctype: str):
+    cache = frappe.cache()
+    pattern = cache.make_key(_key(doctype, "")) + "*"
+
+    batch = []
+    for key in cache.scan_iter(match=pattern, count=1000):
+        batch.append(key)
+        if len(batch) >= 1000:
+            cache.delete(*batch)
+            batch = []
+    if batch:
+        cache.delete(*batch)
+
+
+def _doc_text(name: str, values) -> str:
+    """Text indexed for a record: its name plus distinct title field values"""
+    parts = [str(name)]
+    for value in values:
+        if value and str(value) not in parts:
+            parts.append(str(value))
+    return " ".join(parts)
+
+
+def _key(doctype: str, *parts: str) -> str:
+    return "|".join((KEY_PREFIX, doctype) + parts)
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
@@ -0,0 +1,274 @@
+"""
+PDF Cache for AI Agent Widget
+
+Rendered session reports, shared by the download, WhatsApp and email
+paths so a session exported several times is rendered by wkhtmltopdf once.
+
+The key is a hash of the canonicalized conversation (the messages are all
+the report depends on) and the report template version. Reports are files
+in the site's private folder, named by their key, so downloads can be
+streamed from disk (or handed to nginx) and Redis only holds small
+bookkeeping: a marker per entry that carries the TTL, a sorted set of last
+access times and a hash of entry sizes. The least recently used reports
+are deleted once the cache grows past its size bound.
+
+Settings in site_config.json:
+
+- ``ai_agent_pdf_cache_ttl``: seconds a report is kept (3600)
+- ``ai_agent_pdf_cache_max_mb``: total size of cached reports (100)
+"""
+
+import frappe
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from typing import Dict, Any, Callable, Optional, Tuple
+
+from . import export_service
+
+
+KEY_PREFIX = "ai_agent_pdf_cache"
+LRU_KEY = f"{KEY_PREFIX}|lru"
+SIZES_KEY = f"{KEY_PREFIX}|sizes"
+STATS_KEY = f"{KEY_PREFIX}|stats"
+
+# Folder under the site's private folder holding the report files
+REPORT_FOLDER = "ai_agent_reports"
+
+# Defaults, overridable in site_config.json
+DEFAULT_TTL = 60 * 60  # seconds
+DEFAULT_MAX_MB = 100
+
+
+def make_key(session_data: Dict[str, Any]) -> str:
+    """
+    Build the cache key for a session report
+
+    Args:
+        session_data: Conversation data with messages array
+
+    Returns:
+        Hex digest identifying the rendered report
+    """
+    payload = json.dumps(
+        [export_service.REPORT_VERSION, session_data.get("messages", [])],
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str
+    )
+
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def get_session_pdf(
+    session_data: Dict[str, Any],
+    progress: Optional[Callable[[int, int], None]] = None,
+    key: Optional[str] = None
+) -> Tuple[str, str]:
+    """
+    Cached report PDF for a session, rendered on a miss
+
+    The report is rendered into a temporary file next to the cache entry
+    and moved into place, so it is never held in memory as a whole.
+
+    Args:
+        session_data: Conversation data with messages array
+        progress: Optional callable(done, total) passed to the renderer
+        key: Key from make_key, when the caller has it already
+
+    Returns:
+        (cache key, absolute path of the PDF)
+    """
+    key = key or make_key(session_data)
+
+    path = get_path(key)
+    if path is None:
+        temp_path = get_temp_path(key)
+        try:
+            export_service.generate_session_pdf(session_data, temp_path, progress)
+            store(key, temp_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        path = get_file_path(key)
+
+    return key, path
+
+
+def has(key: str) -> bool:
+    """Whether a report is cached, without touching its access time or stats"""
+    cache = frappe.cache()
+    # Raw EXISTS: RedisWrapper.exists would prefix the key again
+    return bool(cache.execute_command("EXISTS", cache.make_key(f"{KEY_PREFIX}|{key}")))
+
+
+def get_path(key: str) -> Optional[str]:
+    """
+    Look up a cached report on disk
+
+    Args:
+        key: Key from make_key
+
+    Returns:
+        Absolute path of the PDF file, or None on a miss
+    """
+    cache = frappe.cache()
+    path = get_file_path(key)
+
+    if cache.get(cache.make_key(f"{KEY_PREFIX}|{key}")) is None or not os.path.exists(path):
+        _incr("misses")
+        return None
+
+    cache.zadd(cache.make_key(LRU_KEY), {key: time.time()})
+    _incr("hits")
+
+    return path
+
+
+def store(key: str, pdf_path: str):
+    """
+    Store a report and evict least recently used reports past the size bound
+
+    A report larger than the bound on its own is still stored, so it can be
+    downloaded; it is evicted by the next store or when its TTL runs out.
+
+    Args:
+        key: Key from make_key
+        pdf_path: Rendered PDF, best written to get_temp_path(key); the
+            file is moved into place
+    """
+    cache = frappe.cache()
+    ttl = int(frappe.conf.get("ai_agent_pdf_cache_ttl") or DEFAULT_TTL)
+    max_bytes = int(frappe.conf.get("ai_agent_pdf_cache_max_mb") or DEFAULT_MAX_MB) * 1024 * 1024
+
+    path = get_file_path(key)
+    size = os.path.getsize(pdf_path)
+    _move_file(pdf_path, path)
+
+    lru_key = cache.make_key(LRU_KEY)
+    sizes_key = cache.make_key(SIZES_KEY)
+    now = time.time()
+
+    pipe = cache.pipeline()
+    pipe.set(cache.make_key(f"{KEY_PREFIX}|{key}"), size, ex=ttl)
+    pipe.zadd(lru_key, {key: now})
+    pipe.hset(sizes_key, key, size)
+    # Reports not touched within the TTL have expired already
+    pipe.zrangebyscore(lru_key, 0, now - ttl)
+    expired = pipe.execute()[-1]
+
+    if expired:
+        _forget(expired)
+
+    _incr("stores")
+
+    # Raw pipeline: RedisWrapper.hgetall would re-prefix and unpickle
+    pipe = cache.pipeline()
+    pipe.zrange(lru_key, 0, -1)
+    pipe.hgetall(sizes_key)
+    order, sizes = pipe.execute()
+
+    sizes = {_decode(k): int(v) for k, v in (sizes or {}).items()}
+    total = sum(sizes.values())
+
+    evicted = []
+    for member in order:
+        if total <= max_bytes:
+            break
+        member = _decode(member)
+        # The report just stored stays until the next store
+        if member == key:
+            continue
+        total -= sizes.get(member, 0)
+        evicted.append(member)
+
+    if evicted:
+        cache.delete(*[cache.make_key(f"{KEY_PREFIX}|{k}") for k in evicted])
+        _forget(evicted)
+        _incr("evictions", len(evicted))
+
+
+def get_file_path(key: str) -> str:
+    """Where the report for a key is stored"""
+    return frappe.get_site_path("private", REPORT_FOLDER, f"{key}.pdf")
+
+
+def get_temp_path(key: str) -> str:
+    """
+    Unique temporary file next to the report for a key, to render into
+
+    Being in the cache folder, the file can be renamed into place by store.
+    """
+    path = get_file_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+
+
+def _move_file(src: str, dest: str):
+    """Move a file into place with a rename, so readers never see a partial PDF"""
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    try:
+        os.replace(src, dest)
+    except OSError:
+        # Another file system: copy next to the destination first
+        tmp_path = f"{dest}.{os.getpid()}.tmp"
+        shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dest)
+        os.remove(src)
+
+
+def _forget(keys):
+    """Drop keys from the LRU set and the size hash, and delete their files"""
+    cache = frappe.cache()
+    keys = [_decode(k) for k in keys]
+
+    pipe = cache.pipeline()
+    pipe.zrem(cache.make_key(LRU_KEY), *keys)
+    pipe.hdel(cache.make_key(SIZES_KEY), *keys)
+    pipe.execute()
+
+    for key in keys:
+        try:
+            os.remove(get_file_path(key))
+        except FileNotFoundError:
+            pass
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _incr(counter: str, amount: int = 1):
+    """Increment a statistics counter"""
+    cache = frappe.cache()
+    cache.hincrby(cache.make_key(STATS_KEY), counter, amount)
+
+
+def get_stats() -> Dict[str, Any]:
+    """
+    Get hit-rate and size metrics for this site
+
+    Returns:
+        dict with hits, misses, stores, evictions, hit_rate, entries and bytes
+    """
+    cache = frappe.cache()
+
+    pipe = cache.pipeline()
+    pipe.hgetall(cache.make_key(STATS_KEY))
+    pipe.hgetall(cache.make_key(SIZES_KEY))
+    raw, sizes = pipe.execute()
+
+    stats = {_decode(k): int(v) for k, v in (raw or {}).items()}
+
+    for counter in ("hits", "misses", "stores", "evictions"):
+        stats.setdefault(counter, 0)
+
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0
+    stats["entries"] = len(sizes or {})
+    stats["bytes"] = sum(int(v) for v in (sizes or {}).values())
+
+    return stats
@@ -0,0 +1,297 @@
+"""
+PDF Jobs for AI Agent Widget
+
+Renders session reports in background jobs so a slow wkhtmltopdf run does
+not hold a gunicorn worker. The endpoint enqueues the render and returns the
+report's cache key (the temp_key the download endpoint serves) at once. The
+requesting users get a realtime event when the PDF is ready, and the state
+can also be polled.
+
+Identical sessions share one job: the job record is keyed by the report's
+content hash and created with SET NX, so a second request while a render is
+queued or running just joins it. A failed render is retried a few times
+with a growing delay before the job is marked failed. The job does not
+sleep between attempts: it parks the retry in a sorted set and returns, and
+the scheduler's "all" event enqueues retries that are due, so a worker is
+never held and no attempt runs into the job timeout while waiting (the
+delay is at least RETRY_DELAY, rounded up to the next scheduler tick).
+
+Settings in site_config.json:
+
+- ``ai_agent_pdf_background``: render in the background by default
+- ``ai_agent_pdf_queue``: RQ queue for render jobs (long)
+- ``ai_agent_pdf_job_timeout``: seconds per render job (600)
+- ``ai_agent_pdf_render_attempts``: renders tried before failing (3)
+"""
+
+import frappe
+from frappe import _
+import json
+import time
+from typing import Dict, Any, Optional
+
+from . import export_service
+from . import pdf_cache
+
+
+KEY_PREFIX = "ai_agent_pdf_job"
+RETRY_KEY = f"{KEY_PREFIX}|retries"
+
+# Realtime event sent when a render reaches a final state
+PDF_READY_EVENT = "ai_agent_pdf_ready"
+
+# Defaults, overridable in site_config.json
+DEFAULT_QUEUE = "long"
+DEFAULT_TIMEOUT = 600  # seconds
+DEFAULT_ATTEMPTS = 3
+
+# Delay before retry N is N times this
+RETRY_DELAY = 5  # seconds
+
+# How long job records stay available for polling
+RESULT_TTL = 60 * 60  # seconds
+
+FINAL_STATES = ("finished", "failed")
+
+
+def is_background_requested(background=None) -> bool:
+    """
+    Whether a PDF should be rendered in a background job
+
+    Args:
+        background: Value passed by the client, None to use the site default
+
+    Returns:
+        True when requested or ai_agent_pdf_background is set
+    """
+    if background is None:
+        return bool(frappe.conf.get("ai_agent_pdf_background"))
+    return bool(background)
+
+
+def get_timeout() -> int:
+    """Render job timeout in seconds (ai_agent_pdf_job_timeout)"""
+    return int(frappe.conf.get("ai_agent_pdf_job_timeout") or DEFAULT_TIMEOUT)
+
+
+def enqueue_render(session_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Queue a report render, or join an identical one already in flight
+
+    Args:
+        session_data: Conversation data with messages array
+
+    Returns:
+        dict with temp_key, status and pending (False once the PDF is ready)
+    """
+    key = pdf_cache.make_key(session_data)
+
+    if pdf_cache.has(key):
+        return _state(key, {"status": "finished"})
+
+    # Everyone asking for this report is notified when it is ready
+    cache = frappe.cache()
+    cache.sadd(f"{KEY_PREFIX}|{key}|users", frappe.session.user)
+    cache.expire(cache.make_key(f"{KEY_PREFIX}|{key}|users"), RESULT_TTL)
+
+    job = {"status": "queued", "queued_at": time.time()}
+    payload = json.dumps(job)
+    job_key = cache.make_key(f"{KEY_PREFIX}|{key}")
+
+    if not cache.set(job_key, payload, ex=RESULT_TTL, nx=True):
+        current = _get_job(key)
+        if current and not _is_stale(key, current):
+            return _state(key, current)
+
+        # Failed, lost, or finished but evicted from the PDF cache: render again
+        cache.set(job_key, payload, ex=RESULT_TTL)
+
+    frappe.enqueue(
+        "ai_agent_widget.pdf_jobs.render_pdf_job",
+        queue=frappe.conf.get("ai_agent_pdf_queue") or DEFAULT_QUEUE,
+        timeout=get_timeout(),
+        pdf_key=key,
+        session_data=session_data
+    )
+
+    return _state(key, job)
+
+
+def render_pdf_job(pdf_key: str, session_data: Dict[str, Any], attempt: int = 1):
+    """
+    Background job entry point, one render attempt
+
+    Args:
+        pdf_key: Report cache key returned by enqueue_render
+        session_data: Conversation data with messages array
+        attempt: Attempt number, counted from 1
+    """
+    job = _get_job(pdf_key) or {"queued_at": time.time()}
+
+    if pdf_cache.has(pdf_key):
+        _finish(pdf_key, job, "finished")
+        return
+
+    attempts = int(frappe.conf.get("ai_agent_pdf_render_attempts") or DEFAULT_ATTEMPTS)
+
+    def on_progress(done, total):
+        job["progress"] = {"done": done, "total": total}
+        _save_job(pdf_key, job)
+        for user in _get_users(pdf_key):
+            frappe.publish_realtime(
+                export_service.PROGRESS_EVENT,
+                {"temp_key": pdf_key, "done": done, "total": total},
+                user=user
+            )
+
+    job.update(status="running", attempt=attempt, started_at=time.time(), error=None)
+    _save_job(pdf_key, job)
+
+    try:
+        pdf_cache.get_session_pdf(session_data, progress=on_progress, key=pdf_key)
+    except Exception as e:
+        error = str(e)
+        frappe.log_error(
+            f"AI Agent PDF render failed (attempt {attempt}/{attempts}): {error}",
+            "AI Agent Export"
+        )
+        if attempt < attempts:
+            _schedule_retry(pdf_key, job, session_data, error)
+        else:
+            _finish(pdf_key, job, "failed", error)
+        return
+
+    _finish(pdf_key, job, "finished")
+
+
+def enqueue_due_retries():
+    """Enqueue render retries whose delay has passed (scheduler "all" event)"""
+    cache = frappe.cache()
+    retry_key = cache.make_key(RETRY_KEY)
+
+    for member in cache.zrangebyscore(retry_key, 0, time.time()):
+        pdf_key = member.decode() if isinstance(member, bytes) else member
+
+        # Only the scheduler run that removes the entry enqueues the retry
+        if not cache.zrem(retry_key, pdf_key):
+            continue
+
+        data_key = cache.make_key(f"{KEY_PREFIX}|{pdf_key}|data")
+        job = _get_job(pdf_key)
+        raw = cache.get(data_key)
+        cache.delete(data_key)
+        if not job or not raw or job["status"] != "retrying":
+            continue
+
+        job.update(status="queued", queued_at=time.time(), started_at=None)
+        _save_job(pdf_key, job)
+
+        frappe.enqueue(
+            "ai_agent_widget.pdf_jobs.render_pdf_job",
+            queue=frappe.conf.get("ai_agent_pdf_queue") or DEFAULT_QUEUE,
+            timeout=get_timeout(),
+            pdf_key=pdf_key,
+            session_data=json.loads(raw),
+            attempt=job["attempt"] + 1
+        )
+
+
+def get_render_state(pdf_key: str) -> Dict[str, Any]:
+    """
+    Poll a report render
+
+    Args:
+        pdf_key: Report cache key returned by enqueue_render
+
+    Returns:
+        dict with status, pending, progress and, on failure, the error
+    """
+    if pdf_cache.has(pdf_key):
+        return _state(pdf_key, {"status": "finished"})
+
+    job = _get_job(pdf_key)
+    if not job:
+        return {"success": False, "error": _("PDF render not found")}
+
+    # A worker killed by the RQ timeout never reports back
+    if job["status"] not in FINAL_STATES and _is_stale(pdf_key, job):
+        job = _finish(pdf_key, job, "failed", _("PDF render timed out"))
+
+    return _state(pdf_key, job)
+
+
+def _schedule_retry(pdf_key: str, job: Dict[str, Any], session_data: Dict[str, Any], error: str):
+    """Park a failed attempt until its retry delay has passed"""
+    retry_at = time.time() + RETRY_DELAY * job["attempt"]
+    job.update(status="retrying", retry_at=retry_at, error=error)
+    _save_job(pdf_key, job)
+
+    cache = frappe.cache()
+    cache.set(
+        cache.make_key(f"{KEY_PREFIX}|{pdf_key}|data"),
+        json.dumps(session_data, default=str),
+        ex=RESULT_TTL
+    )
+    cache.zadd(cache.make_key(RETRY_KEY), {pdf_key: retry_at})
+
+
+def _state(pdf_key: str, job: Dict[str, Any]) -> Dict[str, Any]:
+    state = {
+        "success": job["status"] != "failed",
+        "temp_key": pdf_key,
+        "status": job["status"],
+        "pending": job["status"] not in FINAL_STATES,
+        "progress": job.get("progress")
+    }
+    if job.get("error"):
+        state["error"] = job["error"]
+    return state
+
+
+def _is_stale(pdf_key: str, job: Dict[str, Any]) -> bool:
+    """Whether a job record no longer stands for a render in flight"""
+    if job["status"] == "failed":
+        return True
+    if job["status"] == "finished":
+        return not pdf_cache.has(pdf_key)
+
+    # Queue (or retry) wait plus one attempt, same bound as agent jobs
+    since = job.get("started_at") or job.get("retry_at") or job["queued_at"]
+    return time.time() - since > 2 * get_timeout()
+
+
+def _finish(pdf_key: str, job: Dict[str, Any], status: str, error: Optional[str] = None) -> Dict[str, Any]:
+    """Store the final state and notify everyone waiting for the PDF"""
+    job.update(status=status, finished_at=time.time(), error=error)
+    _save_job(pdf_key, job)
+
+    for user in _get_users(pdf_key):
+        frappe.publish_realtime(
+            PDF_READY_EVENT,
+            {"temp_key": pdf_key, "status": status, "error": error},
+            user=user
+        )
+
+    cache = frappe.cache()
+    cache.delete(cache.make_key(f"{KEY_PREFIX}|{pdf_key}|users"))
+
+    return job
+
+
+def _get_users(pdf_key: str):
+    # RedisWrapper.smembers prefixes the key with the site
+    return [
+        u.decode() if isinstance(u, bytes) else u
+        for u in frappe.cache().smembers(f"{KEY_PREFIX}|{pdf_key}|users")
+    ]
+
+
+def _save_job(pdf_key: str, job: Dict[str, Any]):
+    cache = frappe.cache()
+    cache.set(cache.make_key(f"{KEY_PREFIX}|{pdf_key}"), json.dumps(job), ex=RESULT_TTL)
+
+
+def _get_job(pdf_key: str) -> Optional[Dict[str, Any]]:
+    cache = frappe.cache()
+    raw = cache.get(cache.make_key(f"{KEY_PREFIX}|{pdf_key}"))
+    return json.loads(raw) if raw else None
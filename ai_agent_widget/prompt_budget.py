@@ -0,0 +1,278 @@
+"""
+Prompt Budget for AI Agent Widget
+
+Keeps the model input within a fixed token budget however long the session
+gets:
+
+- the newest turns are sent verbatim while they fit
+- older turns are rolled into a short extractive summary, one truncated
+  line per message (cheap enough to rebuild on every request)
+- long list dumps in tool results (get_doctype_list, search_doctype) are
+  cut down, and a tool result identical to an earlier one is sent once;
+  user and assistant prose is never shortened
+
+Tokens are counted with tiktoken when it is installed (cl100k_base, close
+to but not the same as the Gemini tokenizer) and estimated from characters
+otherwise. Every run reports what it sent and how many tokens it saved.
+
+The budget is read from ``ai_agent_prompt_budget`` in site_config.json.
+"""
+
+import frappe
+from typing import Dict, List, Any, Tuple
+
+try:
+    import tiktoken
+    HAS_TIKTOKEN = True
+except ImportError:
+    HAS_TIKTOKEN = False
+
+try:
+    from langchain.agents.middleware import AgentMiddleware
+    HAS_MIDDLEWARE = True
+except ImportError:
+    HAS_MIDDLEWARE = False
+
+
+DEFAULT_BUDGET = 8000  # input tokens: system prompt, history and message
+
+# Most messages sent verbatim, same as the SDK's history window
+MAX_RECENT_MESSAGES = 30
+
+# Characters kept per summarized message
+SUMMARY_LINE_CHARS = 160
+
+# Items kept from a comma-separated list in a tool result
+LIST_KEEP = 8
+MAX_TOOL_CHARS = 1200
+
+# Prefix of the lookup tools' text results (entity_lookup, tool_executor)
+TOOL_OUTPUT_PREFIX = "📋"
+
+# Sent instead of a tool result identical to an earlier one
+DUPLICATE_RESULT = "(Same result as an earlier call.)"
+
+CHARS_PER_TOKEN = 4
+
+_encoding = None
+
+
+def get_budget() -> int:
+    """Input token budget (ai_agent_prompt_budget)"""
+    return int(frappe.conf.get("ai_agent_prompt_budget") or DEFAULT_BUDGET)
+
+
+def count_tokens(text: str) -> int:
+    """
+    Number of tokens in text
+
+    Args:
+        text: Text to count
+
+    Returns:
+        Token count (tiktoken when available, else a character estimate)
+    """
+    global _encoding
+
+    if not text:
+        return 0
+
+    if HAS_TIKTOKEN:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text, disallowed_special=()))
+
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def new_report(budget: int) -> Dict[str, Any]:
+    """Empty per-run report, filled in by compact_history and the middleware"""
+    return {
+        "budget": budget,
+        "tokenizer": "tiktoken" if HAS_TIKTOKEN else "estimate",
+        "history_messages": 0,
+        "summarized_messages": 0,
+        "history_tokens": 0,
+        "history_tokens_sent": 0,
+        "tool_tokens_saved": 0,
+        "tokens_saved": 0
+    }
+
+
+def compact_history(
+    history: List[Dict[str, str]],
+    budget: int,
+    report: Dict[str, Any]
+) -> Tuple[List[Dict[str, str]], str]:
+    """
+    Fit conversation history into a token budget
+
+    Args:
+        history: Conversation history, oldest first
+        budget: Tokens available for history (summary included)
+        report: Run report to update
+
+    Returns:
+        (recent messages to send verbatim, summary of older messages or "")
+    """
+    messages = [
+        {"role": m.get("role"), "content": _compact_if_tool_output(m)}
+        for m in history
+    ]
+    original = sum(count_tokens(m.get("content") or "") for m in history)
+
+    # Newest first while they fit, leaving room for a summary
+    recent_budget = max(0, budget * 3 // 4)
+    recent = []
+    used = 0
+    for msg in reversed(messages[-MAX_RECENT_MESSAGES:]):
+        tokens = count_tokens(msg["content"])
+        if used + tokens > recent_budget:
+            break
+        recent.insert(0, msg)
+        used += tokens
+
+    older = messages[:len(messages) - len(recent)]
+    summary = _summarize(older, budget - used) if older else ""
+    sent = used + count_tokens(summary)
+
+    report.update(
+        history_messages=len(history),
+        summarized_messages=len(older),
+        history_tokens=original,
+        history_tokens_sent=sent
+    )
+    report["tokens_saved"] += max(0, original - sent)
+
+    return recent, summary
+
+
+def _compact_if_tool_output(message: Dict[str, str]) -> str:
+    """Compact tool results only; prose with many commas is left alone"""
+    content = message.get("content") or ""
+    if message.get("role") == "tool" or (isinstance(content, str) and content.startswith(TOOL_OUTPUT_PREFIX)):
+        return compact_tool_output(content)
+    return content
+
+
+def compact_tool_output(text: str) -> str:
+    """
+    Shorten list dumps and oversized text in a tool result
+
+    Args:
+        text: Tool result or message content
+
+    Returns:
+        Compacted text; JSON payloads are returned unchanged
+    """
+    if not isinstance(text, str) or text.lstrip().startswith(("{", "[")):
+        return text
+
+    lines = []
+    for line in text.split("\n"):
+        items = line.split(", ")
+        if len(items) > LIST_KEEP:
+            line = ", ".join(items[:LIST_KEEP]) + f", … (+{len(items) - LIST_KEEP} more)"
+        lines.append(line)
+    text = "\n".join(lines)
+
+    if len(text) > MAX_TOOL_CHARS:
+        text = text[:MAX_TOOL_CHARS] + f"… ({len(text) - MAX_TOOL_CHARS} characters cut)"
+
+    return text
+
+
+def compact_tool_messages(messages: List) -> Tuple[List, int]:
+    """
+    Compact and dedupe the tool results in a model request
+
+    Args:
+        messages: LangChain messages about to be sent
+
+    Returns:
+        (messages to send, tokens saved)
+    """
+    seen = set()
+    compacted = []
+    saved = 0
+
+    for msg in messages:
+        content = getattr(msg, "content", None)
+        if getattr(msg, "type", None) != "tool" or not isinstance(content, str):
+            compacted.append(msg)
+            continue
+
+        if content in seen and len(content) > len(DUPLICATE_RESULT):
+            new_content = DUPLICATE_RESULT
+        else:
+            seen.add(content)
+            new_content = compact_tool_output(content)
+
+        if new_content != content:
+            saved += count_tokens(content) - count_tokens(new_content)
+            msg = msg.model_copy(update={"content": new_content})
+        compacted.append(msg)
+
+    return compacted, saved
+
+
+def get_middleware(report: Dict[str, Any]) -> List:
+    """
+    Agent middleware that compacts tool results before each model call
+
+    Only what is sent to the model changes; the agent state, and so the
+    steps the widget receives, keep the full results.
+
+    Args:
+        report: Run report to add the savings to
+
+    Returns:
+        list of middleware for create_agent (empty without middleware support)
+    """
+    if not HAS_MIDDLEWARE:
+        return []
+    return [ToolOutputCompaction(report)]
+
+
+if HAS_MIDDLEWARE:
+    class ToolOutputCompaction(AgentMiddleware):
+        """Compacts tool results in every model request of a run"""
+
+        def __init__(self, report: Dict[str, Any]):
+            super().__init__()
+            self.report = report
+
+        def wrap_model_call(self, request, handler):
+            messages, saved = compact_tool_messages(request.messages)
+            if saved:
+                self.report["tool_tokens_saved"] += saved
+                self.report["tokens_saved"] += saved
+                request = request.override(messages=messages)
+            return handler(request)
+
+
+def _summarize(messages: List[Dict[str, str]], budget: int) -> str:
+    """Summary lines for older messages, newest kept when over budget"""
+    lines = [_summary_line(m) for m in messages if m.get("content")]
+
+    header = "EARLIER IN THIS CONVERSATION (summarized):"
+    budget -= count_tokens(header)
+    kept = []
+    for line in reversed(lines):
+        tokens = count_tokens(line)
+        if tokens > budget:
+            break
+        kept.insert(0, line)
+        budget -= tokens
+
+    if not kept:
+        return ""
+
+    return "\n".join([header] + kept)
+
+
+def _summary_line(message: Dict[str, str]) -> str:
+    text = " ".join(message["content"].split())
+    if len(text) > SUMMARY_LINE_CHARS:
+        text = text[:SUMMARY_LINE_CHARS - 1] + "…"
+    return f"- {message.get('role')}: {text}"
@@ -16,8 +16,13 @@ class AgenticChatWidget {
         this.currentSessionData = null;  // Store session data for export
         this.hasCompletedActions = false; // Track if any actions were performed
         this.currentPdfKey = null; // Store PDF cache key for cleanup
+        this.currentJobId = null; // Background agent run, if any
+        this.entityLookups = {}; // Batched lookup promises for the current response
+        this.pendingLookups = [];
+        this.lookupTimer = null;
 
         this.loadMessages();
+        this.loadConversation();
         this.render();
         this.bindEvents();
     }
@@ -50,6 +55,31 @@ class AgenticChatWidget {
         }
     }
 
+    loadConversation() {
+        // Server-side history handle, shared by all tabs of this browser
+        const saved = localStorage.getItem('frappe_ai_agent_conversation');
+        if (saved) {
+            try {
+                this.conversation = JSON.parse(saved);
+                return;
+            } catch (e) { }
+        }
+        this.startConversation();
+    }
+
+    startConversation() {
+        this.conversation = {
+            id: `${Date.now()}_${Math.random().toString(36).slice(2, 12)}`,
+            cursor: 0,
+            seeded: false
+        };
+        this.saveConversation();
+    }
+
+    saveConversation() {
+        localStorage.setItem('frappe_ai_agent_conversation', JSON.stringify(this.conversation));
+    }
+
     render() {
         const html = `
             <div id="ai-agent-widget" class="ai-agent-widget" style="display: none;">
@@ -236,6 +266,7 @@ class AgenticChatWidget {
         } else {
             this.window.hide();
             this.floatBtn.show();
+            this.cancelAgentJob();
         }
     }
 
@@ -263,6 +294,8 @@ class AgenticChatWidget {
     }
 
     clearChat() {
+        this.cancelAgentJob();
+
         // Clear PDF cache if it exists
         if (this.currentPdfKey) {
             fetch('/api/method/frappe.cache_manager.clear_value', {
@@ -279,6 +312,19 @@ class AgenticChatWidget {
             this.currentPdfKey = null;
         }
 
+        // Drop server-side history for this conversation
+        fetch('/api/method/ai_agent_widget.api.clear_conversation', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-Frappe-CSRF-Token': frappe.csrf_token
+            },
+            body: JSON.stringify({
+                conversation_id: this.conversation.id
+            })
+        }).catch(err => { }); // Silent fail, entries expire anyway
+        this.startConversation();
+
         // Clear validation cache and flow state (if they exist)
         if (this.validatedEntities) {
             Object.keys(this.validatedEntities).forEach(key => {
@@ -401,6 +447,10 @@ class AgenticChatWidget {
         return String(content);
     }
 
+    isEntityLookup(toolName) {
+        return ['search_doctype', 'get_doctype_list', 'validate_doctype_exists'].includes(toolName);
+    }
+
     shouldShowToolCall(toolName) {
         // Hide technical/internal tools from UI to keep it clean and user-friendly
         const hiddenTools = [
@@ -459,108 +509,108 @@ class AgenticChatWidget {
     }
 
     async streamResponse(message, assistantMsg) {
-        try {
-            // Single API call - backend handles entire agent loop with streaming events
-            this.updateSubtitle('🤔 Thinking...');
-
-            const response = await fetch('/api/method/ai_agent_widget.api.agent_stream', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'X-Frappe-CSRF-Token': frappe.csrf_token
-                },
-                body: JSON.stringify({
-                    message: message,
-                    context: {
-                        currentPath: frappe.get_route_str(),
-                        user: frappe.session.user
-                    },
-                    history: this.messages.filter(m => m.id !== assistantMsg.id).map(m => ({
-                        role: m.role,
-                        content: m.content || ''
-                    }))
-                })
-            });
+        // Steps arrive over realtime while the agent loop runs; the final
+        // response carries all steps again, so nothing is lost without socketio
+        const streamId = `${Date.now()}_${Math.random().toString(36).slice(2, 10)}`;
+        const stepState = {
+            nextIndex: 0,
+            pending: {},
+            chain: Promise.resolve(),
+            toolExecutionResults: [],
+            hasErrors: false
+        };
 
-            if (!response.ok) throw new Error(`Server error: ${response.status}`);
+        // Lookups from an earlier response may be stale
+        this.entityLookups = {};
 
-            const data = await response.json();
-            const result = data.message || data;
+        const enqueueStep = (index, step) => {
+            if (index < stepState.nextIndex || stepState.pending.hasOwnProperty(index)) return; // Already queued
+            stepState.pending[index] = step;
 
-            if (result.error) {
-                throw new Error(result.error);
+            // Start read-only lookups right away so a burst of steps shares one request
+            if (step.type === 'tool_call' && step.server_result === undefined && this.isEntityLookup(step.tool)) {
+                this.queueEntityLookup(step.tool, step.args).catch(err => { }); // Reported when the step runs
             }
 
-            // Production: Only log errors, not debug info
+            // Process strictly in order, one step at a time
+            while (stepState.pending.hasOwnProperty(stepState.nextIndex)) {
+                const nextStep = stepState.pending[stepState.nextIndex];
+                delete stepState.pending[stepState.nextIndex];
+                stepState.nextIndex++;
+                stepState.chain = stepState.chain.then(() => this.processAgentStep(nextStep, assistantMsg, stepState));
+            }
+        };
 
-            // Process agent_steps for step-by-step display
-            assistantMsg.toolCalls = assistantMsg.toolCalls || [];
-            assistantMsg.agentSteps = result.agent_steps || [];
+        const onStep = (data) => {
+            if (data && data.stream_id === streamId) {
+                enqueueStep(data.index, data.step);
+            }
+        };
 
-            // Collect tool execution results to send back to agent
-            const toolExecutionResults = [];
-            let hasErrors = false;
-
-            // Process each step from the agent
-            for (const step of assistantMsg.agentSteps) {
-                if (step.type === 'tool_call') {
-                    // Skip technical tools from UI display
-                    if (!this.shouldShowToolCall(step.tool)) {
-                        // Execute silently without showing in UI
-                        const toolOutput = await this.executeToolCall(step.tool, step.args);
-                        toolExecutionResults.push({
-                            tool: step.tool,
-                            result: toolOutput
-                        });
-                        if (toolOutput.includes('❌') || toolOutput.includes('⚠️')) {
-                            hasErrors = true;
-                        }
-                        continue; // Skip UI rendering
-                    }
+        if (frappe.realtime && frappe.realtime.on) {
+            frappe.realtime.on('ai_agent_step', onStep);
+        }
 
-                    this.updateSubtitle(`🔧 ${step.tool}...`);
+        try {
+            // Single API call - backend handles entire agent loop with streaming events
+            this.updateSubtitle('🤔 Thinking...');
+            assistantMsg.toolCalls = assistantMsg.toolCalls || [];
 
-                    const toolCallUI = {
-                        name: step.tool,
-                        args: step.args,
-                        executing: true
-                    };
-                    assistantMsg.toolCalls.push(toolCallUI);
-                    this.renderMessages();
+            // Only the new message and a cursor are sent; the server keeps the history.
+            // Full history is uploaded once to seed the store, or when the server asks for it.
+            const priorMessages = this.messages.slice(0, this.messages.indexOf(assistantMsg) - 1);
+            const fullHistory = () => priorMessages.map(m => ({
+                role: m.role,
+                content: m.content || ''
+            }));
+
+            const requestBody = {
+                message: message,
+                stream_id: streamId,
+                conversation_id: this.conversation.id,
+                cursor: this.conversation.cursor,
+                // Answers on an open form depend on its unsaved state - never reuse them
+                no_cache: (frappe.get_route() || [])[0] === 'Form',
+                context: {
+                    currentPath: frappe.get_route_str(),
+                    isDirty: !!(window.cur_frm && cur_frm.is_dirty()),
+                    user: frappe.session.user
+                }
+            };
+            if (!this.conversation.seeded) {
+                requestBody.history = fullHistory();
+            }
 
-                    // Execute tool on frontend
-                    const toolOutput = await this.executeToolCall(step.tool, step.args);
-                    toolCallUI.result = toolOutput;
-                    toolCallUI.executing = false;
-                    this.renderMessages();
+            let result = await this.postAgentRequest(requestBody);
+            if (result.resync_required) {
+                requestBody.history = fullHistory();
+                result = await this.postAgentRequest(requestBody);
+            }
 
-                    // Collect result for feedback
-                    toolExecutionResults.push({
-                        tool: step.tool,
-                        result: toolOutput
-                    });
+            // Async mode: the run was queued as a background job
+            if (result.job_id) {
+                result = await this.waitForAgentJob(result.job_id, enqueueStep);
+            }
 
-                    if (toolOutput.includes('❌') || toolOutput.includes('⚠️')) {
-                        hasErrors = true;
-                    }
+            if (result.error) {
+                throw new Error(result.error);
+            }
 
-                    await this.wait(400);
+            if (result.cursor !== undefined) {
+                this.conversation.cursor = result.cursor;
+                this.conversation.seeded = true;
+                this.saveConversation();
+            }
 
-                } else if (step.type === 'tool_result') {
-                    this.updateSubtitle(`✅ Tool completed`);
-                    await this.wait(200);
+            // Production: Only log errors, not debug info
 
-                } else if (step.type === 'response') {
-                    if (step.content && !step.content.includes('tool_calls')) {
-                        // Don't show response yet - we need to check if errors occurred
-                        if (!hasErrors) {
-                            assistantMsg.content = step.content;
-                            this.renderMessages();
-                        }
-                    }
-                }
-            }
+            // Process any steps the realtime channel did not deliver
+            assistantMsg.agentSteps = result.agent_steps || [];
+            assistantMsg.agentSteps.forEach((step, index) => enqueueStep(index, step));
+            await stepState.chain;
 
+            const toolExecutionResults = stepState.toolExecutionResults;
+            const hasErrors = stepState.hasErrors;
 
             // Check if we have a final response from the agent
             if (result.content) {
@@ -603,6 +653,158 @@ class AgenticChatWidget {
             assistantMsg.isStreaming = false;
             this.renderMessages();
             this.updateSubtitle('Error');
+        } finally {
+            if (frappe.realtime && frappe.realtime.off) {
+                frappe.realtime.off('ai_agent_step', onStep);
+            }
+        }
+    }
+
+    async postAgentRequest(requestBody) {
+        return this.callApi('agent_stream', requestBody);
+    }
+
+    async waitForAgentJob(jobId, onStep) {
+        // Realtime events deliver steps early; polling fills gaps and reports completion
+        this.currentJobId = jobId;
+        let since = 0;
+
+        try {
+            while (this.currentJobId === jobId) {
+                const state = await this.callApi('get_agent_job', { job_id: jobId, since: since });
+                if (!state.success) {
+                    throw new Error(state.error || 'Agent job not found');
+                }
+
+                state.steps.forEach((step, i) => onStep(since + i, step));
+                since = state.next_index;
+
+                if (state.status === 'finished' || state.status === 'failed') {
+                    return state.result || { error: 'Agent run failed' };
+                }
+                if (state.status === 'cancelled') {
+                    break;
+                }
+
+                await this.wait(1000);
+            }
+            return { error: 'Agent run cancelled' };
+        } finally {
+            if (this.currentJobId === jobId) {
+                this.currentJobId = null;
+            }
+        }
+    }
+
+    async waitForPdf(tempKey) {
+        // Background render: poll until the PDF is in the report cache
+        try {
+            while (true) {
+                const state = await this.callApi('get_pdf_render_state', { temp_key: tempKey });
+                if (!state.success) {
+                    throw new Error(state.error || 'Failed to generate PDF');
+                }
+                if (!state.pending) {
+                    return;
+                }
+
+                if (state.progress && state.progress.total > 1) {
+                    frappe.show_progress('Generating PDF', state.progress.done, state.progress.total);
+                }
+
+                await this.wait(1000);
+            }
+        } finally {
+            frappe.hide_progress();
+        }
+    }
+
+    cancelAgentJob() {
+        if (!this.currentJobId) return;
+
+        this.callApi('cancel_agent_job', { job_id: this.currentJobId })
+            .catch(err => { }); // Silent fail, the job times out anyway
+        this.currentJobId = null;
+    }
+
+    async callApi(method, args) {
+        const response = await fetch(`/api/method/ai_agent_widget.api.${method}`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-Frappe-CSRF-Token': frappe.csrf_token
+            },
+            body: JSON.stringify(args)
+        });
+
+        if (!response.ok) throw new Error(`Server error: ${response.status}`);
+
+        const data = await response.json();
+        return data.message || data;
+    }
+
+    async runAgentTool(step) {
+        // Read-only tools already ran on the server inside the agent loop
+        if (step.server_result !== undefined) return step.server_result;
+        return this.executeToolCall(step.tool, step.args);
+    }
+
+    async processAgentStep(step, assistantMsg, stepState) {
+        if (step.type === 'tool_call') {
+            // Skip technical tools from UI display
+            if (!this.shouldShowToolCall(step.tool)) {
+                // Execute silently without showing in UI
+                const toolOutput = await this.runAgentTool(step);
+                stepState.toolExecutionResults.push({
+                    tool: step.tool,
+                    result: toolOutput
+                });
+                if (toolOutput.includes('❌') || toolOutput.includes('⚠️')) {
+                    stepState.hasErrors = true;
+                }
+                return; // Skip UI rendering
+            }
+
+            this.updateSubtitle(`🔧 ${step.tool}...`);
+
+            const toolCallUI = {
+                name: step.tool,
+                args: step.args,
+                executing: true
+            };
+            assistantMsg.toolCalls.push(toolCallUI);
+            this.renderMessages();
+
+            // Execute tool on frontend (unless the server already did)
+            const toolOutput = await this.runAgentTool(step);
+            toolCallUI.result = toolOutput;
+            toolCallUI.executing = false;
+            this.renderMessages();
+
+            // Collect result for feedback
+            stepState.toolExecutionResults.push({
+                tool: step.tool,
+                result: toolOutput
+            });
+
+            if (toolOutput.includes('❌') || toolOutput.includes('⚠️')) {
+                stepState.hasErrors = true;
+            }
+
+            await this.wait(400);
+
+        } else if (step.type === 'tool_result') {
+            this.updateSubtitle(`✅ Tool completed`);
+            await this.wait(200);
+
+        } else if (step.type === 'response') {
+            if (step.content && !step.content.includes('tool_calls')) {
+                // Don't show response yet - we need to check if errors occurred
+                if (!stepState.hasErrors) {
+                    assistantMsg.content = step.content;
+                    this.renderMessages();
+                }
+            }
         }
     }
 
@@ -952,95 +1154,21 @@ class AgenticChatWidget {
 
                 case 'search_doctype':
                     try {
-                        const searchResults = await new Promise((resolve, reject) => {
-                            frappe.call({
-                                method: 'frappe.client.get_list',
-                                args: {
-                                    doctype: args.doctype,
-                                    filters: args.search_text ? [[args.doctype, 'name', 'like', `%${args.search_text}%`]] : [],
-                                    fields: ['name'],
-                                    limit_page_length: args.limit || 20
-                                },
-                                callback: (r) => {
-                                    if (r.message) {
-                                        resolve(r.message);
-                                    } else {
-                                        resolve([]);
-                                    }
-                                },
-                                error: (err) => reject(err)
-                            });
-                        });
-
-                        if (searchResults.length === 0) {
-                            return `📋 No ${args.doctype} records found matching "${args.search_text}"`;
-                        }
-
-                        const names = searchResults.map(r => r.name).slice(0, 10);
-                        const displayList = names.join(', ');
-                        const total = searchResults.length;
-                        return `📋 Found ${total} ${args.doctype} record(s) matching "${args.search_text}":\n${displayList}${total > 10 ? ` (showing first 10)` : ''}`;
+                        return await this.queueEntityLookup(toolName, args);
                     } catch (error) {
                         return `❌ Error searching ${args.doctype}: ${error.message || error}`;
                     }
 
                 case 'get_doctype_list':
                     try {
-                        const listResults = await new Promise((resolve, reject) => {
-                            frappe.call({
-                                method: 'frappe.client.get_list',
-                                args: {
-                                    doctype: args.doctype,
-                                    fields: ['name'],
-                                    limit_page_length: args.limit || 50
-                                },
-                                callback: (r) => {
-                                    if (r.message) {
-                                        resolve(r.message);
-                                    } else {
-                                        resolve([]);
-                                    }
-                                },
-                                error: (err) => reject(err)
-                            });
-                        });
-
-                        if (listResults.length === 0) {
-                            return `📋 No ${args.doctype} records found in the system`;
-                        }
-
-                        const names = listResults.map(r => r.name).slice(0, 15);
-                        const total = listResults.length;
-
-                        // Return in clear format with exact names in quotes
-                        const quotedNames = names.map(n => `"${n}"`).join(', ');
-                        return `📋 Found ${total} ${args.doctype} record(s). Use EXACT names in quotes:\n\nFirst available: "${names[0]}"\n\nAll records: ${quotedNames}${total > 15 ? ' (showing first 15)' : ''}`;
+                        return await this.queueEntityLookup(toolName, args);
                     } catch (error) {
                         return `❌ Error listing ${args.doctype}: ${error.message || error}`;
                     }
 
                 case 'validate_doctype_exists':
                     try {
-                        const exists = await new Promise((resolve, reject) => {
-                            frappe.call({
-                                method: 'frappe.client.get_value',
-                                args: {
-                                    doctype: args.doctype,
-                                    filters: { name: args.name },
-                                    fieldname: 'name'
-                                },
-                                callback: (r) => {
-                                    resolve(r.message && r.message.name);
-                                },
-                                error: (err) => resolve(null) // Don't reject, just return null
-                            });
-                        });
-
-                        if (exists) {
-                            return `✅ ${args.doctype} "${args.name}" exists`;
-                        } else {
-                            return `❌ ${args.doctype} "${args.name}" does NOT exist`;
-                        }
+                        return await this.queueEntityLookup(toolName, args);
                     } catch (error) {
                         return `❌ Error validating ${args.doctype}: ${error.message || error}`;
                     }
@@ -1053,6 +1181,40 @@ class AgenticChatWidget {
         }
     }
 
+    queueEntityLookup(toolName, args) {
+        // Lookups queued within a few ms go to the server as one batch request
+        const key = JSON.stringify([toolName, args]);
+        if (!this.entityLookups[key]) {
+            this.entityLookups[key] = new Promise((resolve, reject) => {
+                this.pendingLookups.push({
+                    lookup: { tool: toolName, ...args },
+                    resolve,
+                    reject
+                });
+            });
+            if (!this.lookupTimer) {
+                this.lookupTimer = setTimeout(() => this.flushEntityLookups(), 20);
+            }
+        }
+        return this.entityLookups[key];
+    }
+
+    async flushEntityLookups() {
+        const batch = this.pendingLookups;
+        this.pendingLookups = [];
+        this.lookupTimer = null;
+
+        try {
+            const result = await this.callApi('resolve_entities', {
+                lookups: batch.map(b => b.lookup)
+            });
+            if (!result.success) throw new Error(result.error || 'Lookup failed');
+            batch.forEach((b, i) => b.resolve(result.results[i]));
+        } catch (error) {
+            batch.forEach(b => b.reject(error));
+        }
+    }
+
     async waitForElement(selector, timeout) {
         const start = Date.now();
         while (Date.now() - start < timeout) {
@@ -1355,18 +1517,17 @@ class AgenticChatWidget {
                 throw new Error(exportResult.error || 'Failed to generate PDF');
             }
 
+            if (exportResult.pending) {
+                await this.waitForPdf(exportResult.temp_key);
+            }
+
             // Step 2: Download PDF using temp key
-            const downloadResponse = await fetch('/api/method/ai_agent_widget.api.download_session_pdf', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'X-Frappe-CSRF-Token': frappe.csrf_token
-                },
-                body: JSON.stringify({
-                    session_id: exportResult.session_id,
-                    temp_key: exportResult.temp_key
-                })
+            // GET, so the browser can revalidate a repeat download with the report's ETag
+            const downloadParams = new URLSearchParams({
+                session_id: exportResult.session_id,
+                temp_key: exportResult.temp_key
             });
+            const downloadResponse = await fetch(`/api/method/ai_agent_widget.api.download_session_pdf?${downloadParams}`);
 
             if (!downloadResponse.ok) {
                 throw new Error('Failed to download PDF');
@@ -1434,18 +1595,17 @@ class AgenticChatWidget {
                 throw new Error(exportResult.error || 'Failed to generate PDF');
             }
 
+            if (exportResult.pending) {
+                await this.waitForPdf(exportResult.temp_key);
+            }
+
             // Step 2: Download PDF using temp key
-            const downloadResponse = await fetch('/api/method/ai_agent_widget.api.download_session_pdf', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'X-Frappe-CSRF-Token': frappe.csrf_token
-                },
-                body: JSON.stringify({
-                    session_id: exportResult.session_id,
-                    temp_key: exportResult.temp_key
-                })
+            // GET, so the browser can revalidate a repeat download with the report's ETag
+            const downloadParams = new URLSearchParams({
+                session_id: exportResult.session_id,
+                temp_key: exportResult.temp_key
             });
+            const downloadResponse = await fetch(`/api/method/ai_agent_widget.api.download_session_pdf?${downloadParams}`);
 
             if (!downloadResponse.ok) {
                 throw new Error('Failed to download PDF');
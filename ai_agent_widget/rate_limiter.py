@@ -0,0 +1,227 @@
+"""
+Rate Limiter for AI Agent Widget
+
+Limits agent runs per user and per site before they reach the LLM:
+
+- token buckets (sustained rate plus burst) for the user and for the site
+- concurrency semaphores capping runs in flight per user and per site
+
+Both checks run in one Redis script, so a run either gets a token and a
+slot or takes nothing. Requests over a limit wait briefly for capacity
+instead of failing straight away.
+
+Limits are read from ``ai_agent_rate_limits`` in site_config.json, e.g.::
+
+    "ai_agent_rate_limits": {
+        "user_per_minute": 10, "user_burst": 5, "user_concurrency": 2,
+        "site_per_minute": 120, "site_burst": 30, "site_concurrency": 10,
+        "max_wait": 10
+    }
+
+A ``*_per_minute`` of 0 disables that rate limit (the concurrency cap still
+applies).
+"""
+
+import frappe
+from frappe import _
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Any
+
+
+KEY_PREFIX = "ai_agent_rate_limit"
+SITE_SLOTS_KEY = f"{KEY_PREFIX}|site|slots"
+SITE_BUCKET_KEY = f"{KEY_PREFIX}|site|bucket"
+
+DEFAULT_LIMITS = {
+    "user_per_minute": 10,
+    "user_burst": 5,
+    "user_concurrency": 2,
+    "site_per_minute": 120,
+    "site_burst": 30,
+    "site_concurrency": 10,
+    "max_wait": 10  # seconds a request may queue for capacity
+}
+
+# Seconds between capacity checks while queued
+POLL_INTERVAL = 0.25
+
+# Returns {acquired, reason, retry_after, user_tokens, user_in_flight, site_in_flight}
+ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[2])
+
+local function refill(key, per_second, burst)
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or burst
+    local ts = tonumber(bucket[2]) or now
+    return math.min(burst, tokens + math.max(0, now - ts) * per_second)
+end
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+local user_in_flight = redis.call('ZCARD', KEYS[1])
+local site_in_flight = redis.call('ZCARD', KEYS[2])
+
+-- A rate of 0 disables that bucket
+local user_rate, user_burst = tonumber(ARGV[4]), tonumber(ARGV[5])
+local site_rate, site_burst = tonumber(ARGV[6]), tonumber(ARGV[7])
+local user_limited = user_rate > 0
+local site_limited = site_rate > 0
+local user_tokens = user_limited and refill(KEYS[3], user_rate, user_burst) or 0
+local site_tokens = site_limited and refill(KEYS[4], site_rate, site_burst) or 0
+
+local reason = ''
+local retry_after = 0
+if user_in_flight >= tonumber(ARGV[8]) then
+    reason = 'user_concurrency'
+elseif site_in_flight >= tonumber(ARGV[9]) then
+    reason = 'site_concurrency'
+elseif user_limited and user_tokens < 1 then
+    reason = 'user_rate'
+    retry_after = (1 - user_tokens) / user_rate
+elseif site_limited and site_tokens < 1 then
+    reason = 'site_rate'
+    retry_after = (1 - site_tokens) / site_rate
+end
+
+if reason == '' then
+    user_tokens = user_tokens - 1
+    site_tokens = site_tokens - 1
+    local expires = now + tonumber(ARGV[3])
+    redis.call('ZADD', KEYS[1], expires, ARGV[1])
+    redis.call('ZADD', KEYS[2], expires, ARGV[1])
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+    redis.call('EXPIRE', KEYS[2], ARGV[3])
+    user_in_flight = user_in_flight + 1
+    site_in_flight = site_in_flight + 1
+end
+
+if user_limited then
+    redis.call('HSET', KEYS[3], 'tokens', tostring(user_tokens), 'ts', tostring(now))
+    redis.call('EXPIRE', KEYS[3], math.ceil(user_burst / user_rate) + 1)
+end
+if site_limited then
+    redis.call('HSET', KEYS[4], 'tokens', tostring(site_tokens), 'ts', tostring(now))
+    redis.call('EXPIRE', KEYS[4], math.ceil(site_burst / site_rate) + 1)
+end
+
+return {reason == '' and 1 or 0, reason, tostring(retry_after),
+        tostring(user_tokens), user_in_flight, site_in_flight}
+"""
+
+
+class RateLimitExceeded(Exception):
+    """Raised when no capacity became available within max_wait"""
+
+    def __init__(self, reason: str, retry_after: float):
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(_("AI agent is busy ({0}). Please retry in {1} seconds.").format(
+            reason.replace("_", " "), max(1, round(retry_after))
+        ))
+
+
+def get_limits() -> Dict[str, Any]:
+    """Effective limits: defaults overridden by ai_agent_rate_limits"""
+    limits = dict(DEFAULT_LIMITS)
+    limits.update(frappe.conf.get("ai_agent_rate_limits") or {})
+    return limits
+
+
+@contextmanager
+def acquire(user: str, lease_seconds: int):
+    """
+    Hold a rate-limit token and a concurrency slot for one agent run
+
+    Waits up to max_wait seconds for capacity.
+
+    Args:
+        user: User starting the run
+        lease_seconds: Upper bound on the run's duration; slots of runs that
+            die without releasing expire after this
+
+    Yields:
+        dict describing limits and occupancy, suitable for the response
+
+    Raises:
+        RateLimitExceeded: When capacity did not free up in time
+    """
+    cache = frappe.cache()
+    limits = get_limits()
+    member = f"{user}|{frappe.generate_hash(length=10)}"
+    keys = [
+        cache.make_key(f"{KEY_PREFIX}|user|{user}|slots"),
+        cache.make_key(SITE_SLOTS_KEY),
+        cache.make_key(f"{KEY_PREFIX}|user|{user}|bucket"),
+        cache.make_key(SITE_BUCKET_KEY)
+    ]
+    args = [
+        member,
+        None,  # now, filled per attempt
+        int(lease_seconds),
+        # 0 per minute disables the bucket; an enabled bucket holds at least one token
+        max(0, limits["user_per_minute"]) / 60.0,
+        max(1, limits["user_burst"]),
+        max(0, limits["site_per_minute"]) / 60.0,
+        max(1, limits["site_burst"]),
+        limits["user_concurrency"],
+        limits["site_concurrency"]
+    ]
+
+    script = cache.register_script(ACQUIRE_SCRIPT)
+    started = time.time()
+    deadline = started + limits["max_wait"]
+
+    while True:
+        args[1] = time.time()
+        acquired, reason, retry_after, tokens, user_in_flight, site_in_flight = script(keys=keys, args=args)
+        reason = reason.decode() if isinstance(reason, bytes) else reason
+        retry_after = float(retry_after)
+
+        if acquired:
+            break
+
+        # Fail fast when the bucket cannot refill before the deadline
+        remaining = deadline - time.time()
+        if remaining <= 0 or retry_after > remaining:
+            raise RateLimitExceeded(reason, retry_after or POLL_INTERVAL)
+
+        time.sleep(min(remaining, max(POLL_INTERVAL, retry_after)))
+
+    try:
+        yield {
+            "waited": round(time.time() - started, 3),
+            "user_tokens_remaining": round(float(tokens), 2),
+            "user_in_flight": user_in_flight,
+            "site_in_flight": site_in_flight,
+            "limits": limits
+        }
+    finally:
+        pipe = cache.pipeline()
+        pipe.zrem(keys[0], member)
+        pipe.zrem(keys[1], member)
+        pipe.execute()
+
+
+def get_occupancy() -> Dict[str, Any]:
+    """
+    Current in-flight runs for this site
+
+    Returns:
+        dict with limits, total runs in flight and runs per user
+    """
+    cache = frappe.cache()
+    site_key = cache.make_key(SITE_SLOTS_KEY)
+    members = cache.zrangebyscore(site_key, time.time(), "+inf")
+
+    per_user = Counter(
+        (m.decode() if isinstance(m, bytes) else m).rsplit("|", 1)[0]
+        for m in members
+    )
+
+    return {
+        "limits": get_limits(),
+        "site_in_flight": len(members),
+        "users": dict(per_user)
+    }
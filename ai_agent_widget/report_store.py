@@ -0,0 +1,260 @@
+"""
+Report Store for AI Agent Widget
+
+Shared session reports, the files behind WhatsApp links and email
+attachments. Reports are public files named by their content key (the
+report cache key from pdf_cache.make_key), so a report shared many times,
+or by several sessions with the same conversation, is stored once, and a
+repeat share finds it with one hash lookup instead of rendering and
+writing it again. The key is a SHA-256 digest, so links cannot be guessed.
+
+Files are copied in through a temporary file and renamed, so a link never
+serves a partial PDF. Emails attach a report through one File document per
+report, which is deleted along with it. Per site, a sorted set tracks when
+each report was last shared and a hash tracks its size. An hourly job, off
+the request path, deletes reports not shared within the link lifetime and
+then least recently shared reports past the quota, so the store can
+overshoot the quota by an hour of shares. A report attached to an email
+that is still waiting in the Email Queue is kept until the email is sent.
+
+Settings in site_config.json:
+
+- ``ai_agent_report_store_max_mb``: total size of shared reports (500)
+- ``ai_agent_share_link_hours``: hours a report stays shared after its
+  last share (24)
+"""
+
+import frappe
+import json
+import os
+import shutil
+import time
+from frappe.utils import get_url
+from typing import Dict, Any, Optional, Set
+
+
+KEY_PREFIX = "ai_agent_report_store"
+LRU_KEY = f"{KEY_PREFIX}|lru"
+SIZES_KEY = f"{KEY_PREFIX}|sizes"
+
+# Folder under the site's public files holding the shared reports
+REPORT_FOLDER = "ai_agent_reports"
+
+# Email Queue states in which an email still reads its attachments
+UNSENT_EMAIL_STATES = ("Not Sent", "Sending", "Partially Sent")
+
+# Defaults, overridable in site_config.json
+DEFAULT_MAX_MB = 500
+DEFAULT_LINK_HOURS = 24
+
+
+def get(key: str) -> Optional[str]:
+    """
+    Find a stored report and mark it as shared again
+
+    Args:
+        key: Report content key
+
+    Returns:
+        Site-relative path of the PDF, or None when it is not stored
+    """
+    cache = frappe.cache()
+    path = _relative_path(key)
+
+    # Raw HGET: RedisWrapper.hget would prefix the key again
+    if cache.execute_command("HGET", cache.make_key(SIZES_KEY), key) is None:
+        return None
+
+    if not os.path.exists(frappe.get_site_path(path)):
+        _forget([key])
+        return None
+
+    cache.zadd(cache.make_key(LRU_KEY), {key: time.time()})
+    return path
+
+
+def put(key: str, pdf_path: str) -> str:
+    """
+    Store a report; the hourly cleanup enforces the quota
+
+    Args:
+        key: Report content key
+        pdf_path: Absolute path of the rendered PDF, e.g. the report cache's
+            file; it is copied, so the source stays where it is
+
+    Returns:
+        Site-relative path of the PDF
+    """
+    path = get(key)
+    if path:
+        return path
+
+    path = _relative_path(key)
+    _copy_file(pdf_path, frappe.get_site_path(path))
+
+    cache = frappe.cache()
+    pipe = cache.pipeline()
+    pipe.zadd(cache.make_key(LRU_KEY), {key: time.time()})
+    pipe.hset(cache.make_key(SIZES_KEY), key, os.path.getsize(pdf_path))
+    pipe.execute()
+
+    return path
+
+
+def get_public_url(path: str) -> str:
+    """
+    Absolute URL of a stored report
+
+    Args:
+        path: Site-relative path returned by put or get
+
+    Returns:
+        URL served by the web server without a login
+    """
+    # public/files/... is served as /files/...
+    return get_url("/" + path.lstrip("/").split("/", 1)[1])
+
+
+def cleanup():
+    """
+    Delete reports not shared within the link lifetime, then least recently
+    shared reports past the quota (hourly job)
+
+    Reports still attached to queued emails are kept and tried again next
+    hour.
+    """
+    try:
+        hours = int(frappe.conf.get("ai_agent_share_link_hours") or DEFAULT_LINK_HOURS)
+        cache = frappe.cache()
+        queued = _queued_report_keys()
+
+        expired = cache.zrangebyscore(cache.make_key(LRU_KEY), 0, time.time() - hours * 60 * 60)
+        expired = [key for key in map(_decode, expired) if key not in queued]
+
+        if expired:
+            _forget(expired)
+
+        _evict_over_quota(queued)
+
+    except Exception as e:
+        frappe.log_error(f"Error cleaning up shared reports: {str(e)}", "AI Agent Sharing")
+
+
+def get_stats() -> Dict[str, Any]:
+    """
+    Size metrics for this site
+
+    Returns:
+        dict with entries, bytes and max_bytes
+    """
+    sizes = _get_sizes()
+
+    return {
+        "entries": len(sizes),
+        "bytes": sum(sizes.values()),
+        "max_bytes": _max_bytes()
+    }
+
+
+def _evict_over_quota(queued: Set[str]):
+    cache = frappe.cache()
+    max_bytes = _max_bytes()
+    sizes = _get_sizes()
+    total = sum(sizes.values())
+
+    if total <= max_bytes:
+        return
+
+    evicted = []
+    # The most recently shared report stays, even when it alone exceeds the
+    # quota, and so do reports that queued emails have yet to attach
+    for member in cache.zrange(cache.make_key(LRU_KEY), 0, -2):
+        if total <= max_bytes:
+            break
+        member = _decode(member)
+        if member in queued:
+            continue
+        total -= sizes.get(member, 0)
+        evicted.append(member)
+
+    if evicted:
+        _forget(evicted)
+
+
+def _forget(keys):
+    """Drop keys from the LRU set and the size hash, and delete their files"""
+    cache = frappe.cache()
+    keys = [_decode(k) for k in keys]
+
+    pipe = cache.pipeline()
+    pipe.zrem(cache.make_key(LRU_KEY), *keys)
+    pipe.hdel(cache.make_key(SIZES_KEY), *keys)
+    pipe.execute()
+
+    for key in keys:
+        # File documents made for email attachments go with the report
+        for name in frappe.get_all("File", filters={"file_url": _public_url_path(key)}, pluck="name"):
+            frappe.delete_doc("File", name, ignore_permissions=True)
+
+        try:
+            os.remove(frappe.get_site_path(_relative_path(key)))
+        except FileNotFoundError:
+            pass
+
+
+def _queued_report_keys() -> Set[str]:
+    """Keys of reports whose File an unsent email attaches by fid"""
+    fids = set()
+
+    # Email Queue.attachments is JSON, e.g. [{"fid": "<File name>"}]
+    for attachments in frappe.get_all(
+        "Email Queue",
+        filters={"status": ["in", UNSENT_EMAIL_STATES], "attachments": ["like", '%"fid"%']},
+        pluck="attachments"
+    ):
+        try:
+            fids.update(a["fid"] for a in json.loads(attachments) if isinstance(a, dict) and a.get("fid"))
+        except (TypeError, ValueError):
+            continue
+
+    if not fids:
+        return set()
+
+    file_urls = frappe.get_all(
+        "File",
+        filters={"name": ["in", list(fids)], "file_url": ["like", f"/files/{REPORT_FOLDER}/%"]},
+        pluck="file_url"
+    )
+
+    return {os.path.splitext(os.path.basename(url))[0] for url in file_urls}
+
+
+def _relative_path(key: str) -> str:
+    return f"public/files/{REPORT_FOLDER}/{key}.pdf"
+
+
+def _public_url_path(key: str) -> str:
+    return f"/files/{REPORT_FOLDER}/{key}.pdf"
+
+
+def _copy_file(src: str, path: str):
+    """Copy through a temporary file, so a link never serves a partial PDF"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    shutil.copyfile(src, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _get_sizes() -> Dict[str, int]:
+    # Raw HGETALL: RedisWrapper.hgetall would re-prefix and unpickle
+    cache = frappe.cache()
+    raw = cache.execute_command("HGETALL", cache.make_key(SIZES_KEY))
+    return {_decode(k): int(v) for k, v in (raw or {}).items()}
+
+
+def _max_bytes() -> int:
+    return int(frappe.conf.get("ai_agent_report_store_max_mb") or DEFAULT_MAX_MB) * 1024 * 1024
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
@@ -0,0 +1,198 @@
+"""
+Response Cache for AI Agent Widget
+
+Memoizes agent results for repeat prompts. The key covers everything the
+agent output depends on: the user (server-side tool results are scoped by
+their permissions), the normalized message, the current route, the user's
+role set, the model and a fingerprint of the conversation history.
+
+Only the answer is cached: the tracker session of the original request is
+dropped (a hit gets a session of its own), and results in which a
+server-side tool read live data (field values, lookups) are not cached at
+all, since they could be replayed stale.
+
+Entries expire after a TTL. A per-site sorted set tracks last access so the
+least recently used entries are evicted once the cache is full. Hit, miss,
+store and eviction counters are kept for tuning.
+"""
+
+import frappe
+import hashlib
+import json
+import re
+import time
+from typing import Dict, List, Any, Optional
+
+
+KEY_PREFIX = "ai_agent_response_cache"
+LRU_KEY = f"{KEY_PREFIX}|lru"
+STATS_KEY = f"{KEY_PREFIX}|stats"
+
+# Per-request tracker session fields, never replayed from the cache
+SESSION_FIELDS = ("session_id", "session_data")
+
+# Defaults, overridable in site_config.json
+DEFAULT_TTL = 10 * 60  # seconds
+DEFAULT_MAX_ENTRIES = 1000
+
+
+def is_enabled() -> bool:
+    """Response caching is on unless ai_agent_response_cache is set to 0"""
+    return bool(frappe.conf.get("ai_agent_response_cache", 1))
+
+
+def make_key(
+    user: str,
+    message: str,
+    route: str,
+    roles: List[str],
+    model_name: str,
+    history: Optional[List[Dict[str, Any]]] = None
+) -> str:
+    """
+    Build the cache key for a request
+
+    Args:
+        user: User making the request
+        message: User message
+        route: Current route from the request context
+        roles: User roles
+        model_name: Model the request would run on
+        history: Conversation history sent to the agent
+
+    Returns:
+        Hex digest identifying the request
+    """
+    payload = json.dumps([
+        user,
+        _normalize_message(message),
+        route or "/",
+        sorted(set(roles or [])),
+        model_name,
+        _history_fingerprint(history)
+    ], sort_keys=True, default=str)
+
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _normalize_message(message: str) -> str:
+    """Collapse whitespace and drop trailing punctuation; case is kept (document names)"""
+    message = re.sub(r"\s+", " ", (message or "").strip())
+    return message.rstrip(" .!?")
+
+
+def _history_fingerprint(history: Optional[List[Dict[str, Any]]]) -> str:
+    """Hash of the role/content pairs of the history"""
+    digest = hashlib.sha256()
+    for msg in history or []:
+        digest.update(json.dumps(
+            [msg.get("role"), msg.get("content") or ""],
+            default=str
+        ).encode())
+        digest.update(b"\0")
+
+    return digest.hexdigest()
+
+
+def lookup(key: str) -> Optional[Dict[str, Any]]:
+    """
+    Look up a cached result
+
+    Args:
+        key: Key from make_key
+
+    Returns:
+        Cached result dict without session_id and session_data, or None on a miss
+    """
+    cache = frappe.cache()
+    raw = cache.get(cache.make_key(f"{KEY_PREFIX}|{key}"))
+
+    if raw is None:
+        _incr("misses")
+        return None
+
+    cache.zadd(cache.make_key(LRU_KEY), {key: time.time()})
+    _incr("hits")
+
+    result = json.loads(raw)
+    result["cached"] = True
+    return result
+
+
+def store(key: str, result: Dict[str, Any]):
+    """
+    Store a result and evict least recently used entries past the size bound
+
+    Results that used live server-side data are skipped.
+
+    Args:
+        key: Key from make_key
+        result: Successful agent result
+    """
+    if _reads_live_data(result):
+        return
+
+    entry = {k: v for k, v in result.items() if k not in SESSION_FIELDS}
+
+    cache = frappe.cache()
+    ttl = int(frappe.conf.get("ai_agent_response_cache_ttl") or DEFAULT_TTL)
+    max_entries = int(frappe.conf.get("ai_agent_response_cache_max_entries") or DEFAULT_MAX_ENTRIES)
+    lru_key = cache.make_key(LRU_KEY)
+
+    pipe = cache.pipeline()
+    pipe.set(cache.make_key(f"{KEY_PREFIX}|{key}"), json.dumps(entry, default=str), ex=ttl)
+    pipe.zadd(lru_key, {key: time.time()})
+    # Entries not touched within the TTL have expired already
+    pipe.zremrangebyscore(lru_key, 0, time.time() - ttl)
+    pipe.zcard(lru_key)
+    size = pipe.execute()[-1]
+
+    _incr("stores")
+
+    if size > max_entries:
+        evicted = [k.decode() if isinstance(k, bytes) else k
+                   for k, _ in cache.zpopmin(lru_key, size - max_entries)]
+        if evicted:
+            cache.delete(*[cache.make_key(f"{KEY_PREFIX}|{k}") for k in evicted])
+            _incr("evictions", len(evicted))
+
+
+def _reads_live_data(result: Dict[str, Any]) -> bool:
+    """Whether a server-side tool answered from the database during the run"""
+    return any("server_result" in step for step in result.get("agent_steps", []))
+
+
+def _incr(counter: str, amount: int = 1):
+    """Increment a statistics counter"""
+    cache = frappe.cache()
+    cache.hincrby(cache.make_key(STATS_KEY), counter, amount)
+
+
+def get_stats() -> Dict[str, Any]:
+    """
+    Get hit-rate metrics for this site
+
+    Returns:
+        dict with hits, misses, stores, evictions, hit_rate and current size
+    """
+    cache = frappe.cache()
+
+    # Raw pipeline: RedisWrapper.hgetall would re-prefix and unpickle
+    pipe = cache.pipeline()
+    pipe.hgetall(cache.make_key(STATS_KEY))
+    pipe.zcard(cache.make_key(LRU_KEY))
+    raw, entries = pipe.execute()
+
+    stats = {
+        (k.decode() if isinstance(k, bytes) else k): int(v)
+        for k, v in (raw or {}).items()
+    }
+
+    for counter in ("hits", "misses", "stores", "evictions"):
+        stats.setdefault(counter, 0)
+
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0
+    stats["entries"] = entries
+
+    return stats
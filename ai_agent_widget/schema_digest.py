@@ -0,0 +1,224 @@
+"""
+Schema Digest for AI Agent Widget
+
+Compact per-DocType summaries of the form fields the agent needs to plan a
+complete document in one go: mandatory fields, link targets, child tables,
+select options and defaults. Without them the agent discovers a form by
+calling analyze_screen and probing set_field, one LLM round trip at a time.
+
+Digests are built from frappe.get_meta, cached per site, and cleared when a
+DocType, Custom Field or Property Setter changes and after migrate. The
+digest for a request covers the open form's doctype and the doctypes named
+in the message, within a token budget (ai_agent_schema_digest_tokens).
+
+Notation, e.g. for Sales Order::
+
+    Sales Order: customer*→Customer, order_type*[Sales|Maintenance]=Sales,
+    items*:Table[Sales Order Item]{item_code*→Item, qty*=1}
+"""
+
+import frappe
+import re
+from typing import Dict, List, Optional
+
+
+CACHE_KEY = "ai_agent_schema_digest"
+DOCTYPES_KEY = f"{CACHE_KEY}|doctypes"
+
+DEFAULT_TOKEN_BUDGET = 400
+
+# Rough size of a token in characters, for budgeting
+CHARS_PER_TOKEN = 4
+
+MAX_DOCTYPES = 3
+
+# Below this much remaining budget another doctype is not worth starting
+MIN_DIGEST_CHARS = 80
+
+MAX_SELECT_OPTIONS = 8
+
+TABLE_FIELDTYPES = ("Table", "Table MultiSelect")
+
+# Field types the agent cannot set
+SKIP_FIELDTYPES = (
+    "Section Break", "Column Break", "Tab Break", "HTML", "Button", "Image",
+    "Fold", "Heading", "Read Only"
+)
+
+HEADER = "FORM SCHEMAS (* mandatory, →link target, [select options], =default):"
+
+
+def get_token_budget() -> int:
+    """Token budget for the digest (ai_agent_schema_digest_tokens)"""
+    return int(frappe.conf.get("ai_agent_schema_digest_tokens") or DEFAULT_TOKEN_BUDGET)
+
+
+def build_for_request(message: str, current_path: str) -> str:
+    """
+    Digest of the doctypes relevant to a request
+
+    Args:
+        message: User message
+        current_path: Current page route
+
+    Returns:
+        Prompt section, or an empty string when no doctype is relevant
+    """
+    budget = get_token_budget() * CHARS_PER_TOKEN - len(HEADER)
+    lines = []
+
+    for doctype in _relevant_doctypes(message, current_path):
+        if budget < MIN_DIGEST_CHARS:
+            break
+        if not frappe.has_permission(doctype, "read"):
+            continue
+
+        digest = get_digest(doctype, budget)
+        lines.append(digest)
+        budget -= len(digest) + 1
+
+    if not lines:
+        return ""
+
+    return "\n".join([HEADER] + lines)
+
+
+def get_digest(doctype: str, max_chars: Optional[int] = None) -> str:
+    """
+    Cached digest line for one doctype
+
+    Args:
+        doctype: DocType name
+        max_chars: Truncate the digest to this length
+
+    Returns:
+        Digest line
+    """
+    cache = frappe.cache()
+    digest = cache.hget(CACHE_KEY, doctype)
+    if digest is None:
+        digest = _build_digest(doctype)
+        cache.hset(CACHE_KEY, doctype, digest)
+
+    if max_chars is not None and len(digest) > max_chars:
+        # Fields are ordered by importance, so cut at the last whole entry
+        cut = digest.rfind(", ", 0, max(0, max_chars - 1))
+        digest = (digest[:cut] if cut > 0 else digest[:max(0, max_chars - 1)]) + "…"
+
+    return digest
+
+
+def clear_cache(doc=None, method=None):
+    """
+    Drop all digests (doc_events and after_migrate hook)
+
+    A field change can affect any parent that embeds the doctype as a child
+    table, so every digest is cleared.
+
+    Args:
+        doc: Changed DocType, Custom Field or Property Setter
+        method: Event name
+    """
+    cache = frappe.cache()
+    cache.delete_value(CACHE_KEY)
+    cache.delete_value(DOCTYPES_KEY)
+
+
+def _build_digest(doctype: str) -> str:
+    meta = frappe.get_meta(doctype)
+    fields = [df for df in meta.fields if _is_plannable(df)]
+
+    # Mandatory fields first, each group in form order
+    fields.sort(key=lambda df: 0 if df.reqd else 1)
+
+    entries = []
+    for df in fields:
+        entry = _field_entry(df)
+        if df.fieldtype in TABLE_FIELDTYPES and df.options:
+            child = frappe.get_meta(df.options)
+            child_entries = [
+                _field_entry(cdf) for cdf in child.fields
+                if _is_plannable(cdf) and cdf.fieldtype not in TABLE_FIELDTYPES
+                and (cdf.reqd or cdf.fieldtype == "Link")
+            ]
+            entry += "{" + ", ".join(child_entries) + "}"
+        entries.append(entry)
+
+    return f"{doctype}: " + ", ".join(entries)
+
+
+def _is_plannable(df) -> bool:
+    """Fields worth describing: settable, and mandatory, linked, selectable, tabular or defaulted"""
+    if df.fieldtype in SKIP_FIELDTYPES or df.hidden or df.read_only or df.fetch_from:
+        return False
+
+    return bool(
+        df.reqd or df.default
+        or df.fieldtype in ("Link", "Select") or df.fieldtype in TABLE_FIELDTYPES
+    )
+
+
+def _field_entry(df) -> str:
+    entry = df.fieldname + ("*" if df.reqd else "")
+
+    if df.fieldtype == "Link" and df.options:
+        entry += f"→{df.options}"
+    elif df.fieldtype == "Select" and df.options:
+        options = [o for o in df.options.split("\n") if o]
+        entry += "[" + "|".join(options[:MAX_SELECT_OPTIONS])
+        entry += "|…]" if len(options) > MAX_SELECT_OPTIONS else "]"
+    elif df.fieldtype in TABLE_FIELDTYPES:
+        entry += f":Table[{df.options}]"
+
+    if df.default:
+        entry += f"={df.default}"
+
+    return entry
+
+
+def _relevant_doctypes(message: str, current_path: str) -> List[str]:
+    """The open form's doctype first, then doctypes named in the message"""
+    doctypes = _get_doctype_names()
+    found = []
+
+    route_doctype = _route_doctype(current_path, doctypes)
+    if route_doctype:
+        found.append(route_doctype)
+
+    # Longest names first, so "Sales Order Item" is not also read as "Item"
+    text = (message or "").lower()
+    for lower in sorted(doctypes, key=len, reverse=True):
+        if len(found) >= MAX_DOCTYPES:
+            break
+        if lower in text and re.search(rf"\b{re.escape(lower)}\b", text):
+            if doctypes[lower] not in found:
+                found.append(doctypes[lower])
+            text = re.sub(rf"\b{re.escape(lower)}\b", " ", text)
+
+    return found
+
+
+def _route_doctype(current_path: str, doctypes: Dict[str, str]) -> Optional[str]:
+    parts = [p for p in (current_path or "").strip("/").split("/") if p]
+    if len(parts) >= 2 and parts[0] == "Form":
+        return doctypes.get(parts[1].lower())
+    if len(parts) >= 2 and parts[0] == "app":
+        return doctypes.get(parts[1].replace("-", " ").lower())
+    return None
+
+
+def _get_doctype_names() -> Dict[str, str]:
+    """lower-case name -> name for every form doctype (no child tables or singles)"""
+    cache = frappe.cache()
+    names = cache.get_value(DOCTYPES_KEY)
+    if names is None:
+        names = {
+            name.lower(): name
+            for name in frappe.get_all(
+                "DocType",
+                filters={"istable": 0, "issingle": 0},
+                pluck="name"
+            )
+        }
+        cache.set_value(DOCTYPES_KEY, names)
+    return names
@@ -0,0 +1,191 @@
+"""
+Session Archive for AI Agent Widget
+
+Durable record of agent sessions, the source for bulk compliance exports.
+The widget keeps sessions in the browser and the conversation store only
+keeps a short window in Redis, so every completed agent request is also
+appended as one JSON line to a file per day, user and conversation in the
+site's private folder::
+
+    private/ai_agent_sessions/2026-01-15/<user hash>-<conversation id>-<id hash>.ndjson
+
+Lines hold the exchange in the widget's message format (the user message
+with its timestamp, the reply with its tool calls), so archived sessions
+render through export_service like exported ones. Tool results are the
+ones the server saw; for actions executed in the browser that is the
+instruction the agent issued.
+
+Archiving is off until enabled, and archived days are deleted by a daily
+job once they are older than the retention period.
+
+Settings in site_config.json:
+
+- ``ai_agent_session_archive``: set to 1 to archive sessions (0)
+- ``ai_agent_session_archive_days``: days an archived session is kept (90)
+"""
+
+import frappe
+import hashlib
+import json
+import os
+import re
+import shutil
+from datetime import datetime, timedelta
+from frappe.utils import now_datetime
+from typing import Dict, List, Any, Iterator, Optional
+
+
+ARCHIVE_FOLDER = "ai_agent_sessions"
+
+# Defaults, overridable in site_config.json
+DEFAULT_RETENTION_DAYS = 90
+
+DAY_FORMAT = "%Y-%m-%d"
+
+
+def is_enabled() -> bool:
+    """Archiving is off unless ai_agent_session_archive is set to 1"""
+    return bool(frappe.conf.get("ai_agent_session_archive", 0))
+
+
+def record_exchange(user: str, conversation_id: Optional[str], message: str, result: Dict[str, Any]):
+    """
+    Append one completed agent request to the archive
+
+    Args:
+        user: User who made the request
+        conversation_id: Client conversation id, if any
+        message: User message
+        result: Successful agent result
+    """
+    try:
+        now = now_datetime()
+        results = {
+            step.get("tool_call_id"): step.get("result")
+            for step in result.get("agent_steps", [])
+            if step.get("type") == "tool_result"
+        }
+
+        line = json.dumps({
+            "user": user,
+            "conversation_id": conversation_id,
+            "messages": [
+                {"role": "user", "content": message, "timestamp": now.isoformat()},
+                {
+                    "role": "assistant",
+                    "content": result.get("content", ""),
+                    "toolCalls": [
+                        {"name": tc.get("name"), "args": tc.get("args", {}), "result": results.get(tc.get("id"), "")}
+                        for tc in result.get("tool_calls", [])
+                    ]
+                }
+            ]
+        }, ensure_ascii=False, default=str)
+
+        folder = _day_folder(now.strftime(DAY_FORMAT))
+        os.makedirs(folder, exist_ok=True)
+
+        # One write per line, so concurrent appends do not interleave
+        with open(os.path.join(folder, _file_name(user, conversation_id)), "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    except Exception as e:
+        frappe.log_error(f"AI Agent session archive error: {str(e)}", "AI Agent Widget")
+
+
+def find_sessions(from_date: str, to_date: str, users: Optional[List[str]] = None) -> Iterator[Dict[str, str]]:
+    """
+    Archived sessions in a date range
+
+    Args:
+        from_date: First day, YYYY-MM-DD
+        to_date: Last day, YYYY-MM-DD
+        users: Only sessions of these users
+
+    Yields:
+        dict with date and path, oldest day first
+    """
+    root = frappe.get_site_path("private", ARCHIVE_FOLDER)
+    if not os.path.isdir(root):
+        return
+
+    prefixes = tuple(_user_hash(u) + "-" for u in users) if users else None
+
+    for day in sorted(os.listdir(root)):
+        if not (from_date <= day <= to_date):
+            continue
+
+        for name in sorted(os.listdir(os.path.join(root, day))):
+            if prefixes and not name.startswith(prefixes):
+                continue
+            yield {"date": day, "path": os.path.join(root, day, name)}
+
+
+def load_session(path: str) -> Dict[str, Any]:
+    """
+    Read an archived session
+
+    Args:
+        path: Session file from find_sessions
+
+    Returns:
+        Conversation data with session_id, user and messages array
+    """
+    session = {"session_id": None, "user": None, "messages": []}
+
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            session["session_id"] = session["session_id"] or record.get("conversation_id")
+            session["user"] = session["user"] or record.get("user")
+            session["messages"].extend(record.get("messages", []))
+
+    session["session_id"] = session["session_id"] or os.path.basename(path).rsplit(".", 1)[0]
+    return session
+
+
+def cleanup():
+    """Delete archived days older than the retention period (daily job)"""
+    try:
+        root = frappe.get_site_path("private", ARCHIVE_FOLDER)
+        if not os.path.isdir(root):
+            return
+
+        days = int(frappe.conf.get("ai_agent_session_archive_days") or DEFAULT_RETENTION_DAYS)
+        cutoff = (now_datetime() - timedelta(days=days)).strftime(DAY_FORMAT)
+
+        for day in os.listdir(root):
+            # Only day folders; anything else in the archive is left alone
+            try:
+                datetime.strptime(day, DAY_FORMAT)
+            except ValueError:
+                continue
+
+            if day < cutoff:
+                shutil.rmtree(os.path.join(root, day), ignore_errors=True)
+
+    except Exception as e:
+        frappe.log_error(f"Error cleaning up session archive: {str(e)}", "AI Agent Widget")
+
+
+def _day_folder(day: str) -> str:
+    return frappe.get_site_path("private", ARCHIVE_FOLDER, day)
+
+
+def _file_name(user: str, conversation_id: Optional[str]) -> str:
+    """
+    Archive file for a conversation, safe in paths and ZIP entries
+
+    The readable part keeps only safe characters, so the hash of the raw id
+    keeps ids that differ only in the stripped characters apart.
+    """
+    conversation = re.sub(r"[^A-Za-z0-9_-]", "", conversation_id or "") or "default"
+    id_hash = hashlib.sha1((conversation_id or "").encode()).hexdigest()[:8]
+    return f"{_user_hash(user)}-{conversation[:64]}-{id_hash}.ndjson"
+
+
+def _user_hash(user: str) -> str:
+    """Short stable id for a user, safe in file names"""
+    return hashlib.sha1((user or "").encode()).hexdigest()[:12]
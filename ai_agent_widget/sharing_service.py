@@ -47,7 +47,7 @@ def share_via_email(session_id: str, to_email: str, session_summary: Dict[str, A
         session_id: Session ID
         to_email: Recipient email address
         session_summary: Session summary data
-        pdf_path: Path to PDF file
+        pdf_path: Site-relative path to PDF file
         
     Returns:
         True if email queued successfully
@@ -129,18 +129,16 @@ def share_via_email(session_id: str, to_email: str, session_summary: Dict[str, A
         </html>
         """
         
-        # Get PDF file
-        full_pdf_path = frappe.get_site_path(pdf_path.lstrip('/'))
+        # Attach by File reference: the queue stores the file name and
+        # reads the PDF from disk only when the email is sent
+        pdf_file = get_attachment_file(pdf_path, f'AI_Session_Report_{session_id[:8]}.pdf')
         
         # Send email with attachment
         frappe.sendmail(
             recipients=[to_email],
             subject=subject,
             message=message,
-            attachments=[{
-                'fname': f'AI_Session_Report_{session_id[:8]}.pdf',
-                'fcontent': open(full_pdf_path, 'rb').read()
-            }],
+            attachments=[{'fid': pdf_file}],
             now=False  # Queue for sending
         )
         
@@ -151,6 +149,40 @@ def share_via_email(session_id: str, to_email: str, session_summary: Dict[str, A
         return False
 
 
+def get_attachment_file(pdf_path: str, file_name: str) -> str:
+    """
+    File document for a PDF on disk, created on first use
+    
+    Every email of the same report references this one File, so queued
+    emails do not each carry a copy of the PDF.
+    
+    Args:
+        pdf_path: Site-relative path, e.g. public/files/ai_agent_reports/<key>.pdf
+        file_name: Attachment name for a new File document
+        
+    Returns:
+        File document name
+    """
+    pdf_path = pdf_path.lstrip('/')
+    is_private = not pdf_path.startswith('public/')
+    # public/files/... is served as /files/..., private/files/... as /private/files/...
+    file_url = '/' + (pdf_path if is_private else pdf_path.split('/', 1)[1])
+    
+    name = frappe.db.get_value('File', {'file_url': file_url, 'is_folder': 0}, 'name')
+    if name:
+        return name
+    
+    file_doc = frappe.get_doc({
+        'doctype': 'File',
+        'file_name': file_name,
+        'file_url': file_url,
+        'is_private': 1 if is_private else 0
+    })
+    file_doc.insert(ignore_permissions=True)
+    
+    return file_doc.name
+
+
 def cleanup_expired_links():
     """
     Clean up public File documents older than 24 hours
@@ -167,7 +199,9 @@ def cleanup_expired_links():
             filters={
                 'file_name': ['like', 'AI_Session_Report_%'],
                 'creation': ['<', expiry_time],
-                'is_private': 0
+                'is_private': 0,
+                # Shared reports expire with the report store
+                'file_url': ['not like', '/files/ai_agent_reports/%']
             },
             pluck='name'
         )
@@ -0,0 +1,244 @@
+"""
+Telemetry for AI Agent Widget
+
+Lightweight timing spans for agent requests: each phase of a request (user
+context, context building, cache lookup, rate-limit wait, pool lease,
+intent analysis, every LLM turn and tool step, response serialization) is
+recorded on a per-request trace.
+
+Finished traces go into a bounded ring buffer in Redis, one per site (a
+site's paths and timings are not visible to other sites on the bench), so
+latency percentiles can be compared per phase and per model. A sample of
+traces can also be written in full to the ``ai_agent_widget.telemetry``
+log (this app has no DocTypes of its own).
+
+Settings in site_config.json:
+
+- ``ai_agent_telemetry``: 0 disables tracing (default on)
+- ``ai_agent_telemetry_buffer``: traces kept in the ring buffer (2000)
+- ``ai_agent_telemetry_sample_rate``: share of traces logged, 0..1 (0)
+"""
+
+import frappe
+import json
+import random
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional
+
+
+RING_KEY = "ai_agent_telemetry|traces"
+
+DEFAULT_BUFFER_SIZE = 2000
+
+PERCENTILES = (50, 95, 99)
+
+
+class Trace:
+    """Spans of one agent request"""
+
+    def __init__(self, **attrs):
+        self.ts = time.time()
+        self.started = time.perf_counter()
+        self.attrs = attrs
+        self.spans = []
+        self.returned = None
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """
+        Time a block as a span
+
+        Args:
+            name: Phase name
+            **attrs: Extra span attributes (e.g. tool names)
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, start, **attrs)
+
+    def add(self, name: str, start: float, end: Optional[float] = None, **attrs):
+        """
+        Record a span measured by the caller
+
+        Args:
+            name: Phase name
+            start: time.perf_counter() at the start
+            end: time.perf_counter() at the end (defaults to now)
+            **attrs: Extra span attributes
+        """
+        end = time.perf_counter() if end is None else end
+        span = {
+            "name": name,
+            "start_ms": round((start - self.started) * 1000, 2),
+            "ms": round((end - start) * 1000, 2)
+        }
+        span.update(attrs)
+        self.spans.append(span)
+
+    def set(self, **attrs):
+        """Attach attributes to the whole trace (model, cached, ...)"""
+        self.attrs.update(attrs)
+
+    def mark_returned(self):
+        """Mark the endpoint returning; serialization is timed from here"""
+        self.returned = time.perf_counter()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "ts": self.ts,
+            "site": frappe.local.site,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "attrs": self.attrs,
+            "spans": self.spans
+        }
+
+    def save(self):
+        """Push the finished trace into the ring buffer (and maybe the log)"""
+        data = self.to_dict()
+        payload = json.dumps(data, default=str)
+
+        cache = frappe.cache()
+        key = cache.make_key(RING_KEY)
+        pipe = cache.pipeline()
+        pipe.lpush(key, payload)
+        pipe.ltrim(key, 0, _buffer_size() - 1)
+        pipe.execute()
+
+        sample_rate = float(frappe.conf.get("ai_agent_telemetry_sample_rate") or 0)
+        if sample_rate and random.random() < sample_rate:
+            frappe.logger("ai_agent_widget.telemetry").info(payload)
+
+
+class _NullTrace:
+    """Stand-in when tracing is off, so callers never need to check"""
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        yield
+
+    def add(self, name: str, start: float, end: Optional[float] = None, **attrs):
+        pass
+
+    def set(self, **attrs):
+        pass
+
+    def mark_returned(self):
+        pass
+
+    def save(self):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+def is_enabled() -> bool:
+    """Whether tracing is on (ai_agent_telemetry, default 1)"""
+    return bool(frappe.conf.get("ai_agent_telemetry", 1))
+
+
+def start_trace(**attrs):
+    """
+    Start the trace for the current request or job
+
+    Args:
+        **attrs: Trace attributes (e.g. kind)
+
+    Returns:
+        Trace, or a no-op trace when tracing is off
+    """
+    trace = Trace(**attrs) if is_enabled() else NULL_TRACE
+    frappe.local.ai_agent_trace = trace
+    return trace
+
+
+def current():
+    """Trace of the current request, or a no-op trace"""
+    return getattr(frappe.local, "ai_agent_trace", None) or NULL_TRACE
+
+
+def finish_request(response=None, request=None):
+    """
+    after_request hook: close the serialization span and save the trace
+
+    agent_stream marks the trace when it returns; the time from there until
+    the response is built is the response serialization.
+    """
+    trace = getattr(frappe.local, "ai_agent_trace", None)
+    if not trace:
+        return
+
+    frappe.local.ai_agent_trace = None
+    if trace is NULL_TRACE:
+        return
+
+    try:
+        if trace.returned is not None:
+            trace.add("serialization", trace.returned)
+        trace.save()
+    except Exception as e:
+        frappe.log_error(f"AI Agent telemetry error: {str(e)}", "AI Agent Widget")
+
+
+def get_latency_stats(minutes: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Latency percentiles from the ring buffer
+
+    Args:
+        minutes: Only consider traces from the last N minutes
+
+    Returns:
+        dict with count and p50/p95/p99 (ms) per phase and per model, for this site
+    """
+    cache = frappe.cache()
+    # Raw LRANGE: RedisWrapper.lrange would prefix the key with the site again
+    raw = cache.execute_command("LRANGE", cache.make_key(RING_KEY), 0, -1)
+
+    since = time.time() - int(minutes) * 60 if minutes else 0
+    phases = defaultdict(list)
+    models = defaultdict(list)
+    count = 0
+
+    for item in raw or []:
+        trace = json.loads(item)
+        if trace["ts"] < since:
+            continue
+
+        count += 1
+        phases["total"].append(trace["total_ms"])
+        models[trace["attrs"].get("model") or "unknown"].append(trace["total_ms"])
+        for span in trace["spans"]:
+            phases[span["name"]].append(span["ms"])
+
+    return {
+        "traces": count,
+        "buffer_size": _buffer_size(),
+        "phases": _summarize(phases),
+        "models": _summarize(models)
+    }
+
+
+def _summarize(groups: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    summary = {}
+    for name, values in groups.items():
+        values.sort()
+        summary[name] = {"count": len(values)}
+        for p in PERCENTILES:
+            summary[name][f"p{p}"] = _percentile(values, p)
+    return summary
+
+
+def _percentile(sorted_values: List[float], p: int) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0
+    rank = max(1, -(-p * len(sorted_values) // 100))
+    return sorted_values[rank - 1]
+
+
+def _buffer_size() -> int:
+    return int(frappe.conf.get("ai_agent_telemetry_buffer") or DEFAULT_BUFFER_SIZE)
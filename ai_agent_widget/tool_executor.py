@@ -0,0 +1,243 @@
+"""
+Tool Executor for AI Agent Widget
+
+Runs the read-only agent tools inside the agent loop on the server.
+
+The SDK tools only describe an action (a JSON payload the widget executes
+after the loop has finished), so the model never sees real lookup results
+and needs another full request to use them. The tools here have the same
+names and arguments but answer directly: lookups resolve through
+entity_lookup with permission checks, and get_field_value reads the saved
+document the run is on. UI-mutating tools still go to the widget.
+
+When a field value can only be known in the browser (a new form, or one
+with unsaved edits as reported by the widget), the tool falls back to the
+SDK descriptor and the widget executes it as before.
+"""
+
+import frappe
+import json
+import threading
+from urllib.parse import unquote
+from typing import Dict, List, Any, Optional
+
+from . import entity_lookup
+
+try:
+    from langchain_core.tools import tool
+    HAS_LANGCHAIN = True
+except ImportError:
+    HAS_LANGCHAIN = False
+
+
+SERVER_TOOLS = ("search_doctype", "get_doctype_list", "validate_doctype_exists", "get_field_value")
+
+# Tools that set a field on the open form from args["value"]
+FIELD_TOOLS = ("set_field", "select_option")
+
+
+class ToolRunState:
+    """
+    What the server knows about the browser during one agent run
+
+    Tracks the open form (from the request route, then navigate/create_doc
+    calls), whether it may have unsaved edits, and the field values the
+    agent has set in this run.
+
+    The lock serializes server-side tools: the agent may run parallel tool
+    calls in threads, and they all share the request's database connection.
+    """
+
+    def __init__(self, current_path: str, is_dirty: bool = False):
+        self.doctype, self.docname = _parse_form_route(current_path)
+        self.is_dirty = bool(is_dirty)
+        self.fields = {}
+        self.lock = threading.Lock()
+
+    def observe(self, tool_name: str, args: Dict[str, Any]):
+        """
+        Record a tool call the model has made, before it is executed
+
+        Args:
+            tool_name: Tool name
+            args: Tool arguments
+        """
+        if tool_name == "navigate":
+            self.doctype = args.get("doctype")
+            self.docname = args.get("name")
+            self.is_dirty = False
+            self.fields = {}
+        elif tool_name == "create_doc":
+            self.doctype = args.get("doctype")
+            self.docname = None
+            self.is_dirty = False
+            self.fields = {}
+        elif tool_name in FIELD_TOOLS:
+            self.fields[args.get("fieldname")] = args.get("value")
+            # Form scripts may update other fields in the browser
+            self.is_dirty = True
+
+
+def _parse_form_route(current_path: str):
+    """(doctype, name) of a saved document form route, else (doctype or None, None)"""
+    parts = [unquote(p) for p in (current_path or "").strip("/").split("/") if p]
+    # Form routes have exactly three parts; /app/<slug>/view/... is a list view
+    if len(parts) != 3 or parts[2] == "view":
+        return None, None
+
+    if parts[0] == "app":
+        # /app/<slug>/<name> routes carry a slug, not the doctype
+        doctype = _doctype_from_slug(parts[1])
+    elif parts[0] == "Form":
+        doctype = parts[1]
+    else:
+        return None, None
+
+    if not doctype:
+        return None, None
+
+    name = parts[2]
+    if name.startswith("new-") or not frappe.db.exists(doctype, name):
+        return doctype, None
+
+    return doctype, name
+
+
+def _doctype_from_slug(slug: str) -> Optional[str]:
+    """DocType for a desk route slug ("sales-order" -> "Sales Order")"""
+    # Exact match; DocType names compare case-insensitively in MariaDB
+    return frappe.db.get_value("DocType", slug.replace("-", " "), "name")
+
+
+def is_server_result(tool_name: str, content: Any) -> bool:
+    """
+    Whether a tool message holds a real server-side result
+
+    Args:
+        tool_name: Tool name
+        content: ToolMessage content
+
+    Returns:
+        False for SDK action descriptors the widget still has to execute
+    """
+    if tool_name not in SERVER_TOOLS or not isinstance(content, str):
+        return False
+
+    try:
+        return "action" not in json.loads(content)
+    except (ValueError, TypeError):
+        return True
+
+
+def get_field_value_result(state: ToolRunState, fieldname: str) -> Optional[str]:
+    """
+    Answer get_field_value on the server when possible
+
+    Args:
+        state: Run state
+        fieldname: Field to read
+
+    Returns:
+        Result string, or None when only the browser can know the value
+    """
+    if fieldname in state.fields:
+        value = state.fields[fieldname]
+    elif state.doctype and state.docname and not state.is_dirty:
+        if not frappe.has_permission(state.doctype, "read", state.docname):
+            return f"❌ No permission to read {state.doctype} {state.docname}"
+        try:
+            value = frappe.db.get_value(state.doctype, state.docname, fieldname)
+        except Exception as e:
+            return f"❌ Failed to read {fieldname}: {str(e)}"
+    else:
+        return None
+
+    return f'📋 {fieldname} = "{value or "(empty)"}"'
+
+
+def build_tools(base_tools: List, state: ToolRunState) -> List:
+    """
+    Replace the SDK's read-only tools with server-side versions
+
+    Args:
+        base_tools: SDK tool list
+        state: Run state the server-side tools read
+
+    Returns:
+        Tool list for this run
+    """
+    if not HAS_LANGCHAIN:
+        return base_tools
+
+    @tool
+    def search_doctype(doctype: str, search_text: str, limit: int = 20) -> str:
+        """Search for records in a DocType that match the search text.
+        Use this to find existing customers, items, or other records before using them.
+
+        Args:
+            doctype: The DocType to search (e.g., 'Customer', 'Item', 'Supplier')
+            search_text: Text to search for (searches in name and common fields)
+            limit: Maximum number of results to return (default 20)
+
+        Returns:
+            List of matching records with their names
+        """
+        with state.lock:
+            return entity_lookup.resolve_lookups([{
+                "tool": "search_doctype", "doctype": doctype,
+                "search_text": search_text, "limit": limit
+            }])[0]
+
+    @tool
+    def get_doctype_list(doctype: str, limit: int = 50) -> str:
+        """Get a list of available records from a DocType.
+        Use this to see what customers, items, or other records are available in the system.
+
+        Args:
+            doctype: The DocType to list (e.g., 'Customer', 'Item', 'Supplier')
+            limit: Maximum number of records to return (default 50)
+
+        Returns:
+            List of available records with their names
+        """
+        with state.lock:
+            return entity_lookup.resolve_lookups([{
+                "tool": "get_doctype_list", "doctype": doctype, "limit": limit
+            }])[0]
+
+    @tool
+    def validate_doctype_exists(doctype: str, name: str) -> str:
+        """Check if a specific record exists in a DocType.
+        Use this before setting a link field to verify the record exists.
+
+        Args:
+            doctype: The DocType to check (e.g., 'Customer', 'Item')
+            name: The name/ID of the record to check
+
+        Returns:
+            Confirmation whether the record exists or not
+        """
+        with state.lock:
+            return entity_lookup.resolve_lookups([{
+                "tool": "validate_doctype_exists", "doctype": doctype, "name": name
+            }])[0]
+
+    @tool
+    def get_field_value(fieldname: str) -> str:
+        """Get the current value of a form field.
+
+        Args:
+            fieldname: The field name to read
+        """
+        with state.lock:
+            result = get_field_value_result(state, fieldname)
+        if result is None:
+            # Unsaved form: only the widget can read it
+            return json.dumps({"action": "get_field_value", "fieldname": fieldname})
+        return result
+
+    server_tools = {
+        t.name: t for t in (search_doctype, get_doctype_list, validate_doctype_exists, get_field_value)
+    }
+
+    return [server_tools.get(t.name, t) for t in base_tools]
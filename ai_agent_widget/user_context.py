@@ -0,0 +1,72 @@
+"""
+User Context Cache for AI Agent Widget
+
+Stores the compact per-user data the agent context needs (full name and
+roles) in the site cache, so warm requests build the agent context without
+touching the database. Entries are cleared when the User is saved or
+deleted (role rows are saved with it), when a Role Profile changes, and at
+login.
+"""
+
+import frappe
+from typing import Dict, Any
+
+
+CACHE_KEY = "ai_agent_user_context"
+
+
+def get_user_context(user: str) -> Dict[str, Any]:
+    """
+    Get the compact context for a user, loading it on a cache miss
+
+    Args:
+        user: User ID
+
+    Returns:
+        dict with full_name and roles
+    """
+    cache = frappe.cache()
+    user_context = cache.hget(CACHE_KEY, user)
+
+    if user_context is None:
+        user_context = _load_user_context(user)
+        cache.hset(CACHE_KEY, user, user_context)
+
+    return user_context
+
+
+def _load_user_context(user: str) -> Dict[str, Any]:
+    """Read only the fields the agent needs instead of the full User doc"""
+    return {
+        "full_name": frappe.db.get_value("User", user, "full_name") or user,
+        "roles": frappe.get_roles(user)
+    }
+
+
+def clear_user_context(doc, method=None):
+    """
+    doc_events handler for User
+
+    Args:
+        doc: User document
+        method: Event name (unused)
+    """
+    frappe.cache().hdel(CACHE_KEY, doc.name)
+
+
+def clear_role_profile_users(doc, method=None):
+    """
+    doc_events handler for Role Profile
+
+    Args:
+        doc: Role Profile document
+        method: Event name (unused)
+    """
+    cache = frappe.cache()
+    for user in frappe.get_all("User", filters={"role_profile_name": doc.name}, pluck="name"):
+        cache.hdel(CACHE_KEY, user)
+
+
+def clear_on_login(login_manager):
+    """on_session_creation hook: a new session starts from fresh roles"""
+    frappe.cache().hdel(CACHE_KEY, login_manager.user)
@@ -0,0 +1,5 @@
+"""
+Offline micro-benchmarks for AI Agent Widget
+
+Run with ``python -m benchmarks``; see benchmarks/README.md.
+"""
@@ -0,0 +1,71 @@
+"""
+Command line entry point: python -m benchmarks [options]
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import sys
+
+# The stand-ins must be in place before ai_agent_widget is imported
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import stubs  # noqa: E402
+
+stubs.install()
+
+from benchmarks import harness  # noqa: E402
+from benchmarks import bench_agent, bench_export, bench_sharing  # noqa: E402,F401
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__)
+    parser.add_argument("-k", "--filter", action="append",
+                        help="Glob of benchmark names to run (repeatable)")
+    parser.add_argument("-o", "--output", help="Write JSON results to this file")
+    parser.add_argument("--compare", help="Baseline JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Slowdown ratio counted as a regression (default 0.10)")
+    parser.add_argument("--min-time", type=float, default=1.0,
+                        help="Target seconds per benchmark (default 1.0)")
+    parser.add_argument("--repeat", type=int, default=7, help="Timing rounds (default 7)")
+    parser.add_argument("--quick", action="store_true",
+                        help="Short run for smoke testing (min-time 0.1, repeat 3)")
+    parser.add_argument("--list", action="store_true", help="List benchmark names and exit")
+    args = parser.parse_args(argv)
+
+    names = [
+        name for name in harness.BENCHMARKS
+        if not args.filter or any(fnmatch.fnmatch(name, f"*{pattern}*") for pattern in args.filter)
+    ]
+
+    if args.list:
+        print("\n".join(names))
+        return 0
+
+    if args.quick:
+        args.min_time, args.repeat = 0.1, 3
+
+    log = lambda line: print(line, file=sys.stderr)
+    document = harness.run(names, args.min_time, args.repeat, log=log)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(document, f, indent=2, sort_keys=True)
+    else:
+        print(json.dumps(document, indent=2, sort_keys=True))
+
+    if not args.compare:
+        return 0
+
+    rows = harness.compare(harness.load(args.compare), document, args.threshold)
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else ""
+        log(f"{row['name']:<40} {row['ratio']:6.2f}x {flag}")
+
+    return 1 if any(row["regression"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+"""
+agent_stream overhead per request, with a fake AgentManager
+
+The fake agent replays one tool call and a final answer without any LLM,
+so these numbers are the widget's own per-request cost: config, context,
+pooling, rate limiting, the step loop and result assembly.
+"""
+
+import json
+
+import frappe
+
+from ai_agent_widget import api, agent_runner, rate_limiter
+
+from .harness import benchmark
+from .stubs import install_rate_limiter_script
+
+
+def _setup(history_size=0, response_cache=False):
+    install_rate_limiter_script(frappe, rate_limiter.ACQUIRE_SCRIPT)
+    # Never build a real LLM client, even when langchain is installed
+    agent_runner.HAS_LANGCHAIN = False
+    frappe.conf["ai_agent_response_cache"] = int(response_cache)
+
+    history = [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"Message {i}: create a sales order for ACME"}
+        for i in range(history_size)
+    ]
+    frappe.request.data = json.dumps({
+        "message": "Set the customer to ACME",
+        "history": history,
+        "context": {"currentPath": "/app/sales-order/new", "user": frappe.session.user}
+    }).encode()
+
+    def op():
+        result = api.agent_stream()
+        if not result.get("success"):
+            raise RuntimeError(result.get("error"))
+        return result
+
+    return op
+
+
+@benchmark("agent_stream.request")
+def agent_stream_request():
+    return _setup()
+
+
+@benchmark("agent_stream.request[history=60]")
+def agent_stream_request_history():
+    return _setup(history_size=60)
+
+
+@benchmark("agent_stream.request[cached]")
+def agent_stream_request_cached():
+    return _setup(response_cache=True)
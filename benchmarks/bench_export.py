@@ -0,0 +1,103 @@
+"""
+Report HTML, PDF and escaping benchmarks
+"""
+
+import os
+import random
+import tempfile
+
+from ai_agent_widget import export_service
+from ai_agent_widget import pdf_cache
+
+from .harness import benchmark
+
+
+SESSION_SIZES = (10, 1000, 10000)
+
+TOOLS = ("navigate", "create_doc", "set_field", "select_option", "search_doctype", "save_doc")
+
+
+def make_session(message_count: int, seed: int = 42):
+    """
+    Deterministic conversation with user requests and tool-calling replies
+
+    Args:
+        message_count: Number of messages
+        seed: Random seed
+
+    Returns:
+        dict with a messages array, like the widget exports
+    """
+    rng = random.Random(seed)
+    messages = []
+
+    for i in range(message_count):
+        if i % 2 == 0:
+            messages.append({
+                "role": "user",
+                "content": f"Create a Sales Order for <Customer {i}> & add item \"ITEM-{i:05d}\"",
+                "timestamp": f"2026-01-15T10:{(i // 60) % 60:02d}:{i % 60:02d}"
+            })
+            continue
+
+        tool_calls = []
+        for _ in range(rng.randint(1, 4)):
+            tool = rng.choice(TOOLS)
+            tool_calls.append({
+                "name": tool,
+                "args": {"doctype": "Sales Order", "fieldname": "customer", "value": f"Customer {i}"},
+                "result": rng.choice(("✅ Done", "❌ Field not found", "📋 Found 3 record(s)"))
+            })
+        messages.append({
+            "role": "assistant",
+            "content": "I've created the Sales Order.\nPlease review it & save.",
+            "toolCalls": tool_calls
+        })
+
+    return {"messages": messages}
+
+
+def _report_html(size):
+    session = make_session(size)
+    return lambda: export_service.generate_conversation_report_html(session)
+
+
+def _session_pdf(size):
+    session = make_session(size)
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-pdf-"), "report.pdf")
+    return lambda: export_service.generate_session_pdf(session, path)
+
+
+for _size in SESSION_SIZES:
+    benchmark(f"export.report_html[{_size}]")(lambda size=_size: _report_html(size))
+
+benchmark("export.session_pdf[1000]")(lambda: _session_pdf(1000))
+
+
+@benchmark("export.session_pdf_cached[1000]")
+def session_pdf_cached():
+    session = make_session(1000)
+    pdf_cache.get_session_pdf(session)
+    return lambda: pdf_cache.get_session_pdf(session)
+
+
+def _text_export(export_format):
+    session = make_session(1000)
+    iter_export = export_service.EXPORT_FORMATS[export_format][0]
+    return lambda: sum(len(chunk) for chunk in iter_export(session))
+
+
+for _format in export_service.EXPORT_FORMATS:
+    benchmark(f"export.{_format}[1000]")(lambda export_format=_format: _text_export(export_format))
+
+
+@benchmark("export.escape_html[1KB]")
+def escape_html():
+    text = ("Order <b>ACME</b> & \"Sons\" 'Ltd'\nqty > 5; " * 30)[:1024]
+    return (lambda: export_service._escape_html(text)), {"bytes_per_op": len(text.encode())}
+
+
+@benchmark("export.escape_html[plain 1KB]")
+def escape_html_plain():
+    text = ("Plain text without any special characters at all " * 30)[:1024]
+    return (lambda: export_service._escape_html(text)), {"bytes_per_op": len(text.encode())}
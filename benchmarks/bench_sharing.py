@@ -0,0 +1,39 @@
+"""
+Email and WhatsApp sharing benchmarks
+"""
+
+import os
+
+import frappe
+
+from ai_agent_widget import sharing_service
+
+from .harness import benchmark
+
+
+PDF_SIZE = 256 * 1024
+
+
+@benchmark("sharing.whatsapp_url")
+def whatsapp_url():
+    return lambda: sharing_service.share_via_whatsapp(
+        "a1b2c3d4e5f6", "https://bench.local/files/AI_Session_Report_a1b2c3d4.pdf"
+    )
+
+
+@benchmark("sharing.email[256KB pdf]")
+def email():
+    pdf_path = "/files/AI_Session_Report_bench.pdf"
+    full_path = frappe.get_site_path(pdf_path.lstrip("/"))
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "wb") as f:
+        f.write(os.urandom(PDF_SIZE))
+
+    summary = {"total_actions": 12, "duration_seconds": 95, "initial_message": "Create a Sales Order"}
+
+    def op():
+        frappe.sent_mail.clear()
+        if not sharing_service.share_via_email("a1b2c3d4e5f6", "user@example.com", summary, pdf_path):
+            raise RuntimeError("share_via_email failed")
+
+    return op
@@ -0,0 +1,181 @@
+"""
+Benchmark registry, timing and result comparison
+"""
+
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Any, Optional
+
+
+SCHEMA_VERSION = 1
+
+# name -> factory returning (op, extra); extra may carry bytes_per_op
+BENCHMARKS = {}
+
+
+def benchmark(name: str):
+    """
+    Register a benchmark factory
+
+    The factory does all setup and returns the operation to time, either on
+    its own or as (op, extra) where extra is a dict of metadata such as
+    ``bytes_per_op`` (adds a throughput figure to the result).
+    """
+    def register(factory: Callable):
+        BENCHMARKS[name] = factory
+        return factory
+    return register
+
+
+def measure(op: Callable, min_time: float, repeat: int) -> Dict[str, Any]:
+    """
+    Time op: calibrate the loop count, then take repeat rounds
+
+    Args:
+        op: Operation to time
+        min_time: Target seconds for all rounds together
+        repeat: Number of rounds
+
+    Returns:
+        Per-operation statistics in seconds
+    """
+    op()  # warm up caches and lazy imports
+
+    target = min_time / repeat
+    number = 1
+    while True:
+        elapsed = _time_loop(op, number)
+        if elapsed >= target or number >= 1 << 20:
+            break
+        number *= 2 if elapsed <= 0 else max(2, min(10, int(target / elapsed) + 1))
+
+    rounds = [_time_loop(op, number) / number for _ in range(repeat)]
+    median = statistics.median(rounds)
+
+    return {
+        "median_s": median,
+        "min_s": min(rounds),
+        "mean_s": statistics.fmean(rounds),
+        "stdev_s": statistics.stdev(rounds) if len(rounds) > 1 else 0.0,
+        "ops_per_sec": 1 / median if median else None,
+        "number": number,
+        "repeat": repeat
+    }
+
+
+def run(names: List[str], min_time: float, repeat: int, log=None) -> Dict[str, Any]:
+    """
+    Run benchmarks and collect machine-readable results
+
+    Args:
+        names: Registered benchmark names to run, in order
+        min_time: Target seconds per benchmark
+        repeat: Rounds per benchmark
+        log: Optional callable for progress lines
+
+    Returns:
+        Result document (see README for the schema)
+    """
+    results = {}
+    for name in names:
+        built = BENCHMARKS[name]()
+        op, extra = built if isinstance(built, tuple) else (built, {})
+
+        stats = measure(op, min_time, repeat)
+        if extra.get("bytes_per_op") and stats["median_s"]:
+            stats["mb_per_sec"] = extra["bytes_per_op"] / stats["median_s"] / 1e6
+        stats.update(extra)
+        results[name] = stats
+
+        if log:
+            log(format_result(name, stats))
+
+    return {
+        "schema_version": SCHEMA_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "config": {"min_time": min_time, "repeat": repeat},
+        "results": results
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """
+    Compare median times of benchmarks present in both documents
+
+    Args:
+        baseline: Earlier result document
+        current: New result document
+        threshold: Allowed slowdown, e.g. 0.1 for 10%
+
+    Returns:
+        One row per common benchmark with ratio and regression flag
+    """
+    rows = []
+    for name, stats in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or not base.get("median_s"):
+            continue
+
+        ratio = stats["median_s"] / base["median_s"]
+        rows.append({
+            "name": name,
+            "baseline_s": base["median_s"],
+            "current_s": stats["median_s"],
+            "ratio": ratio,
+            "regression": ratio > 1 + threshold
+        })
+    return rows
+
+
+def format_result(name: str, stats: Dict[str, Any]) -> str:
+    line = f"{name:<40} {_format_seconds(stats['median_s']):>12}/op  ±{_format_seconds(stats['stdev_s']):>10}"
+    if stats.get("mb_per_sec"):
+        line += f"  {stats['mb_per_sec']:8.1f} MB/s"
+    return line
+
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def _time_loop(op: Callable, number: int) -> float:
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(number):
+            op()
+        return time.perf_counter() - start
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def _format_seconds(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("µs", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3f} {unit}"
+    return f"{seconds / 1e-9:.1f} ns"
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,340 @@
+"""
+In-process stand-ins for frappe and nutaan_erp
+
+Installed into sys.modules before ai_agent_widget is imported, so the
+benchmarks run without a site, a database, Redis or network access. They
+implement just enough of each API for the code paths the benchmarks call,
+with in-memory storage and no artificial delays.
+"""
+
+import fnmatch
+import os
+import sys
+import tempfile
+import types
+import uuid
+from datetime import datetime
+
+
+class FakeRedis:
+    """In-memory subset of frappe's RedisWrapper"""
+
+    def __init__(self):
+        self.data = {}
+        self.scripts = {}
+
+    # RedisWrapper helpers (keys are prefixed by make_key)
+
+    def make_key(self, key, user=None, shared=False):
+        return key if shared else f"site|{key}"
+
+    def get_value(self, key, expires=False, user=None, shared=False):
+        return self.data.get(self.make_key(key, shared=shared))
+
+    def set_value(self, key, val, user=None, expires_in_sec=None, shared=False):
+        self.data[self.make_key(key, shared=shared)] = val
+
+    def delete_value(self, keys, user=None, make_keys=True, shared=False):
+        for key in ([keys] if isinstance(keys, str) else keys):
+            self.data.pop(self.make_key(key, shared=shared) if make_keys else key, None)
+
+    def hget(self, name, key, shared=False):
+        return self._raw_hget(self.make_key(name, shared=shared), key)
+
+    def hset(self, name, key, value, shared=False):
+        self._raw_hset(self.make_key(name, shared=shared), key, value)
+
+    def hdel(self, name, key, shared=False):
+        self._raw_hdel(self.make_key(name, shared=shared), key)
+
+    def lrange(self, key, start, stop):
+        return self._raw_lrange(self.make_key(key), start, stop)
+
+    def rpush(self, key, value):
+        self._raw_rpush(self.make_key(key), value)
+
+    def register_script(self, script):
+        return self.scripts[script]
+
+    # Raw redis commands (keys are already prefixed)
+
+    def execute_command(self, command, *args):
+        return self.raw(command.lower())(*args)
+
+    def raw(self, name):
+        """Raw redis method, bypassing the RedisWrapper helpers of the same name"""
+        return getattr(self, f"_raw_{name}", None) or getattr(self, name)
+
+    def _raw_hget(self, name, key):
+        return self.data.get(name, {}).get(key)
+
+    def _raw_hset(self, name, key, value):
+        self.data.setdefault(name, {})[key] = value
+
+    def _raw_hdel(self, name, *keys):
+        return sum(1 for key in keys if self.data.get(name, {}).pop(key, None) is not None)
+
+    def _raw_lrange(self, key, start, stop):
+        return list(self.data.get(key, [])[start:(None if stop == -1 else stop + 1)])
+
+    def _raw_rpush(self, key, *values):
+        self.data.setdefault(key, []).extend(values)
+        return len(self.data[key])
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def exists(self, *keys):
+        return sum(1 for k in keys if k in self.data)
+
+    def delete(self, *keys):
+        return sum(1 for k in keys if self.data.pop(k, None) is not None)
+
+    def expire(self, key, seconds):
+        return key in self.data
+
+    def incrby(self, key, amount=1):
+        self.data[key] = int(self.data.get(key, 0)) + amount
+        return self.data[key]
+
+    def hincrby(self, name, key, amount=1):
+        h = self.data.setdefault(name, {})
+        h[key] = int(h.get(key, 0)) + amount
+        return h[key]
+
+    def hgetall(self, name):
+        return dict(self.data.get(name, {}))
+
+    def lpush(self, key, *values):
+        lst = self.data.setdefault(key, [])
+        for value in values:
+            lst.insert(0, value)
+        return len(lst)
+
+    def ltrim(self, key, start, stop):
+        lst = self.data.get(key, [])
+        self.data[key] = lst[start:(None if stop == -1 else stop + 1)]
+
+    def zadd(self, key, mapping):
+        self.data.setdefault(key, {}).update(mapping)
+
+    def zcard(self, key):
+        return len(self.data.get(key, {}))
+
+    def zrem(self, key, *members):
+        z = self.data.get(key, {})
+        return sum(1 for m in members if z.pop(m, None) is not None)
+
+    def zremrangebyscore(self, key, low, high):
+        z = self.data.get(key, {})
+        low = float("-inf") if low == "-inf" else float(low)
+        high = float("inf") if high == "+inf" else float(high)
+        for m in [m for m, s in z.items() if low <= s <= high]:
+            del z[m]
+
+    def zrange(self, key, start, stop):
+        members = [m for m, s in sorted(self.data.get(key, {}).items(), key=lambda i: i[1])]
+        return members[start:(None if stop == -1 else stop + 1)]
+
+    def zrangebyscore(self, key, low, high):
+        z = self.data.get(key, {})
+        low = float("-inf") if low == "-inf" else float(low)
+        high = float("inf") if high == "+inf" else float(high)
+        return [m for m, s in sorted(z.items(), key=lambda i: i[1]) if low <= s <= high]
+
+    def scan_iter(self, match="*", count=None):
+        return [k for k in list(self.data) if fnmatch.fnmatch(k, match)]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """Queues raw commands and runs them on execute()"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        commands, self.commands = self.commands, []
+        results = []
+        for name, args, kwargs in commands:
+            results.append(self.redis.raw(name)(*args, **kwargs))
+        return results
+
+
+class FakeSession:
+    def __init__(self):
+        self.user = "bench@example.com"
+
+
+class FakeAgentConfig:
+    def __init__(self, api_key=None, model_name=None, temperature=0.1, max_tokens=4000, **kwargs):
+        self.api_key = api_key
+        self.model_name = model_name
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+
+
+class FakeSessionData:
+    def __init__(self, actions):
+        self.actions = actions
+
+    def to_dict(self):
+        return {"total_actions": len(self.actions), "actions": self.actions}
+
+
+class FakeTracker:
+    def start_session(self, user, initial_message):
+        self.actions = []
+        return uuid.uuid4().hex
+
+    def record_action(self, tool_name, tool_arguments, result=None):
+        record = types.SimpleNamespace(tool_name=tool_name, arguments=tool_arguments, result=result)
+        self.actions.append(record)
+        return record
+
+    def end_session(self, final_outcome=None):
+        return FakeSessionData([vars(a) for a in self.actions])
+
+
+class FakeIntentEngine:
+    def analyze(self, message, context, history):
+        return {"is_clear": True, "refined_request": message}
+
+
+class FakeAgent:
+    """Replays a fixed agent loop: one tool call, its result, then an answer"""
+
+    def stream(self, inputs, stream_mode="updates"):
+        call = types.SimpleNamespace(
+            tool_calls=[{"name": "set_field", "args": {"fieldname": "customer", "value": "ACME"}, "id": "call-1"}],
+            content=""
+        )
+        yield {"model": {"messages": [call]}}
+
+        result = types.SimpleNamespace(
+            type="tool",
+            tool_call_id="call-1",
+            content='{"action": "set_field", "fieldname": "customer", "value": "ACME"}'
+        )
+        yield {"tools": {"messages": [result]}}
+
+        answer = types.SimpleNamespace(tool_calls=[], content="Customer set to ACME.")
+        yield {"model": {"messages": [answer]}}
+
+
+class FakeAgentManager:
+    """AgentManager with the attributes agent_runner drives, and no LLM"""
+
+    def __init__(self, config):
+        self.config = config
+        self.tracker = FakeTracker()
+        self.intent_engine = FakeIntentEngine()
+        self.agent = None
+
+    def _initialize_agent(self, context):
+        self.agent = FakeAgent()
+
+
+def install():
+    """
+    Register the stand-ins in sys.modules
+
+    Returns:
+        The fake frappe module, for benchmarks that need to inspect it
+    """
+    site_path = tempfile.mkdtemp(prefix="ai_agent_bench_")
+
+    frappe = types.ModuleType("frappe")
+    frappe.conf = {
+        "gemini_api_key": "bench-key",
+        "gemini_model": "bench-model",
+        "ai_agent_response_cache": 0,
+        "ai_agent_telemetry": 0
+    }
+    frappe.local = types.SimpleNamespace(site="bench.local", response={})
+    frappe.session = FakeSession()
+    frappe.request = types.SimpleNamespace(data=b"{}")
+    frappe.sent_mail = []
+
+    redis = FakeRedis()
+    frappe.cache = lambda: redis
+
+    frappe._ = lambda text: text
+    frappe.whitelist = lambda *args, **kwargs: (lambda fn: fn)
+    frappe.only_for = lambda *args, **kwargs: None
+    frappe.log_error = lambda *args, **kwargs: None
+    frappe.publish_realtime = lambda *args, **kwargs: None
+    frappe.enqueue = lambda *args, **kwargs: None
+    frappe.throw = _throw
+    frappe.generate_hash = lambda length=10, *args, **kwargs: uuid.uuid4().hex[:length]
+    frappe.has_permission = lambda *args, **kwargs: True
+    frappe.get_all = lambda *args, **kwargs: []
+    frappe.get_list = lambda *args, **kwargs: []
+    frappe.get_roles = lambda user=None: ["System Manager"]
+    frappe.get_site_path = lambda *parts: os.path.join(site_path, *parts)
+    frappe.logger = lambda *args, **kwargs: types.SimpleNamespace(info=lambda *a, **k: None)
+    frappe.sendmail = lambda **kwargs: frappe.sent_mail.append(kwargs)
+    frappe.db = types.SimpleNamespace(
+        get_value=lambda *args, **kwargs: "Bench User",
+        exists=lambda *args, **kwargs: True
+    )
+
+    utils = types.ModuleType("frappe.utils")
+    utils.now_datetime = datetime.now
+    utils.get_url = lambda path="": f"https://bench.local{path}"
+    utils.add_to_date = lambda date, **kwargs: date
+    frappe.utils = utils
+
+    pdf = types.ModuleType("frappe.utils.pdf")
+    pdf.get_pdf = lambda html, *args, **kwargs: b"%PDF-1.4 bench " + str(len(html)).encode()
+    utils.pdf = pdf
+
+    nutaan = types.ModuleType("nutaan_erp")
+    nutaan.AgentManager = FakeAgentManager
+    nutaan.AgentConfig = FakeAgentConfig
+    nutaan_utils = types.ModuleType("nutaan_erp.utils")
+    nutaan_utils.build_frappe_context = _build_frappe_context
+    nutaan.utils = nutaan_utils
+
+    sys.modules.update({
+        "frappe": frappe,
+        "frappe.utils": utils,
+        "frappe.utils.pdf": pdf,
+        "nutaan_erp": nutaan,
+        "nutaan_erp.utils": nutaan_utils
+    })
+
+    return frappe
+
+
+def install_rate_limiter_script(frappe, script):
+    """Make the rate limiter's Lua script always grant capacity"""
+    frappe.cache().scripts[script] = lambda keys, args: [1, b"", "0", "4", 1, 1]
+
+
+def _throw(message, *args, **kwargs):
+    raise Exception(message)
+
+
+def _build_frappe_context(user, current_path, roles, user_full_name=None):
+    return {
+        "user_name": user_full_name or user,
+        "user_roles": roles,
+        "current_path": current_path,
+        "routes_map": {}
+    }